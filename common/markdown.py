@@ -4,20 +4,25 @@ This module provides helpers to render untrusted Markdown text into HTML and
 sanitize the result so it is safe to embed in Django Admin or other UIs.
 
 It uses the `markdown` library for Markdown -> HTML conversion and `bleach`
-for sanitization and URL linkification.
+for sanitization and URL linkification. Both are imported on first use so that
+processes which never render Markdown (workers, most management commands) do
+not pay for them at startup. `render_markdown_template` also derives
+a plain-text alternative and leaves `{{ ... }}` placeholders intact so the
+results can be cached and filled in per recipient.
 """
 
 from __future__ import annotations
 
+import functools
+import re
 from collections.abc import Iterable, Mapping
-
-import bleach
-import markdown as md
+from html import unescape
+from html.parser import HTMLParser
 
 _DEFAULT_EXTENSIONS = ("extra", "sane_lists")
 
-# Extend bleach's default allowed tags with common Markdown outputs
-_DEFAULT_ALLOWED_TAGS = set(bleach.sanitizer.ALLOWED_TAGS).union(
+# Added to bleach's default allowed tags: common Markdown outputs
+_MARKDOWN_TAGS = frozenset(
     {
         "p",
         "pre",
@@ -42,6 +47,16 @@ _DEFAULT_ALLOWED_TAGS = set(bleach.sanitizer.ALLOWED_TAGS).union(
     }
 )
 
+
+@functools.cache
+def _default_allowed_tags() -> frozenset[str]:
+    import bleach
+
+    return frozenset(bleach.sanitizer.ALLOWED_TAGS) | _MARKDOWN_TAGS
+
+
+_ALLOWED_PROTOCOLS = ("http", "https", "mailto")
+
 _DEFAULT_ALLOWED_ATTRS: Mapping[str, Iterable[str]] = {
     "a": ["href", "title", "rel", "target"],
     "th": ["colspan", "rowspan"],
@@ -74,15 +89,112 @@ def render_markdown_safe(
     if not text:
         return ""
 
+    import bleach
+    import markdown as md
+
     html = md.markdown(text, extensions=list(extensions or _DEFAULT_EXTENSIONS))
 
     clean_html = bleach.clean(
         html,
-        tags=list(allowed_tags or _DEFAULT_ALLOWED_TAGS),
+        tags=list(allowed_tags or _default_allowed_tags()),
         attributes=allowed_attrs or _DEFAULT_ALLOWED_ATTRS,
-        protocols=["http", "https", "mailto"],
+        protocols=list(_ALLOWED_PROTOCOLS),
         strip=True,
     )
     # Auto-link plain URLs and ensure rel="nofollow noopener"
     clean_html = bleach.linkify(clean_html)
     return clean_html
+
+
+# Placeholders are swapped for private-use characters while rendering so neither
+# markdown nor bleach can rewrite them.
+_PLACEHOLDER = re.compile(r"{{.*?}}")
+_SLOT = re.compile("\ue000(\\d+)\ue001")
+
+
+def render_markdown_template(text: str) -> tuple[str, str]:
+    """Render a Markdown template to ``(sanitized_html, plain_text)``.
+
+    ``{{ ... }}`` placeholders are carried through both renditions unchanged.
+    """
+    if not text:
+        return "", ""
+    slots: list[str] = []
+
+    def protect(match: re.Match) -> str:
+        slots.append(match.group(0))
+        return f"\ue000{len(slots) - 1}\ue001"
+
+    html = render_markdown_safe(_PLACEHOLDER.sub(protect, text))
+    plain = html_to_text(html)
+
+    def restore(value: str) -> str:
+        return _SLOT.sub(lambda m: slots[int(m.group(1))], value)
+
+    return restore(html), restore(plain)
+
+
+_URL_ATTRIBUTE = re.compile(r'\s(?:href|src)="([^"]*)"')
+_SCHEME = re.compile(r"([a-z][a-z0-9+.\-]*):")
+# Browsers ignore ASCII whitespace and control characters when reading a scheme.
+_IGNORED_IN_SCHEME = re.compile(r"[\x00-\x20]")
+
+
+def strip_unsafe_urls(html: str) -> str:
+    """Drop ``href``/``src`` attributes whose URL scheme is not allowed.
+
+    For HTML that was sanitized and then had values substituted into it (such as
+    a filled-in ``render_markdown_template`` rendition): a value placed in a link
+    target could otherwise turn it into a ``javascript:`` URL.
+    """
+
+    def check(match: re.Match) -> str:
+        url = _IGNORED_IN_SCHEME.sub("", unescape(match.group(1))).lower()
+        scheme = _SCHEME.match(url)
+        return match.group(0) if scheme is None or scheme.group(1) in _ALLOWED_PROTOCOLS else ""
+
+    return _URL_ATTRIBUTE.sub(check, html)
+
+
+class _TextExtractor(HTMLParser):
+    _BLOCKS = {"p", "div", "br", "hr", "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li", "tr", "pre", "blockquote"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self._hrefs: list[str | None] = []
+        self._pre = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._BLOCKS:
+            self.parts.append("\n")
+        if tag == "li":
+            self.parts.append("- ")
+        elif tag == "pre":
+            self._pre += 1
+        elif tag == "a":
+            self._hrefs.append(dict(attrs).get("href"))
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self._hrefs:
+            href = self._hrefs.pop()
+            if href and not self.parts[-1].strip().endswith(href):
+                self.parts.append(f" ({href})")
+        elif tag == "pre":
+            self._pre -= 1
+        if tag in self._BLOCKS and tag != "li":
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        self.parts.append(data if self._pre else re.sub(r"\s+", " ", data))
+
+
+def html_to_text(html: str) -> str:
+    """Plain-text alternative of an HTML fragment: block tags become line breaks, links keep their URL."""
+    if not html:
+        return ""
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    lines = [line.strip() for line in "".join(parser.parts).splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
@@ -9,8 +9,46 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dj_notificattion.settings')
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "dj_notificattion.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            if getattr(settings, "NOTIFICATION_WARM_UP", True):
+                from notification.warmup import warm_up
+
+                # Queries are not allowed on the event loop (nor at import time, which ASGI
+                # servers run inside it). The thread-sensitive executor is the thread the
+                # async ORM uses, so the connection opened here is the one requests reuse.
+                await sync_to_async(warm_up, thread_sensitive=True)(database=True)
+            from notification.admission import backlog_monitor
+            from notification.suppression import suppression_index
+
+            # Keep the enqueue path's in-memory views fresh without querying on requests.
+            backlog_monitor.start()
+            suppression_index.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            from notification.admission import backlog_monitor
+            from notification.suppression import suppression_index
+
+            backlog_monitor.stop()
+            suppression_index.stop()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    """Django's ASGI app, plus the lifespan protocol to warm up before serving."""
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -91,6 +91,27 @@ if os.getenv("POSTGRES_DB"):
             "PORT": int(os.getenv("POSTGRES_PORT", "5432")),
         }
     }
+    # Production profile: psycopg3's built-in connection pool (requires the psycopg-pool package).
+    # Pooling and persistent connections are mutually exclusive, so fall back to CONN_MAX_AGE otherwise.
+    if os.getenv("DJANGO_DB_POOL", "").lower() in ("1", "true", "yes"):
+        DATABASES["default"]["OPTIONS"] = {
+            "pool": {
+                "min_size": int(os.getenv("DJANGO_DB_POOL_MIN_SIZE", "2")),
+                "max_size": int(os.getenv("DJANGO_DB_POOL_MAX_SIZE", "10")),
+                "timeout": float(os.getenv("DJANGO_DB_POOL_TIMEOUT", "10")),
+            }
+        }
+    else:
+        DATABASES["default"]["CONN_MAX_AGE"] = int(os.getenv("DJANGO_DB_CONN_MAX_AGE", "60"))
+        DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+    # Optional read replica: same credentials/options as the primary, different host.
+    if os.getenv("POSTGRES_REPLICA_HOST"):
+        DATABASES["replica"] = {
+            **DATABASES["default"],
+            "HOST": os.getenv("POSTGRES_REPLICA_HOST"),
+            "PORT": int(os.getenv("POSTGRES_REPLICA_PORT", DATABASES["default"]["PORT"])),
+            "TEST": {"MIRROR": "default"},
+        }
 else:
     DATABASES = {
         "default": {
@@ -98,6 +119,29 @@ else:
             "NAME": BASE_DIR / "db.sqlite3",
         }
     }
+    # Local stand-in for a replica: a second alias on the same SQLite file exercises the router.
+    if os.getenv("DJANGO_DB_REPLICA", "").lower() in ("1", "true", "yes"):
+        DATABASES["replica"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+
+# Read-only traffic (admin changelists, status lookups, exports) is routed to this alias when it exists.
+DATABASE_ROUTERS = ["notification.routers.PrimaryReplicaRouter"]
+NOTIFICATION_READ_REPLICA = "replica" if "replica" in DATABASES else None
+
+# Preload sender modules at startup and, in workers/ASGI, open connections before serving.
+NOTIFICATION_WARM_UP = os.getenv("DJANGO_NOTIFICATION_WARM_UP", "1").lower() in ("1", "true", "yes")
+
+# Bearer token required to scrape /api/metrics/; empty leaves the endpoint open (restrict it at the proxy).
+NOTIFICATION_METRICS_TOKEN = os.getenv("DJANGO_NOTIFICATION_METRICS_TOKEN", "")
+
+# Shared (L2) cache for Service/Template snapshots (see notification.snapshots). Local memory by default;
+# point every node at the same Redis (redis://...) to share it, or use a directory for the file backend.
+CACHE_LOCATION = os.getenv("DJANGO_CACHE_LOCATION", "")
+if CACHE_LOCATION.startswith(("redis://", "rediss://")):
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": CACHE_LOCATION}}
+elif CACHE_LOCATION:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": CACHE_LOCATION}}
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
 
 # Test database/schema overrides
 # Allow running tests against a different DB (and Postgres schema) without altering dev DB
@@ -1,10 +1,33 @@
-from django.contrib import admin
+import re
+from datetime import timedelta
+
+from django.contrib import admin, messages
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 
 from common.markdown import render_markdown_safe
 
-from .mixins import AdminReadOnlyMixin
-from .models import Notification, Provider, Service, Template
+from . import bulk
+from .mixins import AdminReadOnlyMixin, ReplicaChangelistMixin
+from .models import (
+    Attachment,
+    DeliveryStat,
+    Notification,
+    Provider,
+    Service,
+    ServiceFallback,
+    Shard,
+    Suppression,
+    Template,
+    WorkerNode,
+    normalize_recipient,
+)
+
+# Normalised search terms that look like an email address or an international ("+") phone
+# number. Bare digits and dates go to the regular search, which also matches recipients exactly.
+RECIPIENT_TERM = re.compile(r"[^\s@]+@[^\s@]+|\+\d{6,15}")
 
 
 @admin.register(Provider)
@@ -47,15 +70,33 @@ class ProviderAdmin(AdminReadOnlyMixin, admin.ModelAdmin):
 
 
 @admin.register(Template)
-class TemplateAdmin(admin.ModelAdmin):
-    list_display = ("title", "subject", "service", "created_at", "updated_at")
-    list_filter = ("enabled",)
+class TemplateAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
+    list_display = ("title", "subject", "service", "priority", "created_at", "updated_at")
+    list_filter = ("enabled", "priority", "latency_critical")
     search_fields = ("title", "subject", "service__name")
-    readonly_fields = ("variables", "created_at", "updated_at")
+    readonly_fields = ("variables", "html_rendition", "text_rendition", "created_at", "updated_at")
+    filter_horizontal = ("attachments",)
     fieldsets = (
-        (None, {"fields": ("title", "subject", "service", "version", "enabled")}),
-        ("Content", {"fields": ("template",)}),
-        ("Computed/Metadata", {"fields": ("variables", "created_at", "updated_at")}),
+        (
+            None,
+            {
+                "fields": (
+                    "title",
+                    "subject",
+                    "service",
+                    "version",
+                    "enabled",
+                    "priority",
+                    "digest_window",
+                    "latency_critical",
+                )
+            },
+        ),
+        ("Content", {"fields": ("template", "attachments")}),
+        (
+            "Computed/Metadata",
+            {"fields": ("variables", "html_rendition", "text_rendition", "created_at", "updated_at")},
+        ),
     )
 
 
@@ -69,13 +110,22 @@ class TemplateInline(admin.TabularInline):
     show_change_link = True
 
 
+class ServiceFallbackInline(admin.TabularInline):
+    model = ServiceFallback
+    fk_name = "service"
+    fields = ("position", "fallback")
+    extra = 0
+    verbose_name_plural = "Fallback services (tried in position order)"
+
+
 @admin.register(Service)
-class ServiceAdmin(admin.ModelAdmin):
-    list_display = ("name", "provider", "enabled", "api_expires_on", "created_at")
+class ServiceAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
+    list_display = ("name", "provider", "enabled", "last_24h", "api_expires_on", "created_at")
     list_filter = ("enabled", "provider__type")
     search_fields = ("name", "provider__name", "provider__code")
     readonly_fields = ("created_at", "updated_at")
-    inlines = [TemplateInline]
+    filter_horizontal = ("fanout_services",)
+    inlines = [ServiceFallbackInline, TemplateInline]
     fieldsets = (
         (
             None,
@@ -87,30 +137,132 @@ class ServiceAdmin(admin.ModelAdmin):
             },
         ),
         ("Provider/Auth", {"fields": ("provider", "api_key", "api_expires_on")}),
-        ("Configuration", {"fields": ("config",)}),
+        ("Configuration", {"fields": ("config", "fanout_services", "digest_window")}),
         ("Timestamps", {"fields": ("created_at", "updated_at")}),
     )
 
+    def get_queryset(self, request):
+        # Two subqueries over the hourly rollup, not a count over notifications.
+        since = timezone.now() - timedelta(hours=24)
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                sent_24h=self._stat_total(since, (Notification.Status.SENT,)),
+                failed_24h=self._stat_total(since, (Notification.Status.ERROR, Notification.Status.BOUNCED)),
+            )
+        )
+
+    @staticmethod
+    def _stat_total(since, statuses):
+        totals = (
+            DeliveryStat.objects.filter(service=OuterRef("pk"), hour__gte=since, status__in=statuses)
+            .order_by()
+            .values("service")
+            .annotate(total=Sum("count"))
+            .values("total")
+        )
+        return Coalesce(Subquery(totals, output_field=IntegerField()), 0)
+
+    @admin.display(description="Last 24h")
+    def last_24h(self, obj: Service) -> str:
+        return f"{obj.sent_24h} sent / {obj.failed_24h} failed"
+
 
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = (
         "id",
         "service",
         "type",
         "status",
+        "priority",
         "http_status",
         "retry_count",
         "created_at",
         "update_at",
     )
-    list_filter = ("status", "type", "service__provider__type")
-    search_fields = ("id", "request_id", "service__name", "service__provider__name")
-    readonly_fields = ("created_at", "update_at")
+    list_filter = ("status", "priority", "type", "service__provider__type")
+    # Actions update in keyset-paginated chunks (notification.bulk), so "select all" on a large
+    # filtered changelist never loads the rows.
+    actions = ("requeue_selected", "cancel_selected")
+    search_fields = (
+        "=recipient",
+        "id",
+        "request_id",
+        "provider_message_id",
+        "service__name",
+        "service__provider__name",
+    )
+    readonly_fields = ("parent_id", "recipient", "provider_message_id", "created_at", "update_at")
     fieldsets = (
-        (None, {"fields": ("service", "template_ref", "request_id")}),
-        ("Content", {"fields": ("content", "plain_text")}),
-        ("Delivery", {"fields": ("type", "status", "retry_count", "http_status")}),
-        ("Payload/Response", {"fields": ("payload_config", "provider_response")}),
+        (None, {"fields": ("service", "template_ref", "request_id", "parent_id", "recipient")}),
+        ("Content", {"fields": ("content", "plain_text", "attachments")}),
+        ("Delivery", {"fields": ("type", "status", "priority", "send_at", "retry_count", "http_status")}),
+        ("Payload/Response", {"fields": ("payload_config", "provider_response", "provider_message_id")}),
         ("Timestamps", {"fields": ("created_at", "update_at")}),
     )
+
+    @admin.action(description="Requeue selected failed/cancelled notifications")
+    def requeue_selected(self, request, queryset):
+        count = bulk.requeue(queryset)
+        self.message_user(request, f"Requeued {count} notification(s).", messages.SUCCESS)
+
+    @admin.action(description="Cancel selected scheduled/pending notifications")
+    def cancel_selected(self, request, queryset):
+        count = bulk.cancel(queryset)
+        self.message_user(request, f"Cancelled {count} notification(s).", messages.SUCCESS)
+
+    def get_search_results(self, request, queryset, search_term):
+        # An email address or phone number is answered from notif_recipient_idx alone;
+        # OR-ing it with the other (icontains) fields would scan the table.
+        term = normalize_recipient(search_term)
+        if RECIPIENT_TERM.fullmatch(term):
+            return queryset.filter(recipient=term), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+@admin.register(Suppression)
+class SuppressionAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
+    list_display = ("recipient", "service", "reason", "created_at")
+    list_filter = ("reason", "service")
+    search_fields = ("recipient",)
+    readonly_fields = ("created_at",)
+    fields = ("service", "recipient", "reason", "created_at")
+
+
+@admin.register(DeliveryStat)
+class DeliveryStatAdmin(AdminReadOnlyMixin, ReplicaChangelistMixin, admin.ModelAdmin):
+    list_display = ("hour", "service", "type", "status", "count", "latency_seconds")
+    list_filter = ("type", "status", "service")
+    date_hierarchy = "hour"
+
+
+@admin.register(Attachment)
+class AttachmentAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
+    list_display = ("filename", "content_type", "size", "digest", "created_at")
+    search_fields = ("=digest", "filename")
+    readonly_fields = ("digest", "size", "created_at")
+    fields = ("digest", "filename", "content_type", "size", "created_at")
+
+    def has_add_permission(self, request):
+        # Content is uploaded through POST /api/attachments/, which stores and hashes it.
+        return False
+
+
+@admin.register(WorkerNode)
+class WorkerNodeAdmin(AdminReadOnlyMixin, admin.ModelAdmin):
+    list_display = ("name", "started_at", "heartbeat_at", "shard_count")
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(shard_count=Count("shards"))
+
+    @admin.display(description="Shards", ordering="shard_count")
+    def shard_count(self, obj):
+        return obj.shard_count
+
+
+@admin.register(Shard)
+class ShardAdmin(AdminReadOnlyMixin, admin.ModelAdmin):
+    list_display = ("number", "owner", "lease_until")
+    list_filter = ("owner",)
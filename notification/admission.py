@@ -0,0 +1,160 @@
+"""Admission control for the enqueue path.
+
+Every API process keeps a :class:`BacklogMonitor`: the number of PENDING
+notifications and the age of the oldest one, per service and priority lane. It
+is refreshed with one grouped query (served by ``notif_claim_idx``) every
+``NOTIFICATION_ADMISSION_REFRESH_INTERVAL`` seconds (default 5) by a background
+thread (:meth:`BacklogMonitor.start`, run on ASGI lifespan startup), so requests
+never wait for it; notifications the process accepted since are added to the
+depth locally. Without the thread, :meth:`~BacklogMonitor.refresh` is called
+inline and reads at most once per interval.
+
+A message is admitted when the backlog it would queue behind stays within the
+thresholds for its priority. That backlog is the service's pending work at the
+same or a more urgent priority, because workers claim urgent lanes first: a
+large bulk campaign never holds back OTP codes, while bulk traffic sees the
+whole backlog and is shed first. Thresholds come from
+``NOTIFICATION_ADMISSION_LIMITS``, keyed by priority, with ``max_pending``,
+``max_age`` (seconds) and the ``retry_after`` (seconds) to advertise:
+
+    NOTIFICATION_ADMISSION_LIMITS = {Priority.BULK: {"max_pending": 20000, "max_age": 900, "retry_after": 300}}
+
+Rejected requests get 429 with ``Retry-After``.
+"""
+
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterable
+
+from django.conf import settings
+from django.db.models import Count, Min
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import metrics
+from .background import PeriodicRefresh
+from .models import Notification, Priority
+
+DEFAULT_LIMITS = {
+    Priority.CRITICAL: {"max_pending": 50000, "max_age": 300, "retry_after": 5},
+    Priority.NORMAL: {"max_pending": 100000, "max_age": 900, "retry_after": 30},
+    Priority.BULK: {"max_pending": 200000, "max_age": 3600, "retry_after": 120},
+}
+
+
+def limits(priority: int) -> dict:
+    configured = getattr(settings, "NOTIFICATION_ADMISSION_LIMITS", {})
+    return {**DEFAULT_LIMITS[priority], **configured.get(priority, {})}
+
+
+class BacklogMonitor:
+    """Process-wide view of PENDING depth and oldest-pending age per (service, priority)."""
+
+    def __init__(self, *, refresh_interval: float = 5.0):
+        self.refresh_interval = refresh_interval
+        self._depth: Counter = Counter()
+        self._oldest: dict = {}
+        self._rejected: Counter = Counter()
+        self._refreshed_at = float("-inf")
+        self._lock = threading.Lock()
+        self._background = PeriodicRefresh(
+            lambda: self.refresh(force=True), refresh_interval, name="notification-backlog-monitor"
+        )
+
+    @property
+    def running(self) -> bool:
+        """Whether the background thread keeps the monitor fresh."""
+        return self._background.running
+
+    def start(self) -> None:
+        """Refresh from a background thread from now on."""
+        self._background.start()
+
+    def stop(self) -> None:
+        self._background.stop()
+
+    def refresh(self, *, force: bool = False) -> None:
+        """Re-read the backlog if the last read is older than ``refresh_interval``."""
+        now = time.monotonic()
+        if not force and now - self._refreshed_at < self.refresh_interval:
+            return
+        rows = (
+            Notification.objects.filter(status=Notification.Status.PENDING)
+            .order_by()
+            .values("service_id", "priority")
+            # Released scheduled notifications have been waiting since send_at, not since they were created.
+            .annotate(depth=Count("id"), oldest=Min(Coalesce("send_at", "created_at")))
+        )
+        depth, oldest = Counter(), {}
+        for row in rows:
+            key = (row["service_id"], row["priority"])
+            depth[key], oldest[key] = row["depth"], row["oldest"]
+        with self._lock:
+            self._depth, self._oldest = depth, oldest
+            self._refreshed_at = now
+
+    def record(self, notifications: Iterable[Notification]) -> None:
+        """Count notifications accepted by this process until the next refresh."""
+        accepted = Counter((n.service_id, n.priority) for n in notifications if n.status == Notification.Status.PENDING)
+        with self._lock:
+            self._depth.update(accepted)
+
+    def backlog(self, service_id, priority: int) -> tuple[int, float]:
+        """Pending depth and oldest age (seconds) a new ``priority`` message of the service queues behind."""
+        now = timezone.now()
+        depth, age = 0, 0.0
+        with self._lock:
+            for lane in Priority.values:
+                if lane > priority:
+                    continue
+                depth += self._depth.get((service_id, lane), 0)
+                if oldest := self._oldest.get((service_id, lane)):
+                    age = max(age, (now - oldest).total_seconds())
+        return depth, age
+
+    def admit(self, keys: Iterable[tuple]) -> int | None:
+        """Check ``(service_id, priority)`` pairs; None to admit, else the Retry-After seconds."""
+        retry_after = None
+        for service_id, priority in set(keys):
+            depth, age = self.backlog(service_id, priority)
+            limit = limits(priority)
+            if depth >= limit["max_pending"] or age > limit["max_age"]:
+                with self._lock:
+                    self._rejected[(service_id, priority)] += 1
+                retry_after = max(retry_after or 0, limit["retry_after"])
+        return retry_after
+
+    def collect(self) -> list:
+        with self._lock:
+            depth, rejected = dict(self._depth), dict(self._rejected)
+            oldest = dict(self._oldest)
+        now = timezone.now()
+
+        def labels(key):
+            return {"service": str(key[0]), "priority": Priority(key[1]).label.lower()}
+
+        return [
+            (
+                "notification_backlog_pending",
+                "gauge",
+                "PENDING notifications per service and priority.",
+                [(labels(k), v) for k, v in depth.items()],
+            ),
+            (
+                "notification_backlog_oldest_age_seconds",
+                "gauge",
+                "Age of the oldest PENDING notification.",
+                [(labels(k), (now - v).total_seconds()) for k, v in oldest.items()],
+            ),
+            (
+                "notification_admission_rejected_total",
+                "counter",
+                "Enqueue requests rejected with 429.",
+                [(labels(k), v) for k, v in rejected.items()],
+            ),
+        ]
+
+
+backlog_monitor = BacklogMonitor(refresh_interval=getattr(settings, "NOTIFICATION_ADMISSION_REFRESH_INTERVAL", 5.0))
+metrics.register(backlog_monitor.collect)
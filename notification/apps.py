@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ConfigurationConfig(AppConfig):
@@ -6,3 +7,13 @@ class ConfigurationConfig(AppConfig):
     name = "notification"
 
     verbose_name = "Email & SMS Notification"
+
+    def ready(self):
+        # Connects the signals that invalidate cached Service/Template snapshots.
+        from . import snapshots  # noqa: F401
+
+        # Import-only warm-up; database warm-up happens in the entry points (see notification.warmup).
+        if getattr(settings, "NOTIFICATION_WARM_UP", True):
+            from .warmup import warm_up
+
+            warm_up()
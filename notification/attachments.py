@@ -0,0 +1,120 @@
+"""Content-addressed attachment storage.
+
+Files are kept once under ``NOTIFICATION_ATTACHMENT_ROOT`` (default
+``BASE_DIR / "attachments"``) at a path derived from their SHA-256 digest, e.g.
+``3a/7b/3a7b...``, and described by one :class:`~notification.models.Attachment`
+row. Templates and notifications reference the digest only.
+
+:func:`store` streams an upload to disk in ``CHUNK_SIZE`` pieces while hashing
+it, so no file is ever held in memory whole; uploading the same bytes again
+returns the existing row. Senders stream the stored file back into multipart
+requests (``provider.http.MultipartBody``), memory-mapping it, so concurrent
+sends of one file share the operating system's page cache.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from collections.abc import Iterable
+from pathlib import Path
+
+from django.conf import settings
+
+from .models import Attachment, Notification, Template
+
+CHUNK_SIZE = 1024 * 1024
+
+DIGEST = re.compile(r"[0-9a-f]{64}")
+
+
+def root() -> Path:
+    return Path(getattr(settings, "NOTIFICATION_ATTACHMENT_ROOT", None) or Path(settings.BASE_DIR) / "attachments")
+
+
+def blob_path(digest: str) -> Path:
+    return root() / digest[:2] / digest[2:4] / digest
+
+
+def store(stream, filename: str, content_type: str = "") -> tuple[Attachment, bool]:
+    """Save the content of the file-like ``stream``; returns ``(attachment, created)``.
+
+    The content is written to a temporary file next to its final location and
+    renamed into place once its digest is known, so readers never see a partial
+    file and concurrent uploads of the same content are harmless.
+    """
+    directory = root()
+    directory.mkdir(parents=True, exist_ok=True)
+    hasher, size = hashlib.sha256(), 0
+    fd, temporary = tempfile.mkstemp(dir=directory, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := stream.read(CHUNK_SIZE):
+                hasher.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        digest = hasher.hexdigest()
+        path = blob_path(digest)
+        if path.exists():
+            os.unlink(temporary)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+        raise
+    return Attachment.objects.get_or_create(
+        digest=digest,
+        defaults={
+            "filename": os.path.basename(filename) or digest,
+            "content_type": content_type or "application/octet-stream",
+            "size": size,
+        },
+    )
+
+
+def missing(digests: Iterable[str]) -> list[str]:
+    """The digests in ``digests`` that have no stored attachment, sorted."""
+    wanted = set(digests)
+    if not wanted:
+        return []
+    return sorted(wanted - set(Attachment.objects.filter(digest__in=wanted).values_list("digest", flat=True)))
+
+
+async def amissing(digests: Iterable[str]) -> list[str]:
+    """The digests in ``digests`` that have no stored attachment, sorted."""
+    wanted = set(digests)
+    if not wanted:
+        return []
+    known = {digest async for digest in Attachment.objects.filter(digest__in=wanted).values_list("digest", flat=True)}
+    return sorted(wanted - known)
+
+
+def for_notifications(notifications: list[Notification]) -> dict:
+    """Map notification ids to their attachments: the template's, then the message's own.
+
+    Two queries for the whole group however many notifications share the files.
+    """
+    links = (
+        Template.attachments.through.objects.filter(template_id__in={n.template_ref_id for n in notifications})
+        .select_related("attachment")
+        .order_by("id")
+    )
+    by_template: dict = {}
+    for link in links:
+        by_template.setdefault(link.template_id, []).append(link.attachment)
+    own = {digest for n in notifications for digest in n.attachments or ()}
+    by_digest = {a.digest: a for a in Attachment.objects.filter(digest__in=own)} if own else {}
+
+    result = {}
+    for notification in notifications:
+        files = list(by_template.get(notification.template_ref_id, ()))
+        seen = {a.digest for a in files}
+        for digest in notification.attachments or ():
+            if digest in by_digest and digest not in seen:
+                files.append(by_digest[digest])
+                seen.add(digest)
+        if files:
+            result[notification.id] = files
+    return result
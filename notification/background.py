@@ -0,0 +1,58 @@
+"""Refreshing process-wide caches from a background thread.
+
+The enqueue path reads in-memory views of the database (the admission backlog,
+the suppression index). Refreshing them inline makes an unlucky request pay for
+the query; a :class:`PeriodicRefresh` runs the refresh on a daemon thread
+instead, so requests only ever read memory. The ASGI entry point starts these
+threads on lifespan startup and stops them on shutdown. Without them (tests, the
+development server) callers fall back to refreshing inline when stale.
+"""
+
+import logging
+import threading
+
+from django.db import close_old_connections, connections
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicRefresh:
+    """Calls ``refresh`` right away and then every ``interval`` seconds on a daemon thread."""
+
+    def __init__(self, refresh, interval: float, *, name: str):
+        self.refresh = refresh
+        self.interval = interval
+        self.name = name
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.is_set():
+                close_old_connections()
+                try:
+                    self.refresh()
+                except Exception:
+                    logger.exception("Background refresh %r failed", self.name)
+                self._stop.wait(self.interval)
+        finally:
+            connections.close_all()
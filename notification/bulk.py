@@ -0,0 +1,79 @@
+"""Requeueing and cancelling large sets of notifications without long locks.
+
+Both operations walk the matching rows in primary-key order (keyset pagination),
+read one chunk of ids at a time and update it with ``UPDATE ... WHERE id IN
+(...)`` in its own short transaction, counting the moved rows in the delivery
+statistics (``stats.record_update``). Nothing but the ids of the current chunk is
+held in memory, and row locks on ``notifications`` last for one chunk only, so
+workers and the enqueue API keep running while 200k rows are requeued.
+"""
+
+from collections.abc import Callable
+
+from django.db import router
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from . import stats
+from .channel import notify_pending
+from .models import Notification
+
+DEFAULT_CHUNK_SIZE = 1000
+
+REQUEUEABLE = (Notification.Status.ERROR, Notification.Status.CANCELLED)
+CANCELLABLE = (Notification.Status.SCHEDULED, Notification.Status.PENDING)
+
+
+def requeue(queryset: QuerySet, *, chunk_size: int = DEFAULT_CHUNK_SIZE, progress: Callable | None = None) -> int:
+    """Move failed or cancelled notifications in ``queryset`` back to PENDING with a fresh retry budget.
+
+    Rows whose ``send_at`` is still in the future (a cancelled campaign) go back to
+    SCHEDULED instead, so requeueing them does not send them early.
+    """
+    requeueable = queryset.filter(status__in=REQUEUEABLE)
+    not_due = Q(send_at__gt=timezone.now())
+    fresh = {"retry_count": 0, "http_status": "", "locked_until": None}
+    rescheduled = _chunked_update(
+        requeueable.filter(not_due), chunk_size, progress, status=Notification.Status.SCHEDULED, **fresh
+    )
+    updated = _chunked_update(
+        requeueable.exclude(not_due),
+        chunk_size,
+        (lambda done: progress(rescheduled + done)) if progress else None,
+        status=Notification.Status.PENDING,
+        **fresh,
+    )
+    if updated:
+        notify_pending(queryset._db or router.db_for_write(queryset.model))
+    return rescheduled + updated
+
+
+def cancel(queryset: QuerySet, *, chunk_size: int = DEFAULT_CHUNK_SIZE, progress: Callable | None = None) -> int:
+    """Cancel notifications in ``queryset`` that no worker has claimed yet."""
+    return _chunked_update(
+        queryset.filter(
+            Q(locked_until__isnull=True) | Q(locked_until__lt=timezone.now()),
+            status__in=CANCELLABLE,
+        ),
+        chunk_size,
+        progress,
+        status=Notification.Status.CANCELLED,
+    )
+
+
+def _chunked_update(queryset: QuerySet, chunk_size: int, progress: Callable | None, **values) -> int:
+    """Apply ``values`` to ``queryset`` one keyset page of ids at a time; returns rows updated."""
+    # Page on the primary too: a lagging replica would hand out ids that were already updated.
+    queryset = queryset.using(queryset._db or router.db_for_write(queryset.model)).order_by()
+    pages = queryset.order_by("pk").values_list("pk", flat=True)
+    total, last_pk = 0, None
+    while True:
+        ids = list((pages.filter(pk__gt=last_pk) if last_pk is not None else pages)[:chunk_size])
+        if not ids:
+            return total
+        # One transaction per chunk. The queryset's filters are applied again, so rows
+        # that changed since the page was read are skipped.
+        total += stats.record_update(queryset.filter(pk__in=ids), **values, update_at=timezone.now())
+        last_pk = ids[-1]
+        if progress:
+            progress(total)
@@ -0,0 +1,89 @@
+"""Wake-up channel between the enqueue path and sending workers.
+
+On PostgreSQL, committed enqueues fire ``NOTIFY`` on :data:`PENDING_CHANNEL` and
+workers block in ``LISTEN`` until a notification arrives, so new work is picked
+up within milliseconds instead of a poll interval. Other backends (SQLite in
+development) have no equivalent, so :class:`PendingListener` degrades to sleeping
+for the poll interval.
+"""
+
+import logging
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+PENDING_CHANNEL = "notification_pending"
+
+
+def supports_listen(using: str = DEFAULT_DB_ALIAS) -> bool:
+    return connections[using].vendor == "postgresql"
+
+
+def notify_pending(using: str = DEFAULT_DB_ALIAS) -> None:
+    """Wake listening workers once the current transaction commits.
+
+    Outside a transaction the notification is sent immediately. Several enqueues
+    in one transaction send several NOTIFYs, which PostgreSQL collapses into one
+    delivery per listener because the payload is identical.
+    """
+    if not supports_listen(using):
+        return
+
+    def _send():
+        with connections[using].cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, '')", [PENDING_CHANNEL])
+
+    transaction.on_commit(_send, using=using)
+
+
+class PendingListener:
+    """Blocks until new pending notifications are announced or a timeout expires.
+
+    Uses a dedicated autocommit connection so LISTEN survives Django closing or
+    pooling the worker's regular connection.
+    """
+
+    def __init__(self, using: str = DEFAULT_DB_ALIAS, channel: str = PENDING_CHANNEL):
+        self.using = using
+        self.channel = channel
+        self._conn = None
+
+    @property
+    def enabled(self) -> bool:
+        return supports_listen(self.using)
+
+    def start(self) -> None:
+        """Open the listening connection; call before the first claim to avoid missed wake-ups."""
+        if not self.enabled or self._conn is not None:
+            return
+        import psycopg
+
+        params = connections[self.using].get_connection_params()
+        self._conn = psycopg.connect(**params, autocommit=True)
+        self._conn.execute(f"LISTEN {self.channel}")
+
+    def wait(self, timeout: float) -> bool:
+        """Return True if woken by a notification, False if the timeout elapsed."""
+        if not self.enabled:
+            time.sleep(timeout)
+            return False
+        try:
+            self.start()
+            for _ in self._conn.notifies(timeout=timeout, stop_after=1):
+                return True
+            return False
+        except Exception:
+            # Connection dropped: fall back to polling for this round and reconnect next time.
+            logger.warning("Lost LISTEN connection on %s; reconnecting", self.channel, exc_info=True)
+            self.close()
+            time.sleep(min(timeout, 1.0))
+            return False
+
+    def close(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            finally:
+                self._conn = None
@@ -0,0 +1,228 @@
+"""Adaptive limits on concurrent provider calls.
+
+Every provider account (a provider and the API key its services send with) gets
+an :class:`AdaptiveLimiter` that bounds the calls in flight against it, and every
+service gets its own limiter under that, so the services sharing an account share
+its limit. A call holds a slot on both. Each limit follows AIMD (additive
+increase, multiplicative decrease), driven by observed latency:
+
+* While calls come back no slower than ``tolerance`` times the no-load latency
+  and the limit is actually used, the limit grows by one per limit's worth of
+  calls (``+1/limit`` per call).
+* A timeout, a connection error, a 429 or a 503, or a call slower than
+  ``tolerance`` times the no-load latency, multiplies the limit by ``backoff``.
+  Calls that were already in flight when the limit was cut do not cut it
+  again, so a burst of failures counts once.
+
+The no-load latency is the fastest recent call, drifting up slowly so that a
+provider that got permanently slower is not treated as overloaded forever. The
+limit therefore settles just below the point where the provider starts to
+queue, which is its maximum safe throughput.
+
+Bounds come from ``NOTIFICATION_CONCURRENCY``: a dict with optional ``"default"``,
+provider code and service id entries, merged in that order, each with any of
+``initial``, ``min_limit``, ``max_limit``, ``tolerance`` and ``backoff``. Account
+limiters use the ``"default"`` and provider code entries, service limiters all three:
+
+    NOTIFICATION_CONCURRENCY = {"default": {"max_limit": 32}, "infobip": {"initial": 2, "max_limit": 8}}
+
+A limiter is replaced by a fresh one when its bounds or the service's provider
+config change. Limits are per process; :func:`snapshot` feeds ``notification.metrics``.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+
+DEFAULTS = {"initial": 4, "min_limit": 1, "max_limit": 64, "tolerance": 2.0, "backoff": 0.75}
+
+# HTTP statuses that mean "slow down"; None is a timeout or connection failure.
+OVERLOAD_STATUSES = frozenset({None, 429, 503})
+
+# Share of the gap to a slower call the no-load latency moves per call.
+BASELINE_DRIFT = 0.01
+
+
+class AdaptiveLimiter:
+    """AIMD limit on the in-flight calls of one service or provider account; thread-safe."""
+
+    def __init__(
+        self,
+        *,
+        initial: int = DEFAULTS["initial"],
+        min_limit: int = DEFAULTS["min_limit"],
+        max_limit: int = DEFAULTS["max_limit"],
+        tolerance: float = DEFAULTS["tolerance"],
+        backoff: float = DEFAULTS["backoff"],
+    ):
+        self.min_limit, self.max_limit = min_limit, max_limit
+        self.tolerance, self.backoff = tolerance, backoff
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.baseline: float | None = None
+        self.calls = self.overloads = self.decreases = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout: float | None = None) -> bool:
+        """Wait for a free slot; False if none freed up within ``timeout`` seconds."""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.in_flight < int(self.limit), timeout):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency: float, *, overloaded: bool = False) -> None:
+        """Free a slot and adapt the limit to how the call went."""
+        started = time.monotonic() - latency
+        with self._condition:
+            used = self.in_flight >= int(self.limit) / 2
+            self.in_flight -= 1
+            self.calls += 1
+            if overloaded:
+                self.overloads += 1
+                self._decrease(started)
+            else:
+                if self.baseline is None or latency < self.baseline:
+                    self.baseline = latency
+                else:
+                    self.baseline += (latency - self.baseline) * BASELINE_DRIFT
+                if latency > self.baseline * self.tolerance:
+                    self._decrease(started)
+                elif used:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """Hold a slot around one call; set ``overloaded`` on the yielded object if the provider pushed back."""
+        self.acquire()
+        outcome = _Outcome()
+        started = time.monotonic()
+        try:
+            yield outcome
+        except BaseException:
+            outcome.overloaded = True
+            raise
+        finally:
+            self.release(time.monotonic() - started, overloaded=outcome.overloaded)
+
+    def _decrease(self, started: float) -> None:
+        if started < self._last_decrease:
+            return
+        self._last_decrease = time.monotonic()
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        self.decreases += 1
+
+
+class _Outcome:
+    overloaded = False
+
+
+class StackedLimiter:
+    """Holds a slot on each of ``limiters`` around one call, acquired in order."""
+
+    def __init__(self, *limiters: AdaptiveLimiter):
+        self.limiters = limiters
+
+    @property
+    def max_limit(self) -> int:
+        return min(limiter.max_limit for limiter in self.limiters)
+
+    @contextmanager
+    def slot(self):
+        """Like :meth:`AdaptiveLimiter.slot`; the outcome is reported to every limiter."""
+        with ExitStack() as stack:
+            inner = [stack.enter_context(limiter.slot()) for limiter in self.limiters]
+            outcome = _Outcome()
+            try:
+                yield outcome
+            finally:
+                for slot in inner:
+                    slot.overloaded = slot.overloaded or outcome.overloaded
+
+
+# service id -> (fingerprint, provider code, limiter); (provider code, account) -> (fingerprint, limiter)
+_limiters: dict = {}
+_accounts: dict = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_config(service, *, account: bool = False) -> dict:
+    """Bounds for ``service``'s limiter, or with ``account`` for its provider account's."""
+    configured = getattr(settings, "NOTIFICATION_CONCURRENCY", {})
+    merged = dict(DEFAULTS)
+    keys = ("default", service.provider.code) if account else ("default", service.provider.code, str(service.id))
+    for key in keys:
+        merged.update(configured.get(key, {}))
+    return merged
+
+
+def account_of(service) -> str:
+    """Short digest of the API key ``service`` sends with; services without one are their own account."""
+    api_key = (service.config or {}).get("api_key") or str(service.id)
+    return hashlib.sha256(api_key.encode()).hexdigest()[:12]
+
+
+def _fingerprint(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def limiter_for(service) -> AdaptiveLimiter:
+    """The process-wide limiter of ``service``, created on first use and whenever its config changes."""
+    config = limiter_config(service)
+    fingerprint = _fingerprint(config, service.config)
+    with _limiters_lock:
+        entry = _limiters.get(service.id)
+        if entry is None or entry[0] != fingerprint:
+            entry = _limiters[service.id] = (fingerprint, service.provider.code, AdaptiveLimiter(**config))
+        return entry[2]
+
+
+def account_limiter_for(service) -> AdaptiveLimiter:
+    """The process-wide limiter shared by every service sending through ``service``'s provider account."""
+    config = limiter_config(service, account=True)
+    fingerprint = _fingerprint(config)
+    key = (service.provider.code, account_of(service))
+    with _limiters_lock:
+        entry = _accounts.get(key)
+        if entry is None or entry[0] != fingerprint:
+            entry = _accounts[key] = (fingerprint, AdaptiveLimiter(**config))
+        return entry[1]
+
+
+def limits_for(service) -> StackedLimiter:
+    """The service's own limiter stacked under its provider account's."""
+    return StackedLimiter(limiter_for(service), account_limiter_for(service))
+
+
+def snapshot() -> list[dict]:
+    """Current state of every limiter: its labels, limit, in-flight calls and counters.
+
+    Service limiters are labelled with ``provider`` and ``service``, account
+    limiters with ``provider`` and ``account``.
+    """
+    with _limiters_lock:
+        entries = [
+            ({"provider": code, "service": str(service_id)}, limiter)
+            for service_id, (_, code, limiter) in _limiters.items()
+        ]
+        entries += [
+            ({"provider": code, "account": account}, limiter) for (code, account), (_, limiter) in _accounts.items()
+        ]
+    return [
+        {
+            "labels": labels,
+            "limit": int(limiter.limit),
+            "in_flight": limiter.in_flight,
+            "baseline_seconds": limiter.baseline or 0.0,
+            "calls": limiter.calls,
+            "overloads": limiter.overloads,
+            "decreases": limiter.decreases,
+        }
+        for labels, limiter in entries
+    ]
@@ -0,0 +1,97 @@
+"""Coalescing bursts of notifications to one recipient into a single digest.
+
+A template (or its service, by default) may set a ``digest_window`` in seconds.
+Notifications enqueued from such a template without an explicit ``send_at`` get
+a ``digest_key`` (template + recipients) and are held SCHEDULED until the window
+closes. The first notification for a key opens the window; later ones join it by
+taking the same ``send_at``, found with one lookup per enqueued batch on the
+partial ``notif_digest_window_idx``. When the scheduler releases a due window,
+:func:`coalesce` folds the group into its earliest notification and marks the
+rest COALESCED, so the provider sees one call per recipient per window.
+"""
+
+import hashlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any
+
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from . import stats
+from .models import Notification, Service, Suppression, Template
+
+# Joins the rendered bodies of the merged notifications.
+DIGEST_SEPARATOR = "\n\n"
+
+
+def digest_window(service: Service, template: Template) -> int:
+    """Digest window in seconds for ``template``; 0 when digests are disabled."""
+    return template.digest_window if template.digest_window is not None else service.digest_window
+
+
+def digest_key(template: Template, payload_config: dict[str, Any]) -> str:
+    to = payload_config.get("to") or []
+    recipients = sorted(Suppression.normalize(r) for r in ([to] if isinstance(to, str) else to))
+    return hashlib.blake2b(f"{template.id}:{','.join(recipients)}".encode(), digest_size=16).hexdigest()
+
+
+def window_close(window: int, now: datetime | None = None) -> datetime:
+    return (now or timezone.now()) + timedelta(seconds=window)
+
+
+def join_open_windows(notifications: list[Notification], using: str = DEFAULT_DB_ALIAS) -> None:
+    """Point digest notifications at an already open window for their key, if any.
+
+    One indexed query for the whole batch; notifications in the same batch
+    with the same key share the window opened by the first of them.
+    """
+    keyed = [n for n in notifications if n.digest_key]
+    if not keyed:
+        return
+    windows = dict(
+        Notification.objects.using(using)
+        .filter(
+            status=Notification.Status.SCHEDULED,
+            digest_key__in={n.digest_key for n in keyed},
+            send_at__gt=timezone.now(),
+        )
+        .order_by()
+        .values_list("digest_key", "send_at")
+    )
+    for notification in keyed:
+        notification.send_at = windows.setdefault(notification.digest_key, notification.send_at)
+
+
+def coalesce(rows: list[Notification], using: str = DEFAULT_DB_ALIAS) -> list:
+    """Merge each digest group in ``rows`` into its earliest notification.
+
+    ``rows`` must be locked by the caller and carry ``content``, ``plain_text``,
+    ``payload_config`` and ``attachments``. Returns the ids of the notifications folded into
+    another one (now COALESCED); the remaining heads are left for the caller to
+    release.
+    """
+    groups: dict[str, list[Notification]] = defaultdict(list)
+    for row in rows:
+        groups[row.digest_key].append(row)
+
+    heads, merged = [], []
+    for group in groups.values():
+        if len(group) < 2:
+            continue
+        group.sort(key=lambda n: n.created_at)
+        head = group[0]
+        head.content = DIGEST_SEPARATOR.join(n.content for n in group)
+        if any(n.plain_text for n in group):
+            head.plain_text = DIGEST_SEPARATOR.join(n.plain_text or n.content for n in group)
+        head.payload_config = {**head.payload_config, "digest_count": len(group)}
+        head.attachments = list(dict.fromkeys(digest for n in group for digest in n.attachments or ()))
+        heads.append(head)
+        merged += [n.id for n in group[1:]]
+
+    if heads:
+        Notification.objects.using(using).bulk_update(heads, ["content", "plain_text", "payload_config", "attachments"])
+        stats.record_update(
+            Notification.objects.using(using).filter(id__in=merged), status=Notification.Status.COALESCED
+        )
+    return merged
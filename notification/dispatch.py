@@ -0,0 +1,315 @@
+"""Claiming PENDING notifications and the sending worker loop.
+
+Workers claim rows by setting a short lease (``Notification.locked_until``)
+instead of holding row locks while talking to providers, so the transaction on
+the hot ``notifications`` table only lasts for the claim itself. A worker that
+dies mid-batch simply lets its lease expire and the rows become claimable again.
+"""
+
+import functools
+import logging
+import math
+import threading
+from collections import defaultdict
+from collections.abc import Callable, Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import failover, stats
+from .channel import PendingListener
+from .models import Notification, Priority
+from .provider import RESULT_FIELDS, SenderNotFound
+from .queues import DEFAULT_LEASE, DatabaseQueue, QueueBackend, get_queue
+from .scheduler import release_due, seconds_until_next_due
+from .sharding import ShardMembership
+from .snapshots import snapshots
+
+logger = logging.getLogger(__name__)
+
+# Relative share of each claimed batch per lane; override with settings.NOTIFICATION_PRIORITY_WEIGHTS.
+DEFAULT_PRIORITY_WEIGHTS = {Priority.CRITICAL: 8, Priority.NORMAL: 3, Priority.BULK: 1}
+
+
+def claimable(using: str = DEFAULT_DB_ALIAS):
+    """Queryset of PENDING notifications that are not leased by another worker."""
+    return Notification.objects.using(using).filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=timezone.now()),
+        status=Notification.Status.PENDING,
+    )
+
+
+def lane_quotas(batch_size: int, weights: Mapping[int, int]) -> dict[int, int]:
+    """Split ``batch_size`` across priority lanes proportionally to ``weights``.
+
+    Uses largest-remainder rounding so the quotas always add up to ``batch_size``;
+    ties favour the more urgent lane.
+    """
+    total = sum(w for w in weights.values() if w > 0)
+    if not total:
+        return {}
+    exact = {lane: batch_size * w / total for lane, w in weights.items() if w > 0}
+    quotas = {lane: int(share) for lane, share in exact.items()}
+    leftover = batch_size - sum(quotas.values())
+    for lane in sorted(exact, key=lambda lane: (quotas[lane] - exact[lane], lane))[:leftover]:
+        quotas[lane] += 1
+    return quotas
+
+
+class FairClaimer:
+    """Claims PENDING work by weighted priority lanes with per-service fairness.
+
+    Each batch is split across lanes by ``weights`` (critical traffic gets most of
+    every batch but bulk traffic is never starved). Within a lane the quota is
+    shared round-robin between services, starting from a different service on
+    every claim, so one service with a huge backlog cannot crowd out the others.
+    Capacity a lane or service cannot use is handed to the next one, so a batch is
+    only short when there is genuinely no more claimable work.
+
+    Each claim first reads which (lane, service) pairs have claimable rows, with
+    one ``DISTINCT`` query over ``notif_claim_idx``, and then only queries those:
+    each candidate query targets a single pair with a LIMIT. An idle claim is one
+    query, and the cost of a claim grows with the services that have work, not
+    with the number of services.
+
+    With a ``membership`` only the services in the worker's shards are claimed
+    (see ``notification.sharding``).
+    """
+
+    def __init__(
+        self,
+        weights: Mapping[int, int] | None = None,
+        *,
+        using: str = DEFAULT_DB_ALIAS,
+        membership: ShardMembership | None = None,
+    ):
+        self.weights = dict(weights or getattr(settings, "NOTIFICATION_PRIORITY_WEIGHTS", DEFAULT_PRIORITY_WEIGHTS))
+        self.using = using
+        self.membership = membership
+        self._rotation = 0
+
+    def claim(self, batch_size: int = 100, *, lease: timedelta = DEFAULT_LEASE) -> list[Notification]:
+        """Lease up to ``batch_size`` notifications; return them most urgent first."""
+        with transaction.atomic(using=self.using):
+            lanes = self._active_lanes()
+            if not lanes:
+                return []
+            claimed: list = []
+            for lane, quota in sorted(lane_quotas(batch_size, self.weights).items()):
+                claimed += self._claim_lane(lane, quota, lanes, claimed)
+            # Work-conserving: hand unused capacity to lanes in urgency order.
+            for lane in sorted(lanes):
+                if len(claimed) >= batch_size:
+                    break
+                claimed += self._claim_lane(lane, batch_size - len(claimed), lanes, claimed)
+            if not claimed:
+                return []
+            Notification.objects.using(self.using).filter(id__in=claimed).update(locked_until=timezone.now() + lease)
+        batch = list(Notification.objects.using(self.using).filter(id__in=claimed).order_by("priority", "created_at"))
+        snapshots.attach(batch)
+        return batch
+
+    def _active_lanes(self) -> dict[int, list]:
+        """Services with claimable work per lane, each list rotated to start at a different service per claim."""
+        pairs = claimable(self.using).order_by().values_list("priority", "service_id").distinct()
+        lanes: dict = defaultdict(list)
+        for lane, service_id in pairs:
+            if self.membership is None or self.membership.owns(service_id):
+                lanes[lane].append(service_id)
+        rotation = self._rotation
+        self._rotation += 1
+        for services in lanes.values():
+            services.sort()
+            start = rotation % len(services)
+            services[:] = services[start:] + services[:start]
+        return lanes
+
+    def _claim_lane(self, lane: int, quota: int, lanes: dict, exclude: list) -> list:
+        """Claim up to ``quota`` rows of ``lane``; services that run dry are dropped from ``lanes``."""
+        claimed: list = []
+        active = lanes.get(lane, [])
+        # First pass gives every service an equal share; later passes let services
+        # that still have work absorb the share of those that ran dry.
+        while active and len(claimed) < quota:
+            share = max(1, math.ceil((quota - len(claimed)) / len(active)))
+            still_active = []
+            for index, service_id in enumerate(active):
+                want = min(share, quota - len(claimed))
+                if want <= 0:
+                    still_active += active[index:]
+                    break
+                ids = self._candidates(lane, service_id, want, exclude + claimed)
+                claimed += ids
+                if len(ids) == want:
+                    still_active.append(service_id)
+            active = lanes[lane] = still_active
+        return claimed
+
+    def _candidates(self, lane: int, service_id, limit: int, exclude: list) -> list:
+        qs = claimable(self.using).filter(priority=lane, service_id=service_id)
+        if exclude:
+            qs = qs.exclude(id__in=exclude)
+        qs = qs.order_by("created_at")
+        if connections[self.using].features.has_select_for_update_skip_locked:
+            qs = qs.select_for_update(skip_locked=True)
+        return list(qs.values_list("id", flat=True)[:limit])
+
+
+def claim_batch(
+    batch_size: int = 100, *, lease: timedelta = DEFAULT_LEASE, using: str = DEFAULT_DB_ALIAS
+) -> list[Notification]:
+    """Lease up to ``batch_size`` PENDING notifications in priority order.
+
+    Convenience wrapper around a one-off :class:`FairClaimer`; long-running workers
+    keep their own claimer so the service rotation carries over between batches.
+    On backends with ``SKIP LOCKED`` concurrent workers never block on, or claim,
+    each other's candidate rows.
+    """
+    return FairClaimer(using=using).claim(batch_size, lease=lease)
+
+
+def send_concurrently(
+    batch: Sequence[Notification],
+    send_group: Callable[[list[Notification]], None],
+    *,
+    max_workers: int = 8,
+) -> None:
+    """Hand each (service, channel) group of ``batch`` to ``send_group`` in parallel.
+
+    Fan-out siblings live on different services, so the email, SMS and push legs of
+    one logical notification are sent at the same time rather than one after the
+    other. Each thread closes its own database connection when done.
+    """
+    groups: dict[tuple, list[Notification]] = defaultdict(list)
+    for notification in batch:
+        groups[(notification.service_id, notification.type)].append(notification)
+    if len(groups) <= 1:
+        for group in groups.values():
+            send_group(group)
+        return
+
+    def _run(group):
+        try:
+            send_group(group)
+        except Exception:
+            logger.exception("Sending %d notification(s) failed", len(group))
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(groups))) as pool:
+        list(pool.map(_run, groups.values()))
+
+
+def deliver(batch: Sequence[Notification], *, using: str = DEFAULT_DB_ALIAS) -> None:
+    """Default worker handler: send every (service, channel) group through its provider."""
+    send_concurrently(batch, functools.partial(deliver_group, using=using))
+
+
+def deliver_group(group: list[Notification], *, using: str = DEFAULT_DB_ALIAS) -> None:
+    """Send one service's notifications and persist all outcomes with a single bulk_update.
+
+    Sending goes through :func:`notification.failover.send`, which tries the
+    service's fallback providers and hedges latency-critical templates.
+    Outcomes are added to the delivery statistics in the same transaction.
+    """
+    try:
+        failover.send(group, using=using)
+    except SenderNotFound as exc:
+        now = timezone.now()
+        for notification in group:
+            notification.status = Notification.Status.ERROR
+            notification.provider_response = {"error": str(exc)}
+            notification.locked_until = None
+            notification.update_at = now
+    with transaction.atomic(using=using):
+        Notification.objects.using(using).bulk_update(group, RESULT_FIELDS)
+        # Retries stay PENDING and are counted once they reach a final outcome.
+        stats.record((n for n in group if n.status != Notification.Status.PENDING), using=using)
+
+
+class NotificationWorker:
+    """Claims batches of notifications and hands them to ``handler`` (:func:`deliver` on ``using`` by default).
+
+    While work keeps arriving the worker drains full batches back to back. When a
+    claim comes back short it blocks on :class:`PendingListener`: on PostgreSQL that
+    is a LISTEN with ``fallback_interval`` as a safety net, elsewhere a plain
+    ``poll_interval`` sleep. The wait is cut short when the next scheduled
+    notification comes due.
+
+    With a ``membership`` the worker heartbeats before every claim (waking up at
+    least once per heartbeat interval) and only claims work in its own shards.
+
+    Claims go through ``queue`` (see ``notification.queues``), by default the
+    configured backend; the database backend gets this worker's own claimer.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Sequence[Notification]], None] | None = None,
+        *,
+        batch_size: int = 100,
+        poll_interval: float = 1.0,
+        fallback_interval: float = 30.0,
+        lease: timedelta = DEFAULT_LEASE,
+        using: str = DEFAULT_DB_ALIAS,
+        listener: PendingListener | None = None,
+        claimer: FairClaimer | None = None,
+        membership: ShardMembership | None = None,
+        queue: QueueBackend | None = None,
+    ):
+        self.handler = handler or functools.partial(deliver, using=using)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.fallback_interval = fallback_interval
+        self.lease = lease
+        self.using = using
+        self.listener = listener or PendingListener(using=using)
+        self.membership = membership
+        self.claimer = claimer or FairClaimer(using=using, membership=membership)
+        if queue is None:
+            queue = get_queue()
+            if isinstance(queue, DatabaseQueue):
+                queue = DatabaseQueue(using=using, claimer=self.claimer)
+        self.queue = queue
+
+    def run_once(self) -> int:
+        """Release due scheduled rows, then claim and handle one batch.
+
+        Returns the number of notifications claimed.
+        """
+        while release_due(self.batch_size, using=self.using) == self.batch_size:
+            pass
+        if self.membership is not None:
+            self.membership.heartbeat()
+        batch = self.queue.claim(self.batch_size, lease=self.lease)
+        if batch:
+            self.handler(batch)
+            self.queue.settle(batch)
+        return len(batch)
+
+    def run(self, stop_event: threading.Event | None = None) -> None:
+        stop_event = stop_event or threading.Event()
+        # LISTEN before the first claim so nothing enqueued in between is missed.
+        self.listener.start()
+        timeout = self.fallback_interval if self.listener.enabled else self.poll_interval
+        if self.membership is not None:
+            timeout = min(timeout, self.membership.heartbeat_interval)
+        try:
+            while not stop_event.is_set():
+                close_old_connections()
+                try:
+                    claimed = self.run_once()
+                except Exception:
+                    logger.exception("Notification batch failed")
+                    claimed = 0
+                if claimed < self.batch_size:
+                    next_due = seconds_until_next_due(using=self.using)
+                    self.listener.wait(timeout if next_due is None else min(timeout, next_due))
+        finally:
+            self.listener.close()
+            if self.membership is not None:
+                self.membership.leave()
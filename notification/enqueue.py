@@ -0,0 +1,256 @@
+"""Helpers to turn API enqueue payloads into Notification rows.
+
+Parsing and building helpers are synchronous and free of I/O so they can be
+called from the async views (and from workers or management commands) without
+blocking. :func:`enqueue_messages` is the one way messages are stored: the
+enqueue and fan-out views and the ``enqueue_notifications`` command all go
+through its admission check, suppression filtering, digest windows, insert,
+statistics and queue hand-off.
+"""
+
+import json
+import uuid
+import zoneinfo
+from collections.abc import Iterable
+from datetime import UTC, datetime
+from itertools import islice
+from typing import Any
+
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import stats
+from .admission import backlog_monitor
+from .attachments import DIGEST
+from .digest import digest_key, digest_window, join_open_windows, window_close
+from .models import Notification, Service, Template
+from .queues import get_queue
+from .schema.validation import validator_for
+from .suppression import suppression_index
+
+
+def parse_enqueue_body(body: bytes) -> list[dict[str, Any]]:
+    """Decode an enqueue request body into a list of message dicts.
+
+    The body is either a single message object or ``{"notifications": [...]}``
+    for bulk enqueue. Each message must reference a ``template_id`` and may carry
+    ``request_id``, ``payload_config`` (destination), ``context`` (variables),
+    ``attachments`` (digests of stored attachments) and ``send_at``. A
+    ``send_at`` without a UTC offset is interpreted in the IANA ``timezone``
+    given with the message (e.g. "9am local time"), else in UTC.
+    """
+    data = _decode_json(body)
+    if isinstance(data, dict) and "notifications" in data:
+        messages = data["notifications"]
+    else:
+        messages = [data]
+    if not isinstance(messages, list) or not messages:
+        raise ValidationError("Expected a notification object or a non-empty 'notifications' list.")
+    return validate_messages(messages, "notifications")
+
+
+def parse_fanout_body(body: bytes) -> list[dict[str, Any]]:
+    """Decode a multi-channel fan-out body into one message dict per channel.
+
+    The body carries the shared ``request_id``, ``context``, ``send_at`` and
+    ``timezone`` plus a ``channels`` list; each channel names a ``template_id``
+    (whose service decides the provider) and its own ``payload_config``. A
+    channel's ``context`` keys override the shared ones.
+    """
+    data = _decode_json(body)
+    if not isinstance(data, dict) or not isinstance(data.get("channels"), list) or not data["channels"]:
+        raise ValidationError("Expected an object with a non-empty 'channels' list.")
+    shared = {key: value for key, value in data.items() if key != "channels"}
+    if not isinstance(shared.get("context", {}), dict):
+        raise ValidationError("context: expected an object.")
+    messages = []
+    for channel in data["channels"]:
+        if isinstance(channel, dict):
+            context = {**shared.get("context", {}), **(channel.get("context") or {})}
+            channel = {**shared, **channel, "context": context}
+        messages.append(channel)
+    return validate_messages(messages, "channels")
+
+
+def _decode_json(body: bytes) -> Any:
+    try:
+        return json.loads(body or b"null")
+    except ValueError as exc:
+        raise ValidationError("Request body must be valid JSON.") from exc
+
+
+def validate_messages(messages: list, label: str) -> list[dict[str, Any]]:
+    """Check decoded message dicts in place (ids, types, ``send_at``); raise one ``ValidationError`` for all."""
+    errors = []
+    for index, message in enumerate(messages):
+        if not isinstance(message, dict):
+            errors.append(f"{label}[{index}]: expected an object.")
+            continue
+        try:
+            message["template_id"] = str(uuid.UUID(str(message.get("template_id"))))
+        except ValueError:
+            errors.append(f"{label}[{index}].template_id: a valid UUID is required.")
+        for key in ("payload_config", "context"):
+            if not isinstance(message.get(key, {}), dict):
+                errors.append(f"{label}[{index}].{key}: expected an object.")
+        if not isinstance(message.get("request_id", ""), str):
+            errors.append(f"{label}[{index}].request_id: expected a string.")
+        digests = message.get("attachments", [])
+        if not isinstance(digests, list) or not all(isinstance(d, str) and DIGEST.fullmatch(d) for d in digests):
+            errors.append(f"{label}[{index}].attachments: expected a list of SHA-256 attachment digests.")
+        if message.get("send_at") is not None:
+            try:
+                message["send_at"] = _parse_send_at(message["send_at"], message.get("timezone"))
+            except (TypeError, ValueError, zoneinfo.ZoneInfoNotFoundError):
+                errors.append(f"{label}[{index}].send_at: expected an ISO 8601 datetime and valid timezone.")
+    if errors:
+        raise ValidationError(errors)
+    return messages
+
+
+def validate_payload_configs(messages: list[dict[str, Any]], templates: dict[str, Template], label: str) -> None:
+    """Check every message's ``payload_config`` against its provider's request schema.
+
+    Uses the compiled validator of the request dataclass (e.g. ``MailgunEmailRequest``)
+    in partial mode: keys the schema knows must have the right type, anything
+    rendered later (subject, body) or provider-specific may be absent. ``templates``
+    maps template ids to templates with ``service.provider`` loaded. Raises one
+    ``ValidationError`` listing every bad field of the batch.
+    """
+    validators = {}
+    errors = []
+    for index, message in enumerate(messages):
+        provider = templates[message["template_id"]].service.provider
+        if provider.pk not in validators:
+            schema_cls = provider.get_request_schema_class()
+            validators[provider.pk] = validator_for(schema_cls) if schema_cls else None
+        if validator := validators[provider.pk]:
+            for field, messages_ in validator.errors(message.get("payload_config") or {}, partial=True).items():
+                errors += [f"{label}[{index}].payload_config.{field}: {text}" for text in messages_]
+    if errors:
+        raise ValidationError(errors)
+
+
+def _parse_send_at(value: str, tz_name: str | None) -> datetime:
+    send_at = parse_datetime(value)
+    if send_at is None:
+        raise ValueError(value)
+    if timezone.is_naive(send_at):
+        send_at = timezone.make_aware(send_at, zoneinfo.ZoneInfo(tz_name) if tz_name else UTC)
+    return send_at
+
+
+def build_notification(
+    service: Service, template: Template, message: dict[str, Any], *, parent_id: uuid.UUID | None = None
+) -> Notification:
+    """Render ``template`` for one message and return an unsaved Notification.
+
+    ``type`` is set explicitly because ``bulk_create`` bypasses ``Notification.save``;
+    ``priority`` is inherited from the template.
+    The rendered subject is stored with the destination in ``payload_config``;
+    ``content``/``plain_text`` are filled from the template's cached HTML and text
+    renditions.
+    Messages with a future ``send_at`` start out SCHEDULED. Fan-out siblings share
+    ``parent_id``.
+
+    Suppressed recipients are removed using the in-memory ``suppression_index``
+    (``enqueue_messages`` keeps it fresh); if no "to" recipient is left,
+    the notification is returned SUPPRESSED without rendering the template.
+
+    For digest templates (see ``notification.digest``) a message without its own
+    ``send_at`` gets a ``digest_key`` and is held until its window closes; call
+    ``join_open_windows`` on the batch before inserting it.
+    """
+    payload_config, suppressed = suppression_index.filter_payload(service.id, message.get("payload_config") or {})
+    if suppressed and not payload_config.get("to"):
+        return Notification(
+            service=service,
+            template_ref=template,
+            request_id=message.get("request_id", ""),
+            parent_id=parent_id,
+            type=service.provider.type,
+            priority=template.priority,
+            payload_config=payload_config,
+            recipient=Notification.primary_recipient(message.get("payload_config") or {}),
+            content="",
+            status=Notification.Status.SUPPRESSED,
+        )
+    context = message.get("context") or {}
+    payload_config = dict(payload_config)
+    payload_config.setdefault("subject", template.render(context, template.subject))
+    send_at = message.get("send_at")
+    content, plain_text = template.render_renditions(context)
+    key = ""
+    if send_at is None and (window := digest_window(service, template)):
+        key, send_at = digest_key(template, payload_config), window_close(window)
+    return Notification(
+        service=service,
+        template_ref=template,
+        request_id=message.get("request_id", ""),
+        parent_id=parent_id,
+        digest_key=key,
+        type=service.provider.type,
+        priority=template.priority,
+        payload_config=payload_config,
+        recipient=Notification.primary_recipient(payload_config),
+        content=content,
+        plain_text=plain_text,
+        attachments=message.get("attachments") or [],
+        send_at=send_at,
+        status=Notification.Status.SCHEDULED if send_at and send_at > timezone.now() else Notification.Status.PENDING,
+    )
+
+
+class Overloaded(Exception):
+    """The backlog the messages would queue behind is over the admission limits."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Too many notifications are waiting to be sent; retry in {retry_after}s.")
+        self.retry_after = retry_after
+
+
+def enqueue_messages(
+    messages: list[dict[str, Any]],
+    templates: dict[str, Template],
+    *,
+    parent_id: uuid.UUID | None = None,
+    batch_size: int = 5000,
+    using: str = DEFAULT_DB_ALIAS,
+) -> list[Notification]:
+    """Admit, build and store validated ``messages``; return the new notifications.
+
+    ``templates`` maps each message's ``template_id`` to its template, with
+    ``service.provider`` loaded. Raises :class:`Overloaded` if admission control
+    rejects the batch. Otherwise suppressed recipients are dropped, digest
+    notifications join open windows, and the rows are inserted with their
+    statistics and queue hand-off in ``batch_size`` chunks, one transaction each.
+    """
+    if not backlog_monitor.running:
+        backlog_monitor.refresh()
+    retry_after = backlog_monitor.admit((t.service_id, t.priority) for t in templates.values())
+    if retry_after:
+        raise Overloaded(retry_after)
+    if not suppression_index.running:
+        suppression_index.refresh()
+    notifications = [
+        build_notification(templates[m["template_id"]].service, templates[m["template_id"]], m, parent_id=parent_id)
+        for m in messages
+    ]
+    join_open_windows(notifications, using)
+    _insert(notifications, batch_size, using)
+    backlog_monitor.record(notifications)
+    return notifications
+
+
+def _insert(notifications: Iterable[Notification], batch_size: int, using: str) -> int:
+    total = 0
+    iterator = iter(notifications)
+    while chunk := list(islice(iterator, batch_size)):
+        with transaction.atomic(using=using):
+            Notification.objects.using(using).bulk_create(chunk)
+            stats.record(chunk, using=using)
+            get_queue().enqueue(chunk)
+        total += len(chunk)
+    return total
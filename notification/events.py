@@ -0,0 +1,165 @@
+"""Buffered ingestion of provider delivery events.
+
+Webhook requests only append to an in-memory :class:`DeliveryEventBuffer` and
+return; a background thread flushes the buffer every ``flush_interval`` seconds
+(or as soon as ``max_size`` events are waiting). A flush collapses events per
+provider message id, resolves the ids of each service with one indexed query
+(only the service whose key verified a webhook can be touched by it) and writes all
+status changes with ``bulk_update``, so tens of thousands of events per minute
+cost a handful of statements instead of one UPDATE each. Hard-bounced
+recipients are added to the service's suppression list in the same flush, and
+status changes are added to the delivery statistics.
+
+Events still buffered when a process is killed are lost; providers that need
+at-least-once ingestion should be pointed at a durable endpoint instead.
+"""
+
+import atexit
+import logging
+import threading
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import stats
+from .models import Notification, Suppression
+from .suppression import suppression_index
+
+logger = logging.getLogger(__name__)
+
+# A status only moves forward; a late "delivered" never overwrites a bounce.
+STATUS_RANK = {
+    Notification.Status.PENDING: 0,
+    Notification.Status.SENT: 1,
+    Notification.Status.DELIVERED: 2,
+    Notification.Status.BOUNCED: 3,
+    Notification.Status.ERROR: 3,
+}
+
+
+@dataclass(frozen=True)
+class DeliveryEvent:
+    message_id: str
+    status: str
+    event: str = ""
+    recipient: str = ""
+    occurred_at: datetime = field(default_factory=timezone.now)
+    # The service whose webhook key verified the event, set by the webhook view.
+    service_id: uuid.UUID | None = None
+
+
+class DeliveryEventBuffer:
+    """Thread-safe buffer of delivery events flushed to the database in batches."""
+
+    def __init__(self, *, max_size: int = 5000, flush_interval: float = 1.0, batch_size: int = 1000):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._events: list[DeliveryEvent] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add(self, events: list[DeliveryEvent]) -> None:
+        with self._lock:
+            self._events.extend(events)
+            full = len(self._events) >= self.max_size
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._events)
+
+    def flush(self) -> int:
+        """Write all buffered events; returns the number of notifications updated."""
+        with self._lock:
+            events, self._events = self._events, []
+        if not events:
+            return 0
+        try:
+            return self._write(events)
+        except Exception:
+            # Put the events back so the next flush retries them.
+            with self._lock:
+                self._events[:0] = events
+            raise
+
+    def _write(self, events: list[DeliveryEvent]) -> int:
+        latest: dict[uuid.UUID | None, dict[str, DeliveryEvent]] = defaultdict(dict)
+        for event in events:
+            by_message = latest[event.service_id]
+            current = by_message.get(event.message_id)
+            if current is None or STATUS_RANK.get(event.status, 0) >= STATUS_RANK.get(current.status, 0):
+                by_message[event.message_id] = event
+
+        updated = 0
+        for service_id, by_message in latest.items():
+            if service_id is None:
+                logger.warning("Dropping %d delivery event(s) without a service", len(by_message))
+                continue
+            message_ids = list(by_message)
+            for start in range(0, len(message_ids), self.batch_size):
+                updated += self._write_chunk(service_id, message_ids[start : start + self.batch_size], by_message)
+        return updated
+
+    def _write_chunk(self, service_id: uuid.UUID, chunk: list[str], latest: dict[str, DeliveryEvent]) -> int:
+        rows = (
+            Notification.objects.filter(service_id=service_id, provider_message_id__in=chunk)
+            .order_by()
+            .only("id", "service_id", "type", "status", "provider_message_id", "created_at")
+        )
+        changed, suppressions = [], []
+        for notification in rows:
+            event = latest[notification.provider_message_id]
+            if STATUS_RANK.get(event.status, 0) > STATUS_RANK.get(notification.status, 0):
+                notification.status = event.status
+                notification.update_at = event.occurred_at
+                changed.append(notification)
+            if event.status == Notification.Status.BOUNCED and event.recipient:
+                suppressions.append(
+                    Suppression(
+                        service_id=service_id,
+                        recipient=Suppression.normalize(event.recipient),
+                        reason=Suppression.Reason.BOUNCE,
+                    )
+                )
+        with transaction.atomic():
+            Notification.objects.bulk_update(changed, ["status", "update_at"])
+            stats.record(changed)
+            Suppression.objects.bulk_create(suppressions, ignore_conflicts=True)
+        # bulk_create skips save() and signals, so keep this process's index in step by hand.
+        for suppression in suppressions:
+            suppression_index.add(suppression.service_id, suppression.recipient)
+        return len(changed)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="delivery-event-flusher", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing delivery events failed")
+
+
+event_buffer = DeliveryEventBuffer(
+    max_size=getattr(settings, "NOTIFICATION_EVENT_BUFFER_SIZE", 5000),
+    flush_interval=getattr(settings, "NOTIFICATION_EVENT_FLUSH_INTERVAL", 1.0),
+)
+atexit.register(event_buffer.flush)
@@ -0,0 +1,232 @@
+"""Provider failover and hedged sends.
+
+A service may list fallback services (``Service.fallbacks``): services on the same
+channel bound to other providers, each with its own config. ``deliver_group``
+sends through :func:`send`:
+
+* A service without fallbacks hands the group to its own sender, as before.
+* Otherwise the group goes to the service's provider first and whatever it did
+  not send goes to the next fallback in order; the last failure is recorded.
+* Notifications of ``latency_critical`` templates (OTP codes) are hedged: each is
+  sent on its own to the primary and, if no answer arrived within the hedge delay,
+  also to the first fallback. The first success wins; an early failure moves on
+  to the next fallback at once. The hedge delay is the primary's recent p95 send
+  latency (``NOTIFICATION_HEDGE_PERCENTILE``), ``NOTIFICATION_HEDGE_DELAY``
+  seconds until enough samples were seen, and never below
+  ``NOTIFICATION_HEDGE_MIN_DELAY``.
+
+Every attempt works on a copy of the notification, so concurrent attempts never
+write to the same instance; the winning (or last) attempt's outcome is copied
+onto the notification. Its ``provider_response`` then records which provider won:
+``{"provider", "service", "attempts", "hedged", "response"}``.
+
+Before sending, a notification is dropped as CANCELLED, with ``duplicate_of`` in
+``provider_response``, if another one of the service with the same ``request_id``
+and recipient was already sent, or comes earlier in the same group. That keeps a
+retried request from reaching the user twice through different providers.
+"""
+
+import copy
+import logging
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from .models import Notification, Service
+from .provider import RESULT_FIELDS, SenderNotFound, get_sender
+
+logger = logging.getLogger(__name__)
+
+# Latency samples kept per service, and needed before the percentile is trusted.
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+SENT_STATUSES = (Notification.Status.SENT, Notification.Status.DELIVERED)
+
+
+class LatencyTracker:
+    """Recent single-message send latencies per service, thread-safe."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples: dict = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def observe(self, service_id, seconds: float) -> None:
+        with self._lock:
+            self._samples[service_id].append(seconds)
+
+    def percentile(self, service_id, percent: float) -> float | None:
+        """The ``percent`` percentile of recent latencies, or None with too few samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(service_id, ()))
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        return samples[max(0, math.ceil(percent / 100 * len(samples)) - 1)]
+
+
+latency = LatencyTracker()
+
+_attempt_pool: ThreadPoolExecutor | None = None
+_attempt_pool_lock = threading.Lock()
+
+
+def _attempts() -> ThreadPoolExecutor:
+    # Shared and never joined: a losing hedge attempt finishes in the background
+    # instead of holding up the group.
+    global _attempt_pool
+    with _attempt_pool_lock:
+        if _attempt_pool is None:
+            _attempt_pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, "NOTIFICATION_HEDGE_THREADS", 32), thread_name_prefix="hedge"
+            )
+        return _attempt_pool
+
+
+def hedge_delay(service: Service) -> float:
+    """Seconds to wait for ``service``'s provider before hedging to the next one."""
+    observed = latency.percentile(service.id, getattr(settings, "NOTIFICATION_HEDGE_PERCENTILE", 95))
+    if observed is None:
+        return getattr(settings, "NOTIFICATION_HEDGE_DELAY", 1.0)
+    return max(getattr(settings, "NOTIFICATION_HEDGE_MIN_DELAY", 0.05), observed)
+
+
+def send(group: list[Notification], *, using: str = DEFAULT_DB_ALIAS) -> None:
+    """Send one service's notifications, failing over and hedging as configured.
+
+    Outcomes are set on the notifications; the caller persists them.
+    """
+    service = group[0].service
+    chain = [service, *service.fallback_chain()]
+    if len(chain) == 1:
+        get_sender(service).send(group)
+        return
+
+    group = _drop_duplicates(service, group, using)
+    critical = [n for n in group if n.template_ref.latency_critical]
+    others = [n for n in group if not n.template_ref.latency_critical]
+    if others:
+        _send_in_order(chain, others)
+    if critical:
+        with ThreadPoolExecutor(max_workers=min(len(critical), 8)) as pool:
+            list(pool.map(lambda n: _send_hedged(chain, n), critical))
+
+
+def _drop_duplicates(service: Service, group: list[Notification], using: str) -> list[Notification]:
+    keys = {(n.request_id, n.recipient) for n in group if n.request_id}
+    if not keys:
+        return group
+    sent = {
+        (request_id, recipient): str(pk)
+        for request_id, recipient, pk in Notification.objects.using(using)
+        .filter(service=service, request_id__in={r for r, _ in keys}, status__in=SENT_STATUSES)
+        .exclude(id__in=[n.id for n in group])
+        .values_list("request_id", "recipient", "id")
+    }
+    now, kept = timezone.now(), []
+    for notification in group:
+        key = (notification.request_id, notification.recipient)
+        if notification.request_id and key in sent:
+            notification.status = Notification.Status.CANCELLED
+            notification.provider_response = {"duplicate_of": sent[key]}
+            notification.locked_until = None
+            notification.update_at = now
+            continue
+        if notification.request_id:
+            sent[key] = str(notification.id)
+        kept.append(notification)
+    return kept
+
+
+def _attempt(service: Service, notifications: list[Notification]) -> list[Notification]:
+    """Send copies of ``notifications`` through ``service``'s provider; return the copies."""
+    copies = [copy.copy(n) for n in notifications]
+    started = time.monotonic()
+    try:
+        get_sender(service).send(copies)
+    except SenderNotFound as exc:
+        for attempt in copies:
+            attempt.status = Notification.Status.ERROR
+            attempt.provider_response = {"error": str(exc)}
+    except Exception as exc:
+        # Left PENDING: if no other provider succeeds the lease expires and it is retried.
+        logger.exception("Sending through %s failed", service.provider.code)
+        for attempt in copies:
+            attempt.provider_response = {"error": str(exc)}
+            attempt.update_at = timezone.now()
+    else:
+        if len(copies) == 1:
+            latency.observe(service.id, time.monotonic() - started)
+    return copies
+
+
+def _pooled_attempt(service: Service, notifications: list[Notification]) -> list[Notification]:
+    try:
+        return _attempt(service, notifications)
+    finally:
+        connections.close_all()
+
+
+def _apply(notification: Notification, attempt: Notification, service: Service, tried: list, hedged: bool) -> None:
+    for field in RESULT_FIELDS:
+        setattr(notification, field, getattr(attempt, field))
+    notification.provider_response = {
+        "provider": service.provider.code,
+        "service": str(service.id),
+        "attempts": [str(s.id) for s in tried],
+        "hedged": hedged,
+        "response": attempt.provider_response,
+    }
+
+
+def _send_in_order(chain: list[Service], group: list[Notification]) -> None:
+    tried: dict = defaultdict(list)
+    outcomes: dict = {}
+    remaining = group
+    for service in chain:
+        failed = []
+        for notification, attempt in zip(remaining, _attempt(service, remaining), strict=True):
+            tried[notification.id].append(service)
+            outcomes[notification.id] = (service, attempt)
+            if attempt.status != Notification.Status.SENT:
+                failed.append(notification)
+        if not failed:
+            break
+        remaining = failed
+    for notification in group:
+        service, attempt = outcomes[notification.id]
+        _apply(notification, attempt, service, tried[notification.id], hedged=False)
+
+
+def _send_hedged(chain: list[Service], notification: Notification) -> None:
+    pool = _attempts()
+    queue = list(chain[1:])
+    tried = [chain[0]]
+    running = {pool.submit(_pooled_attempt, chain[0], [notification]): chain[0]}
+    delay, hedged, last = hedge_delay(chain[0]), False, None
+    while running:
+        done, _ = wait(running, timeout=None if hedged or not queue else delay, return_when=FIRST_COMPLETED)
+        if not done:
+            # The primary is slower than usual: race the next provider against it.
+            hedged = True
+            service = queue.pop(0)
+            tried.append(service)
+            running[pool.submit(_pooled_attempt, service, [notification])] = service
+            continue
+        for future in done:
+            service = running.pop(future)
+            [attempt] = future.result()
+            if attempt.status == Notification.Status.SENT:
+                _apply(notification, attempt, service, tried, hedged)
+                return
+            last = (service, attempt)
+        if not running and queue:
+            service = queue.pop(0)
+            tried.append(service)
+            running[pool.submit(_pooled_attempt, service, [notification])] = service
+    _apply(notification, last[1], last[0], tried, hedged)
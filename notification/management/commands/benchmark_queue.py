@@ -0,0 +1,87 @@
+import math
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from notification.dispatch import FairClaimer
+from notification.models import Notification, Priority, Provider, Service, Template
+from notification.queues import DatabaseQueue, MemoryQueue
+
+BACKENDS = {
+    "database": lambda: DatabaseQueue(claimer=FairClaimer()),
+    # No sweeps: the benchmark feeds the queue itself.
+    "memory": lambda: MemoryQueue(sweep_interval=math.inf, consumer=True),
+}
+
+CHUNK_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = "Compare queue backends: enqueue, then claim/ack synthetic notifications until the queue is drained."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=10000, help="Notifications enqueued per backend.")
+        parser.add_argument("--batch-size", type=int, default=100, help="Notifications claimed per batch.")
+        parser.add_argument(
+            "--backend", action="append", choices=sorted(BACKENDS), help="Backend to measure (repeatable; default all)."
+        )
+
+    def handle(self, *args, **options):
+        if Notification.objects.filter(status=Notification.Status.PENDING).exists():
+            # The database backend would claim (and mark sent) real work.
+            raise CommandError("There are PENDING notifications; run the benchmark against an idle database.")
+        self.stdout.write(
+            f"{'backend':<10}{'enqueue ms':>12}{'drain ms':>12}{'msg/s':>10}{'claim p50 ms':>14}{'claim p99 ms':>14}"
+        )
+        for name in options["backend"] or sorted(BACKENDS):
+            enqueue, drain, claims = self._run(BACKENDS[name](), options["messages"], options["batch_size"])
+            claims.sort()
+            p99 = claims[min(len(claims) - 1, int(len(claims) * 0.99))]
+            self.stdout.write(
+                f"{name:<10}{enqueue * 1000:>12.1f}{drain * 1000:>12.1f}{options['messages'] / drain:>10.0f}"
+                f"{statistics.median(claims) * 1000:>14.2f}{p99 * 1000:>14.2f}"
+            )
+
+    def _run(self, queue, messages: int, batch_size: int) -> tuple[float, float, list[float]]:
+        provider = Provider.objects.create(code=f"benchmark-{time.time_ns()}", name="Benchmark", type="email")
+        service = Service.objects.create(name="Queue benchmark", provider=provider, enabled=False)
+        template = Template.objects.create(title="Benchmark", subject="Benchmark", template="x", service=service)
+        try:
+            started = time.perf_counter()
+            for offset in range(0, messages, CHUNK_SIZE):
+                chunk = Notification.objects.bulk_create(
+                    Notification(
+                        service=service,
+                        template_ref=template,
+                        type="email",
+                        priority=Priority.values[i % len(Priority.values)],
+                        content="x",
+                    )
+                    for i in range(offset, min(messages, offset + CHUNK_SIZE))
+                )
+                queue.enqueue(chunk)
+            enqueued = time.perf_counter()
+
+            claims, sent = [], 0
+            while sent < messages:
+                claim_started = time.perf_counter()
+                batch = queue.claim(batch_size)
+                claims.append(time.perf_counter() - claim_started)
+                if not batch:
+                    raise CommandError(f"The queue ran dry after {sent} of {messages} notifications.")
+                now = timezone.now()
+                for notification in batch:
+                    notification.status = Notification.Status.SENT
+                    notification.locked_until = None
+                    notification.update_at = now
+                Notification.objects.bulk_update(batch, ["status", "locked_until", "update_at"])
+                queue.settle(batch)
+                sent += len(batch)
+            return enqueued - started, time.perf_counter() - enqueued, claims
+        finally:
+            Notification.objects.filter(service=service).delete()
+            template.delete()
+            service.delete()
+            provider.delete()
@@ -0,0 +1,64 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter per sample; prints timings (seconds) as JSON.
+PROBE = """
+import json, time
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from notification.warmup import warm_up
+steps = warm_up(database={database})
+ready = time.perf_counter()
+from notification.models import Provider
+for provider in Provider.objects.only("code", "type"):
+    provider.get_sender_class()
+first = time.perf_counter()
+print(json.dumps({{
+    "django.setup": setup - started,
+    **{{f"warm_up.{{name}}": seconds for name, seconds in steps.items()}},
+    "ready_to_serve": ready - started,
+    "first_resolution": first - ready,
+}}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Measure cold-start time of a fresh process: Django setup, warm-up steps and first provider resolution."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to start.")
+        parser.add_argument("--no-database", action="store_true", help="Skip the database warm-up steps.")
+        parser.add_argument(
+            "--no-warm-up", action="store_true", help="Disable NOTIFICATION_WARM_UP in ready() for comparison."
+        )
+
+    def handle(self, *args, **options):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE}
+        if options["no_warm_up"]:
+            env["DJANGO_NOTIFICATION_WARM_UP"] = "0"
+        probe = PROBE.format(database=not options["no_database"])
+
+        samples: dict[str, list[float]] = {}
+        for _ in range(options["runs"]):
+            result = subprocess.run(
+                [sys.executable, "-c", probe],
+                env=env,
+                capture_output=True,
+                text=True,
+                check=True,
+                cwd=settings.BASE_DIR,
+            )
+            for name, seconds in json.loads(result.stdout.strip().splitlines()[-1]).items():
+                samples.setdefault(name, []).append(seconds * 1000)
+
+        self.stdout.write(f"{'step':<28}{'min ms':>10}{'median ms':>12}{'max ms':>10}")
+        for name, values in samples.items():
+            self.stdout.write(f"{name:<28}{min(values):>10.1f}{statistics.median(values):>12.1f}{max(values):>10.1f}")
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from notification import bulk
+from notification.models import Notification
+
+
+class Command(BaseCommand):
+    help = (
+        "Requeue failed/cancelled or cancel scheduled/pending notifications matching the filters, "
+        "in short chunked transactions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("operation", choices=("requeue", "cancel"))
+        parser.add_argument(
+            "--status", action="append", choices=Notification.Status.values, help="Only these statuses (repeatable)."
+        )
+        parser.add_argument("--service", help="Service id.")
+        parser.add_argument("--provider", help="Provider code, e.g. mailgun.")
+        parser.add_argument("--request-id", help="Client request_id.")
+        parser.add_argument("--since", help="Created at or after this ISO 8601 datetime.")
+        parser.add_argument("--until", help="Created before this ISO 8601 datetime.")
+        parser.add_argument("--chunk-size", type=int, default=bulk.DEFAULT_CHUNK_SIZE, help="Rows per transaction.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the matching notifications.")
+
+    def handle(self, *args, **options):
+        queryset = Notification.objects.all()
+        if options["status"]:
+            queryset = queryset.filter(status__in=options["status"])
+        if options["service"]:
+            queryset = queryset.filter(service_id=options["service"])
+        if options["provider"]:
+            queryset = queryset.filter(service__provider__code=options["provider"])
+        if options["request_id"]:
+            queryset = queryset.filter(request_id=options["request_id"])
+        for option, lookup in (("since", "created_at__gte"), ("until", "created_at__lt")):
+            if options[option]:
+                moment = parse_datetime(options[option])
+                if moment is None:
+                    raise CommandError(f"--{option} must be an ISO 8601 datetime.")
+                queryset = queryset.filter(**{lookup: moment})
+
+        operation = getattr(bulk, options["operation"])
+        if options["dry_run"]:
+            eligible = bulk.REQUEUEABLE if options["operation"] == "requeue" else bulk.CANCELLABLE
+            self.stdout.write(f"{queryset.filter(status__in=eligible).count()} notification(s) would be considered.")
+            return
+
+        def progress(total):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  {total} updated so far")
+
+        count = operation(queryset, chunk_size=options["chunk_size"], progress=progress)
+        done = {"requeue": "Requeued", "cancel": "Cancelled"}[options["operation"]]
+        self.stdout.write(self.style.SUCCESS(f"{done} {count} notification(s)."))
@@ -0,0 +1,75 @@
+import json
+import sys
+import time
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from notification import attachments
+from notification.enqueue import Overloaded, enqueue_messages, validate_messages, validate_payload_configs
+from notification.models import Service, Template
+from notification.snapshots import snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Enqueue notifications from a JSON Lines file, one enqueue API message per line (e.g. millions of "
+        "scheduled reminders), through the same admission, suppression and digest steps as the API."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSON Lines file of messages, or - for standard input.")
+        parser.add_argument("--service", required=True, help="Id of the service sending the notifications.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Messages per transaction.")
+
+    def handle(self, *args, **options):
+        service = Service.objects.select_related("provider").filter(pk=options["service"], enabled=True).first()
+        if service is None:
+            raise CommandError(f"No enabled service {options['service']}.")
+        batch_size = options["batch_size"]
+        stream = sys.stdin if options["path"] == "-" else open(options["path"], encoding="utf-8")
+        total = 0
+        with stream:
+            lines = (line for line in stream if line.strip())
+            while chunk := list(islice(lines, batch_size)):
+                try:
+                    messages, templates = self._validate(service, chunk)
+                except ValidationError as exc:
+                    raise CommandError(
+                        f"Messages {total + 1}-{total + len(chunk)}: " + "; ".join(exc.messages)
+                    ) from exc
+                while True:
+                    try:
+                        enqueue_messages(messages, templates, batch_size=batch_size)
+                        break
+                    except Overloaded as exc:
+                        # Wait for the workers to catch up instead of failing halfway through the file.
+                        self.stderr.write(f"{exc} Waiting.")
+                        time.sleep(exc.retry_after)
+                total += len(messages)
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"  {total} enqueued so far")
+        self.stdout.write(self.style.SUCCESS(f"Enqueued {total} notification(s)."))
+
+    def _validate(self, service: Service, lines: list[str]) -> tuple[list[dict], dict[str, Template]]:
+        """Decode and check one chunk like the enqueue view does; raise one ``ValidationError`` for all of it."""
+        try:
+            messages = validate_messages([json.loads(line) for line in lines], "messages")
+        except ValueError as exc:
+            raise ValidationError("Every line must be valid JSON.") from exc
+        template_ids = {m["template_id"] for m in messages}
+        templates = {
+            str(pk): t
+            for pk, t in snapshots.get_many(Template, template_ids).items()
+            if t.service_id == service.id and t.enabled
+        }
+        errors = [f"Unknown or disabled template: {tid}" for tid in sorted(template_ids - templates.keys())]
+        digests = (digest for m in messages for digest in m.get("attachments", ()))
+        errors += [f"Unknown attachment: {digest}" for digest in attachments.missing(digests)]
+        if errors:
+            raise ValidationError(errors)
+        for template in templates.values():
+            template.service = service
+        validate_payload_configs(messages, templates, "messages")
+        return messages, templates
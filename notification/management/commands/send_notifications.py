@@ -0,0 +1,57 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from notification import metrics
+from notification.dispatch import NotificationWorker
+from notification.sharding import ShardMembership
+from notification.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = "Run a sending worker: claim PENDING notifications and deliver them through their providers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Notifications claimed per batch.")
+        parser.add_argument(
+            "--poll-interval", type=float, default=1.0, help="Idle poll interval (s) on backends without LISTEN."
+        )
+        parser.add_argument(
+            "--fallback-interval", type=float, default=30.0, help="Safety poll interval (s) while LISTENing."
+        )
+        parser.add_argument("--once", action="store_true", help="Process a single batch and exit.")
+        parser.add_argument(
+            "--sharded",
+            action="store_true",
+            help="Join the worker membership and only send for services in the shards this worker leases.",
+        )
+        parser.add_argument(
+            "--metrics-port", type=int, help="Serve Prometheus metrics (e.g. concurrency limits) on this port."
+        )
+
+    def handle(self, *args, **options):
+        timings = warm_up(database=True)
+        if options["verbosity"] > 1:
+            self.stdout.write(
+                "Warm-up: " + ", ".join(f"{step} {seconds * 1000:.1f}ms" for step, seconds in timings.items())
+            )
+        if options["metrics_port"]:
+            metrics.serve(options["metrics_port"])
+        worker = NotificationWorker(
+            batch_size=options["batch_size"],
+            poll_interval=options["poll_interval"],
+            fallback_interval=options["fallback_interval"],
+            membership=ShardMembership() if options["sharded"] else None,
+        )
+        if options["once"]:
+            count = worker.run_once()
+            self.stdout.write(f"Processed {count} notification(s).")
+            return
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+        self.stdout.write("Sending worker started.")
+        worker.run(stop)
+        self.stdout.write("Sending worker stopped.")
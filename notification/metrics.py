@@ -0,0 +1,84 @@
+"""Process metrics in the Prometheus text exposition format.
+
+Modules register a collector, a callable returning ``(name, type, help, samples)``
+families where ``samples`` is a list of ``(labels, value)``; :func:`render`
+formats them all. Each process reports its own collectors: the API serves them on
+``/api/metrics/`` (the enqueue admission and snapshot cache series), sending
+workers on ``/metrics`` when started with ``send_notifications --metrics-port``
+(the provider concurrency limits).
+"""
+
+import threading
+from collections.abc import Callable, Iterable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import concurrency
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Family = tuple[str, str, str, list[tuple[dict[str, str], float]]]
+
+_collectors: list[Callable[[], Iterable[Family]]] = []
+
+
+def register(collector: Callable[[], Iterable[Family]]) -> None:
+    _collectors.append(collector)
+
+
+def render() -> str:
+    lines = []
+    for collector in _collectors:
+        for name, kind, help_text, samples in collector():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def serve(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve :func:`render` on ``http://host:port/metrics`` from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            data = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
+
+
+def _sender_limits() -> list[Family]:
+    rows = concurrency.snapshot()
+    families = (
+        ("notification_sender_concurrency_limit", "gauge", "Adaptive limit on in-flight provider calls.", "limit"),
+        ("notification_sender_in_flight", "gauge", "Provider calls in flight.", "in_flight"),
+        (
+            "notification_sender_latency_baseline_seconds",
+            "gauge",
+            "No-load latency the limiter compares calls against.",
+            "baseline_seconds",
+        ),
+        ("notification_sender_calls_total", "counter", "Provider calls made.", "calls"),
+        ("notification_sender_overloads_total", "counter", "Calls that timed out or were throttled.", "overloads"),
+        ("notification_sender_limit_decreases_total", "counter", "Times the concurrency limit was cut.", "decreases"),
+    )
+    return [(name, kind, help_text, [(r["labels"], r[key]) for r in rows]) for name, kind, help_text, key in families]
+
+
+register(_sender_limits)
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notification", "0008_alter_service_api_key"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="notification",
+            name="content",
+            field=models.TextField(help_text="Content of the notification"),
+        ),
+        migrations.AlterField(
+            model_name="notification",
+            name="service",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, related_name="notifications", to="notification.service"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="notification",
+            name="template_ref",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.DO_NOTHING, related_name="notifications", to="notification.template"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="service",
+            name="api_key",
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+    ]
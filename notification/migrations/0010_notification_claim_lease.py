@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notification", "0009_service_api_key_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="locked_until",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(fields=["status", "created_at"], name="notif_status_created_idx"),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notification", "0010_notification_claim_lease"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="notification",
+            name="notif_status_created_idx",
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="priority",
+            field=models.PositiveSmallIntegerField(choices=[(0, "Critical"), (1, "Normal"), (2, "Bulk")], default=1),
+        ),
+        migrations.AddField(
+            model_name="template",
+            name="priority",
+            field=models.PositiveSmallIntegerField(
+                choices=[(0, "Critical"), (1, "Normal"), (2, "Bulk")],
+                default=1,
+                help_text="Transactional templates (OTP, password reset) should be Critical; campaigns Bulk.",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(fields=["status", "priority", "service", "created_at"], name="notif_claim_idx"),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notification", "0011_priority_lanes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="send_at",
+            field=models.DateTimeField(blank=True, help_text="Deliver no earlier than this time", null=True),
+        ),
+        migrations.AlterField(
+            model_name="notification",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("scheduled", "SCHEDULED"),
+                    ("pending", "PENDING"),
+                    ("sent", "SENT"),
+                    ("error", "Error"),
+                    ("cancelled", "CANCELLED"),
+                ],
+                default="pending",
+                max_length=20,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(fields=["status", "send_at"], name="notif_status_send_at_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(fields=["service", "request_id"], name="notif_service_request_idx"),
+        ),
+    ]
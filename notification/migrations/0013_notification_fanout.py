@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notification", "0012_notification_send_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="parent_id",
+            field=models.UUIDField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="service",
+            name="fanout_services",
+            field=models.ManyToManyField(
+                blank=True,
+                help_text="Services on other channels whose templates this service may fan out to.",
+                related_name="+",
+                to="notification.service",
+            ),
+        ),
+    ]
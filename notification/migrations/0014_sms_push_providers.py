@@ -0,0 +1,30 @@
+from django.db import migrations
+
+PROVIDERS = (
+    {"code": "infobip", "name": "Infobip", "type": "sms"},
+    {"code": "onesignal", "name": "OneSignal", "type": "push"},
+)
+
+
+def create_providers(apps, schema_editor):
+    Provider = apps.get_model("notification", "Provider")
+    for provider in PROVIDERS:
+        Provider.objects.get_or_create(
+            code=provider["code"],
+            defaults={"name": provider["name"], "type": provider["type"]},
+        )
+
+
+def remove_providers(apps, schema_editor):
+    Provider = apps.get_model("notification", "Provider")
+    Provider.objects.filter(code__in=[p["code"] for p in PROVIDERS]).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notification", "0013_notification_fanout"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_providers, remove_providers),
+    ]
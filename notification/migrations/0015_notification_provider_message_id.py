@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notification", "0014_sms_push_providers"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="provider_message_id",
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name="notification",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("scheduled", "SCHEDULED"),
+                    ("pending", "PENDING"),
+                    ("sent", "SENT"),
+                    ("delivered", "DELIVERED"),
+                    ("bounced", "BOUNCED"),
+                    ("error", "Error"),
+                    ("cancelled", "CANCELLED"),
+                ],
+                default="pending",
+                max_length=20,
+            ),
+        ),
+    ]
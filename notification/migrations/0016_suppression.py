@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:29
+
+import uuid
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notification", "0015_notification_provider_message_id"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="notification",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("scheduled", "SCHEDULED"),
+                    ("pending", "PENDING"),
+                    ("sent", "SENT"),
+                    ("delivered", "DELIVERED"),
+                    ("bounced", "BOUNCED"),
+                    ("error", "Error"),
+                    ("cancelled", "CANCELLED"),
+                    ("suppressed", "SUPPRESSED"),
+                ],
+                default="pending",
+                max_length=20,
+            ),
+        ),
+        migrations.CreateModel(
+            name="Suppression",
+            fields=[
+                ("id", models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ("recipient", models.CharField(help_text="Email address, phone number or device id", max_length=320)),
+                (
+                    "reason",
+                    models.CharField(
+                        choices=[
+                            ("bounce", "Hard bounce"),
+                            ("complaint", "Spam complaint"),
+                            ("unsubscribe", "Unsubscribed"),
+                            ("manual", "Manual"),
+                        ],
+                        default="manual",
+                        max_length=20,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+                (
+                    "service",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="suppressions",
+                        to="notification.service",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Suppression",
+                "verbose_name_plural": "Suppressions",
+                "db_table": "suppressions",
+                "ordering": ["-created_at"],
+                "constraints": [
+                    models.UniqueConstraint(fields=("service", "recipient"), name="suppression_service_recipient_uniq")
+                ],
+            },
+        ),
+    ]
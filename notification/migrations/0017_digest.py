@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notification", "0016_suppression"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="digest_key",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="service",
+            name="digest_window",
+            field=models.PositiveIntegerField(
+                default=0, help_text="Default digest window in seconds for this service's templates; 0 disables."
+            ),
+        ),
+        migrations.AddField(
+            model_name="template",
+            name="digest_window",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text=(
+                    "Merge notifications to the same recipient within this many seconds into one digest. "
+                    "Empty uses the service default; 0 disables."
+                ),
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="notification",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("scheduled", "SCHEDULED"),
+                    ("pending", "PENDING"),
+                    ("sent", "SENT"),
+                    ("delivered", "DELIVERED"),
+                    ("bounced", "BOUNCED"),
+                    ("error", "Error"),
+                    ("cancelled", "CANCELLED"),
+                    ("suppressed", "SUPPRESSED"),
+                    ("coalesced", "COALESCED"),
+                ],
+                default="pending",
+                max_length=20,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(("status", "scheduled"), models.Q(("digest_key", ""), _negated=True)),
+                fields=["digest_key", "send_at"],
+                name="notif_digest_window_idx",
+            ),
+        ),
+    ]
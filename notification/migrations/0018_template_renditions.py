@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:33
+
+from django.db import migrations, models
+
+from common.markdown import render_markdown_template
+
+
+def render_existing_templates(apps, schema_editor):
+    Template = apps.get_model("notification", "Template")
+    templates = list(Template.objects.only("id", "template"))
+    for template in templates:
+        template.html_rendition, template.text_rendition = render_markdown_template(template.template)
+    Template.objects.bulk_update(templates, ["html_rendition", "text_rendition"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notification", "0017_digest"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="template",
+            name="html_rendition",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="template",
+            name="text_rendition",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(render_existing_templates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:38
+
+import uuid
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notification", "0018_template_renditions"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeliveryStat",
+            fields=[
+                ("id", models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[("email", "Email"), ("sms", "SMS"), ("push", "Push Notification")], max_length=20
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("scheduled", "SCHEDULED"),
+                            ("pending", "PENDING"),
+                            ("sent", "SENT"),
+                            ("delivered", "DELIVERED"),
+                            ("bounced", "BOUNCED"),
+                            ("error", "Error"),
+                            ("cancelled", "CANCELLED"),
+                            ("suppressed", "SUPPRESSED"),
+                            ("coalesced", "COALESCED"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("hour", models.DateTimeField(help_text="Start of the UTC hour")),
+                ("count", models.PositiveBigIntegerField(default=0)),
+                ("latency_seconds", models.FloatField(default=0)),
+                (
+                    "service",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="delivery_stats",
+                        to="notification.service",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Delivery statistic",
+                "verbose_name_plural": "Delivery statistics",
+                "db_table": "delivery_stats",
+                "ordering": ["-hour"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("service", "hour", "type", "status"), name="delivery_stat_bucket_uniq"
+                    )
+                ],
+            },
+        ),
+    ]
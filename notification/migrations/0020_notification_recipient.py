@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:39
+
+from django.db import migrations, models, transaction
+
+BACKFILL_BATCH = 2000
+
+
+def backfill_recipients(apps, schema_editor):
+    """Copy the first "to" of payload_config into recipient, one short transaction per batch."""
+    Notification = apps.get_model("notification", "Notification")
+    rows = Notification.objects.using(schema_editor.connection.alias).order_by("pk").only("id", "payload_config")
+    last_pk = None
+    while True:
+        batch = list((rows.filter(pk__gt=last_pk) if last_pk else rows)[:BACKFILL_BATCH])
+        if not batch:
+            return
+        for notification in batch:
+            to = (notification.payload_config or {}).get("to") or ""
+            if not isinstance(to, str):
+                to = to[0] if to else ""
+            notification.recipient = str(to).strip().lower()
+        with transaction.atomic(using=schema_editor.connection.alias):
+            Notification.objects.using(schema_editor.connection.alias).bulk_update(batch, ["recipient"])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+    # The backfill commits per batch instead of holding one transaction over the whole table;
+    # the index is built once afterwards rather than maintained row by row.
+    atomic = False
+
+    dependencies = [
+        ("notification", "0019_delivery_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="recipient",
+            field=models.CharField(blank=True, editable=False, max_length=320),
+        ),
+        migrations.RunPython(backfill_recipients, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(fields=["recipient", "created_at"], name="notif_recipient_idx"),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notification", "0020_notification_recipient"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Attachment",
+            fields=[
+                (
+                    "digest",
+                    models.CharField(
+                        editable=False,
+                        help_text="SHA-256 of the content",
+                        max_length=64,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("filename", models.CharField(max_length=255)),
+                ("content_type", models.CharField(default="application/octet-stream", max_length=255)),
+                ("size", models.PositiveBigIntegerField(editable=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Attachment",
+                "verbose_name_plural": "Attachments",
+                "db_table": "attachments",
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="attachments",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name="template",
+            name="attachments",
+            field=models.ManyToManyField(
+                blank=True,
+                help_text="Files attached to every notification sent with this template",
+                related_name="templates",
+                to="notification.attachment",
+            ),
+        ),
+    ]
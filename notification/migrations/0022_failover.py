@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notification", "0021_attachments"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="template",
+            name="latency_critical",
+            field=models.BooleanField(
+                default=False,
+                help_text=(
+                    "Hedge sends: if the service's provider has not answered within its recent p95 latency, "
+                    "also send through the first fallback service and keep whichever succeeds first."
+                ),
+            ),
+        ),
+        migrations.CreateModel(
+            name="ServiceFallback",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("position", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "fallback",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="+", to="notification.service"
+                    ),
+                ),
+                (
+                    "service",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="fallback_links",
+                        to="notification.service",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Fallback service",
+                "verbose_name_plural": "Fallback services",
+                "db_table": "service_fallbacks",
+                "ordering": ["position"],
+            },
+        ),
+        migrations.AddField(
+            model_name="service",
+            name="fallbacks",
+            field=models.ManyToManyField(
+                blank=True,
+                related_name="+",
+                through="notification.ServiceFallback",
+                through_fields=("service", "fallback"),
+                to="notification.service",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="servicefallback",
+            constraint=models.UniqueConstraint(fields=("service", "fallback"), name="service_fallback_uniq"),
+        ),
+    ]
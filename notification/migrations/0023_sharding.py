@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:03
+
+import uuid
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notification", "0022_failover"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WorkerNode",
+            fields=[
+                ("id", models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ("name", models.CharField(help_text="Host and process id", max_length=255)),
+                ("started_at", models.DateTimeField(auto_now_add=True)),
+                ("heartbeat_at", models.DateTimeField(db_index=True)),
+            ],
+            options={
+                "verbose_name": "Worker node",
+                "verbose_name_plural": "Worker nodes",
+                "db_table": "worker_nodes",
+                "ordering": ["name"],
+            },
+        ),
+        migrations.CreateModel(
+            name="Shard",
+            fields=[
+                ("number", models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ("lease_until", models.DateTimeField(blank=True, null=True)),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="shards",
+                        to="notification.workernode",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Shard",
+                "verbose_name_plural": "Shards",
+                "db_table": "shards",
+                "ordering": ["number"],
+            },
+        ),
+    ]
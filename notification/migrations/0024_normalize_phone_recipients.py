@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:40
+
+import re
+
+from django.db import migrations, transaction
+
+BACKFILL_BATCH = 2000
+
+# Copies of notification.models.PHONE_NUMBER / PHONE_FORMATTING as of this migration.
+PHONE_NUMBER = re.compile(r"\+?[\d\s\-().]*\d[\d\s\-().]*")
+PHONE_FORMATTING = re.compile(r"[\s\-().]")
+
+# Stored recipients that are phone numbers with formatting left in.
+FORMATTED_PHONE = r"^\+?[0-9 ().-]*[ ().-][0-9 ().-]*$"
+
+
+def _normalize(recipient: str) -> str:
+    value = recipient.strip().lower()
+    return PHONE_FORMATTING.sub("", value) if PHONE_NUMBER.fullmatch(value) else value
+
+
+def normalize_phone_recipients(apps, schema_editor):
+    """Strip the formatting from phone numbers already stored as recipients, one short transaction per batch."""
+    alias = schema_editor.connection.alias
+    Notification = apps.get_model("notification", "Notification")
+    Suppression = apps.get_model("notification", "Suppression")
+
+    rows = Notification.objects.using(alias).filter(recipient__regex=FORMATTED_PHONE).order_by("pk").only("recipient")
+    last_pk = None
+    while True:
+        batch = list((rows.filter(pk__gt=last_pk) if last_pk else rows)[:BACKFILL_BATCH])
+        if not batch:
+            break
+        for notification in batch:
+            notification.recipient = _normalize(notification.recipient)
+        with transaction.atomic(using=alias):
+            Notification.objects.using(alias).bulk_update(batch, ["recipient"])
+        last_pk = batch[-1].pk
+
+    # Suppression lists are small; a formatted number whose normal form is already listed is dropped.
+    with transaction.atomic(using=alias):
+        suppressions = Suppression.objects.using(alias)
+        for suppression in suppressions.filter(recipient__regex=FORMATTED_PHONE).order_by("created_at"):
+            recipient = _normalize(suppression.recipient)
+            if suppressions.filter(service_id=suppression.service_id, recipient=recipient).exists():
+                suppression.delete()
+            else:
+                suppression.recipient = recipient
+                suppression.save(update_fields=["recipient"])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("notification", "0023_sharding"),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_phone_recipients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notification", "0024_normalize_phone_recipients"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="notification",
+            name="notif_service_request_idx",
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(fields=["service", "request_id", "id"], name="notif_service_request_idx"),
+        ),
+    ]
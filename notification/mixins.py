@@ -1,6 +1,10 @@
+import functools
+import importlib
 import inspect
 import re
 
+from .routers import read_from_replica
+
 
 class NameCamelizeMixin:
     """Provides a helper to convert snake/kebab/spaced to CamelCase."""
@@ -87,6 +91,46 @@ class ProviderRequestMixin(NameCamelizeMixin):
         return inspect.cleandoc(doc) if doc else ""
 
 
+class ProviderSenderMixin(NameCamelizeMixin):
+    """Helpers to resolve the sender adapter that delivers through a provider.
+
+    Senders live in the module notification.provider.<code> (e.g. 'mailgun' ->
+    notification/provider/mailgun.py; 'mail-gun' -> mail_gun.py or mailgun.py) and
+    are named '<Code><Type>Sender', e.g. 'MailgunEmailSender'.
+    Expects the consumer to define `code` and `type` attributes (as Provider does).
+    """
+
+    def get_sender_class(self):
+        """Return the sender class for this provider or None if not found.
+
+        Resolutions are cached per (code, type), so only the first call per process
+        imports the module; ``notification.warmup`` does that ahead of traffic.
+        """
+        return _resolve_sender_class(self.code, self.type)
+
+
+def _sender_module_candidates(code: str) -> list[str]:
+    parts = [p.lower() for p in re.split(r"[_\-\s]+", code.strip()) if p] if code else []
+    return list(dict.fromkeys(["_".join(parts), "".join(parts)]))
+
+
+@functools.cache
+def _resolve_sender_class(code: str, type_: str):
+    class_name = f"{NameCamelizeMixin._camelize(code)}{NameCamelizeMixin._camelize(type_)}Sender"
+    for module_name in _sender_module_candidates(code):
+        module_path = f"{__package__}.provider.{module_name}"
+        try:
+            module = importlib.import_module(module_path)
+        except ModuleNotFoundError as exc:
+            if exc.name != module_path:
+                raise
+            continue
+        cls = getattr(module, class_name, None)
+        if isinstance(cls, type):
+            return cls
+    return None
+
+
 class AdminReadOnlyMixin:
     """A mixin to make Django admin classes fully read-only.
 
@@ -123,3 +167,21 @@ class AdminReadOnlyMixin:
             model_fields = [f.name for f in self.model._meta.fields]
         extra = tuple(getattr(self, "extra_readonly_fields", ()))
         return tuple(sorted(set(list(model_fields) + list(extra))))
+
+
+class ReplicaChangelistMixin:
+    """Serve admin changelist pages from the read replica, when one is configured.
+
+    Only GET requests are routed; POSTs (bulk actions, list_editable) stay on the
+    primary. The response is rendered inside the replica block because
+    TemplateResponse evaluates its querysets lazily.
+    """
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != "GET":
+            return super().changelist_view(request, extra_context)
+        with read_from_replica():
+            response = super().changelist_view(request, extra_context)
+            if hasattr(response, "render"):
+                response.render()
+        return response
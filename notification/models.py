@@ -1,17 +1,23 @@
+import html
 import re
 import secrets
 import string
 import uuid
+from collections.abc import Mapping
 from datetime import timedelta
+from typing import Any
 
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
 
-from .mixins import ProviderConfigSchemaMixin, ProviderRequestMixin
+from common.markdown import render_markdown_template, strip_unsafe_urls
 
+from .mixins import ProviderConfigSchemaMixin, ProviderRequestMixin, ProviderSenderMixin
+from .schema.validation import validator_for
 
-class Provider(ProviderConfigSchemaMixin, ProviderRequestMixin, models.Model):
+
+class Provider(ProviderConfigSchemaMixin, ProviderRequestMixin, ProviderSenderMixin, models.Model):
     """Represents an outbound notification provider configuration."""
 
     class ProviderType(models.TextChoices):
@@ -41,6 +47,14 @@ class Provider(ProviderConfigSchemaMixin, ProviderRequestMixin, models.Model):
         return f"{self.name} ({self.get_type_display()})"
 
 
+class Priority(models.IntegerChoices):
+    """Sending lanes; lower values are claimed first and get a larger share of each batch."""
+
+    CRITICAL = 0, "Critical"
+    NORMAL = 1, "Normal"
+    BULK = 2, "Bulk"
+
+
 class Template(models.Model):
     """Represents a notification template with auto-computed variables list."""
 
@@ -51,8 +65,37 @@ class Template(models.Model):
     template = models.TextField(help_text="Message body with placeholders like {{ variable }}")
     # Computed application-side from `template` before save
     variables = models.JSONField(default=list, blank=True, editable=False)
+    # Markdown body rendered once per save; placeholders are left in for per-recipient substitution.
+    html_rendition = models.TextField(blank=True, editable=False)
+    text_rendition = models.TextField(blank=True, editable=False)
     version = models.IntegerField(default=1)
     enabled = models.BooleanField(default=True)
+    priority = models.PositiveSmallIntegerField(
+        choices=Priority.choices,
+        default=Priority.NORMAL,
+        help_text="Transactional templates (OTP, password reset) should be Critical; campaigns Bulk.",
+    )
+    digest_window = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text=(
+            "Merge notifications to the same recipient within this many seconds into one digest. "
+            "Empty uses the service default; 0 disables."
+        ),
+    )
+    latency_critical = models.BooleanField(
+        default=False,
+        help_text=(
+            "Hedge sends: if the service's provider has not answered within its recent p95 latency, "
+            "also send through the first fallback service and keep whichever succeeds first."
+        ),
+    )
+    attachments = models.ManyToManyField(
+        "Attachment",
+        blank=True,
+        related_name="templates",
+        help_text="Files attached to every notification sent with this template",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -68,10 +111,45 @@ class Template(models.Model):
         return f"{self.title} v{self.version}"
 
     def save(self, *args, **kwargs):
-        # Compute variables from the template body on every save
+        # Compute variables and the HTML/text renditions from the template body on every save
         self.variables = self._extract_variables(self.template)
+        self.html_rendition, self.text_rendition = render_markdown_template(self.template)
         super().save(*args, **kwargs)
 
+    def render(self, context: Mapping[str, Any], text: str | None = None, *, escape: bool = False) -> str:
+        """Substitute ``{{ variable }}`` placeholders with values from ``context``.
+
+        Renders the template body unless ``text`` (e.g. the subject or a rendition) is
+        given. Dotted names such as ``user.name`` are resolved through nested mappings;
+        unknown variables render as empty strings. ``escape`` HTML-escapes the values.
+        """
+        source = self.template if text is None else text
+        if not source:
+            return ""
+        if escape:
+            return Template.VARIABLE_PATTERN.sub(
+                lambda m: html.escape(self._resolve_variable(context, m.group(1))), source
+            )
+        return Template.VARIABLE_PATTERN.sub(lambda m: self._resolve_variable(context, m.group(1)), source)
+
+    def render_renditions(self, context: Mapping[str, Any]) -> tuple[str, str]:
+        """Return ``(html, text)`` for ``context`` from the cached renditions; no markdown work per call.
+
+        The rendition was sanitized before substitution, so link targets are checked
+        again: a value placed in an ``href`` must not bring its own URL scheme.
+        """
+        html_body = strip_unsafe_urls(self.render(context, self.html_rendition, escape=True))
+        return html_body, self.render(context, self.text_rendition)
+
+    @staticmethod
+    def _resolve_variable(context: Mapping[str, Any], name: str) -> str:
+        value: Any = context
+        for part in name.split("."):
+            if not isinstance(value, Mapping) or part not in value:
+                return ""
+            value = value[part]
+        return "" if value is None else str(value)
+
     @staticmethod
     def _extract_variables(text: str) -> list[str]:
         if not text:
@@ -92,11 +170,29 @@ class Service(models.Model):
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255)
-    api_key = models.CharField(max_length=255, blank=True)
+    api_key = models.CharField(max_length=255, blank=True, db_index=True)
     api_expires_on = models.DateTimeField(null=True, blank=True)
     provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name="services")
     config = models.JSONField(default=dict, blank=True, help_text="Key-value SDK parameters")
     enabled = models.BooleanField(default=True)
+    fanout_services = models.ManyToManyField(
+        "self",
+        symmetrical=False,
+        blank=True,
+        related_name="+",
+        help_text="Services on other channels whose templates this service may fan out to.",
+    )
+    digest_window = models.PositiveIntegerField(
+        default=0, help_text="Default digest window in seconds for this service's templates; 0 disables."
+    )
+    fallbacks = models.ManyToManyField(
+        "self",
+        through="ServiceFallback",
+        through_fields=("service", "fallback"),
+        symmetrical=False,
+        blank=True,
+        related_name="+",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -125,22 +221,27 @@ class Service(models.Model):
         """Validate the service before saving.
 
         Ensures that the config matches the provider's expected schema. Errors are
-        attached to the 'config' field so Django Admin can display them inline.
+        attached to the 'config' field so Django Admin can display them inline, one
+        message per offending key (missing, unknown or of the wrong type).
         """
         errors = {}
         schema_cls = None
         if getattr(self, "provider", None):
             schema_cls = self.provider.get_schema_class()
         if schema_cls:
-            try:
-                schema_cls(**(self.config or {}))
-            except TypeError:
-                errors.setdefault("config", []).append(f"Invalid configuration for provider '{self.provider.code}'")
-            except Exception:
-                errors.setdefault("config", []).append(f"Invalid configuration for provider '{self.provider.code}'")
+            for field, messages in validator_for(schema_cls).errors(self.config or {}).items():
+                errors.setdefault("config", []).extend(
+                    f"Invalid configuration for provider '{self.provider.code}': {field}: {message}"
+                    for message in messages
+                )
         if errors:
             raise ValidationError(errors)
 
+    def fallback_chain(self) -> list["Service"]:
+        """Enabled fallback services in the order they are tried, with their providers loaded."""
+        links = self.fallback_links.select_related("fallback__provider").filter(fallback__enabled=True)
+        return [link.fallback for link in links.order_by("position")]
+
     def _generate_api_key(self, total_length: int = 32, prefix: str = "svc_") -> str:
         """Instance wrapper around module-level _generate_api_key."""
         return _generate_api_key(total_length=total_length, prefix=prefix)
@@ -159,6 +260,53 @@ def _generate_api_key(total_length: int = 32, prefix: str = "svc_") -> str:
     return f"{prefix}{suffix}"
 
 
+# A phone number as people write it: digits with an optional leading "+" and spaces, dashes, dots or brackets.
+PHONE_NUMBER = re.compile(r"\+?[\d\s\-().]*\d[\d\s\-().]*")
+PHONE_FORMATTING = re.compile(r"[\s\-().]")
+
+
+def normalize_recipient(recipient: str) -> str:
+    """Canonical form of an email address, phone number or device id for exact lookups.
+
+    Addresses are trimmed and lower-cased; phone numbers also lose their formatting,
+    so "+44 7700 900-123" and "+447700900123" are the same recipient.
+    """
+    value = str(recipient).strip().lower()
+    if PHONE_NUMBER.fullmatch(value):
+        return PHONE_FORMATTING.sub("", value)
+    return value
+
+
+class ServiceFallback(models.Model):
+    """One entry of a service's ordered fallback list (see ``notification.failover``).
+
+    The fallback is another service on the same channel, with its own provider
+    and config; lower ``position`` is tried first.
+    """
+
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name="fallback_links")
+    fallback = models.ForeignKey(Service, on_delete=models.CASCADE, related_name="+")
+    position = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        db_table = "service_fallbacks"
+        ordering = ["position"]
+        verbose_name = "Fallback service"
+        verbose_name_plural = "Fallback services"
+        constraints = [
+            models.UniqueConstraint(fields=["service", "fallback"], name="service_fallback_uniq"),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover - trivial
+        return f"{self.service_id} -> {self.fallback_id} (#{self.position})"
+
+    def clean(self):
+        if self.service_id and self.service_id == self.fallback_id:
+            raise ValidationError({"fallback": "A service cannot fall back to itself."})
+        if self.service_id and self.fallback_id and self.service.provider.type != self.fallback.provider.type:
+            raise ValidationError({"fallback": "Fallback services must use a provider of the same type."})
+
+
 class Notification(models.Model):
     """Represents a notification event/enqueue record.
 
@@ -166,26 +314,56 @@ class Notification(models.Model):
     - A notification is attached to exactly one Service via FK.
     - A notification can reference at most one Template via FK.
     - The `type` is derived from the Service's Provider type and set on save.
+    - `recipient` mirrors the first "to" of `payload_config` (normalised) so a
+      recipient's history is an index lookup; it is set on save and at enqueue.
+    - Notifications with a future `send_at` start as SCHEDULED and are released
+      to PENDING by the scheduler once due.
+    - Notifications whose recipients are all on the service's suppression list
+      are stored as SUPPRESSED without being rendered and are never sent.
+    - Notifications from a digest template share a `digest_key` per recipient;
+      when their window closes they are merged into the earliest one and the
+      rest become COALESCED.
     """
 
     class Status(models.TextChoices):
+        SCHEDULED = "scheduled", "SCHEDULED"
         PENDING = "pending", "PENDING"
         SENT = "sent", "SENT"
+        DELIVERED = "delivered", "DELIVERED"
+        BOUNCED = "bounced", "BOUNCED"
         ERROR = "error", "Error"
+        CANCELLED = "cancelled", "CANCELLED"
+        SUPPRESSED = "suppressed", "SUPPRESSED"
+        COALESCED = "coalesced", "COALESCED"
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     service = models.ForeignKey("Service", on_delete=models.CASCADE, related_name="notifications")
     request_id = models.CharField(max_length=255, blank=True)
+    # Shared by sibling notifications created by one multi-channel fan-out request.
+    parent_id = models.UUIDField(null=True, blank=True, db_index=True, editable=False)
+    # Same template + recipients while a digest window is open; see notification.digest.
+    digest_key = models.CharField(max_length=64, blank=True, editable=False)
     template_ref = models.ForeignKey("Template", on_delete=models.DO_NOTHING, related_name="notifications")
     # Derived from service.provider.type
     type = models.CharField(max_length=20, choices=Provider.ProviderType.choices, editable=False)
     payload_config = models.JSONField(default=dict, blank=True, help_text="Destination config like email/phone")
+    # First "to" recipient of payload_config, normalised; indexed for "what did we send to ..." lookups.
+    recipient = models.CharField(max_length=320, blank=True, editable=False)
     content = models.TextField(help_text="Content of the notification")
     plain_text = models.TextField(blank=True)
+    # Digests of this message's own attachments; the template's attachments are added when sending.
+    attachments = models.JSONField(default=list, blank=True)
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    # Copied from the template at enqueue so claims never need to join templates.
+    priority = models.PositiveSmallIntegerField(choices=Priority.choices, default=Priority.NORMAL)
     provider_response = models.JSONField(default=dict, blank=True)
+    # Provider-assigned id from the send response; delivery webhooks are matched on it.
+    provider_message_id = models.CharField(max_length=255, blank=True, db_index=True, editable=False)
     http_status = models.CharField(max_length=50, blank=True)
     retry_count = models.IntegerField(default=0)
+    send_at = models.DateTimeField(null=True, blank=True, help_text="Deliver no earlier than this time")
+    # Lease set by a worker when it claims the row; expired leases make the row claimable again.
+    locked_until = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     update_at = models.DateTimeField(auto_now=True)
 
@@ -194,6 +372,22 @@ class Notification(models.Model):
         ordering = ["-created_at"]
         verbose_name = "Notification"
         verbose_name_plural = "Notifications"
+        indexes = [
+            # Claims walk one (priority lane, service) pair at a time, oldest first.
+            models.Index(fields=["status", "priority", "service", "created_at"], name="notif_claim_idx"),
+            # The scheduler reads SCHEDULED rows in send_at order and stops at the first future one.
+            models.Index(fields=["status", "send_at"], name="notif_status_send_at_idx"),
+            # Cancelling (and later lookups) by the client's request_id, paged by id.
+            models.Index(fields=["service", "request_id", "id"], name="notif_service_request_idx"),
+            # Recipient lookups, newest first.
+            models.Index(fields=["recipient", "created_at"], name="notif_recipient_idx"),
+            # Open digest windows: only SCHEDULED rows with a digest key, looked up by key.
+            models.Index(
+                fields=["digest_key", "send_at"],
+                name="notif_digest_window_idx",
+                condition=models.Q(status="scheduled") & ~models.Q(digest_key=""),
+            ),
+        ]
 
     def __str__(self) -> str:  # pragma: no cover - trivial
         return f"Notification {self.id} ({self.get_status_display()})"
@@ -202,4 +396,161 @@ class Notification(models.Model):
         # Derive type from service.provider.type if service is set
         if getattr(self, "service", None) and getattr(self.service, "provider", None):
             self.type = self.service.provider.type
+        self.recipient = self.primary_recipient(self.payload_config)
         super().save(*args, **kwargs)
+
+    @staticmethod
+    def primary_recipient(payload_config: Mapping[str, Any]) -> str:
+        to = (payload_config or {}).get("to") or ""
+        if not isinstance(to, str):
+            to = to[0] if to else ""
+        return normalize_recipient(to)
+
+    @classmethod
+    def aggregate_status(cls, statuses) -> str:
+        """Collapse sibling statuses into one: delivered on any channel counts as sent."""
+        statuses = set(statuses)
+        if statuses & {cls.Status.SENT, cls.Status.DELIVERED}:
+            return cls.Status.SENT
+        if statuses & {cls.Status.PENDING, cls.Status.SCHEDULED}:
+            return cls.Status.PENDING
+        if statuses and statuses <= {cls.Status.CANCELLED, cls.Status.SUPPRESSED, cls.Status.COALESCED}:
+            return cls.Status.CANCELLED
+        return cls.Status.ERROR
+
+
+class Suppression(models.Model):
+    """A recipient address that a service must no longer send to.
+
+    Recipients are stored normalised (see :meth:`normalize`) so lookups are exact
+    matches. Hard bounces reported by delivery webhooks are added automatically.
+    """
+
+    class Reason(models.TextChoices):
+        BOUNCE = "bounce", "Hard bounce"
+        COMPLAINT = "complaint", "Spam complaint"
+        UNSUBSCRIBE = "unsubscribe", "Unsubscribed"
+        MANUAL = "manual", "Manual"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    service = models.ForeignKey("Service", on_delete=models.CASCADE, related_name="suppressions")
+    recipient = models.CharField(max_length=320, help_text="Email address, phone number or device id")
+    reason = models.CharField(max_length=20, choices=Reason.choices, default=Reason.MANUAL)
+    # Indexed: suppression indexes refresh incrementally by reading rows newer than their watermark.
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = "suppressions"
+        ordering = ["-created_at"]
+        verbose_name = "Suppression"
+        verbose_name_plural = "Suppressions"
+        constraints = [
+            models.UniqueConstraint(fields=["service", "recipient"], name="suppression_service_recipient_uniq"),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover - trivial
+        return f"{self.recipient} ({self.get_reason_display()})"
+
+    def save(self, *args, **kwargs):
+        self.recipient = self.normalize(self.recipient)
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def normalize(recipient: str) -> str:
+        return normalize_recipient(recipient)
+
+
+class DeliveryStat(models.Model):
+    """Hourly rollup: how many of a service's notifications entered a status, and how fast.
+
+    Maintained incrementally by ``notification.stats.record`` whenever notifications
+    are enqueued, sent or reported on by a delivery webhook, so dashboards read a
+    handful of buckets instead of counting the notifications table.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    service = models.ForeignKey("Service", on_delete=models.CASCADE, related_name="delivery_stats")
+    type = models.CharField(max_length=20, choices=Provider.ProviderType.choices)
+    status = models.CharField(max_length=20, choices=Notification.Status.choices)
+    hour = models.DateTimeField(help_text="Start of the UTC hour")
+    count = models.PositiveBigIntegerField(default=0)
+    # Sum of seconds from enqueue to entering `status`; divide by `count` for the mean.
+    latency_seconds = models.FloatField(default=0)
+
+    class Meta:
+        db_table = "delivery_stats"
+        ordering = ["-hour"]
+        verbose_name = "Delivery statistic"
+        verbose_name_plural = "Delivery statistics"
+        constraints = [
+            # Upsert target; its (service, hour) prefix also serves range reads per service.
+            models.UniqueConstraint(fields=["service", "hour", "type", "status"], name="delivery_stat_bucket_uniq"),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover - trivial
+        return f"{self.service_id} {self.hour:%Y-%m-%d %H}:00 {self.type}/{self.status}: {self.count}"
+
+
+class Attachment(models.Model):
+    """A file stored once, addressed by the SHA-256 digest of its content.
+
+    The bytes live on disk (see ``notification.attachments``); templates and
+    notifications refer to the digest, so a file attached to a whole campaign is
+    one row and one file no matter how many notifications carry it.
+    """
+
+    digest = models.CharField(max_length=64, primary_key=True, editable=False, help_text="SHA-256 of the content")
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=255, default="application/octet-stream")
+    size = models.PositiveBigIntegerField(editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "attachments"
+        ordering = ["-created_at"]
+        verbose_name = "Attachment"
+        verbose_name_plural = "Attachments"
+
+    def __str__(self) -> str:  # pragma: no cover - trivial
+        return f"{self.filename} ({self.digest[:12]})"
+
+    @property
+    def path(self):
+        from .attachments import blob_path
+
+        return blob_path(self.digest)
+
+
+class WorkerNode(models.Model):
+    """A running sending worker, kept alive by its heartbeat (see ``notification.sharding``)."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=255, help_text="Host and process id")
+    started_at = models.DateTimeField(auto_now_add=True)
+    heartbeat_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = "worker_nodes"
+        ordering = ["name"]
+        verbose_name = "Worker node"
+        verbose_name_plural = "Worker nodes"
+
+    def __str__(self) -> str:  # pragma: no cover - trivial
+        return self.name
+
+
+class Shard(models.Model):
+    """One slice of the services, by hash of ``service_id``, leased to the worker that sends its work."""
+
+    number = models.PositiveSmallIntegerField(primary_key=True)
+    owner = models.ForeignKey(WorkerNode, null=True, blank=True, on_delete=models.SET_NULL, related_name="shards")
+    lease_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "shards"
+        ordering = ["number"]
+        verbose_name = "Shard"
+        verbose_name_plural = "Shards"
+
+    def __str__(self) -> str:  # pragma: no cover - trivial
+        return f"Shard {self.number}"
@@ -0,0 +1,23 @@
+"""Sender adapters that deliver notifications through external providers.
+
+Each provider code has a module here (see ``Provider.get_sender_class``) holding
+a ``<Code><Type>Sender`` built on :class:`~notification.provider.base.BaseSender`.
+Senders favour the providers' batch APIs so one HTTP call covers many messages.
+"""
+
+from .base import RESULT_FIELDS, BaseSender, InvalidWebhook
+
+
+class SenderNotFound(LookupError):
+    pass
+
+
+def get_sender(service) -> BaseSender:
+    """Instantiate the sender for ``service``'s provider with the service's config."""
+    sender_cls = service.provider.get_sender_class()
+    if sender_cls is None:
+        raise SenderNotFound(f"No sender available for provider '{service.provider.code}' ({service.provider.type})")
+    return sender_cls(service)
+
+
+__all__ = ["RESULT_FIELDS", "BaseSender", "InvalidWebhook", "SenderNotFound", "get_sender"]
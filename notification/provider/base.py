@@ -0,0 +1,113 @@
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..concurrency import OVERLOAD_STATUSES, limits_for
+from ..models import Notification
+from ..schema.validation import validator_for
+
+# Fields a sender changes on each notification; persisted with one bulk_update per group.
+RESULT_FIELDS = (
+    "status",
+    "http_status",
+    "provider_response",
+    "provider_message_id",
+    "retry_count",
+    "locked_until",
+    "update_at",
+)
+
+
+class InvalidWebhook(Exception):
+    """Raised when a delivery webhook fails signature or freshness checks."""
+
+
+class BaseSender:
+    """Delivers groups of notifications that share one Service, and so one provider config.
+
+    Subclasses implement :meth:`send` and record each outcome with :meth:`mark_sent`
+    or :meth:`mark_failed`; the caller persists the instances afterwards. Provider
+    calls go through :meth:`limited` (usually via :meth:`map_limited`), which keeps
+    them within the service's and its provider account's adaptive concurrency limits.
+    """
+
+    timeout = 10.0
+
+    def __init__(self, service):
+        self.service = service
+        schema_cls = service.provider.get_schema_class()
+        self.config = validator_for(schema_cls).decode(service.config or {}) if schema_cls else None
+        self.limiter = limits_for(service)
+
+    def limited(self, call: Callable[[], tuple[int | None, Any]]) -> tuple[int | None, Any]:
+        """Run one provider ``call`` returning ``(status, body)`` in a concurrency slot.
+
+        Timeouts, connection errors, 429 and 503 answers count as overload and
+        shrink the limit.
+        """
+        with self.limiter.slot() as slot:
+            status, body = call()
+            slot.overloaded = status in OVERLOAD_STATUSES
+        return status, body
+
+    def map_limited(self, func: Callable, items: list) -> list:
+        """``[func(item) for item in items]``, run concurrently up to the service's current limit.
+
+        ``func`` must do its provider calls through :meth:`limited`; the slots, not
+        the thread count, decide how many calls are in flight.
+        """
+        if len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(len(items), self.limiter.max_limit)) as pool:
+            return list(pool.map(func, items))
+
+    def send(self, notifications: list[Notification]) -> None:
+        raise NotImplementedError
+
+    def parse_webhook(self, body: bytes, headers) -> list:
+        """Verify a delivery webhook and return its :class:`~notification.events.DeliveryEvent` list.
+
+        Providers without delivery webhooks keep this default and get a 404.
+        """
+        raise NotImplementedError
+
+    def mark_sent(self, notification: Notification, http_status: int | None, response, message_id: str = "") -> None:
+        notification.status = Notification.Status.SENT
+        notification.provider_message_id = message_id
+        notification.http_status = str(http_status or "")
+        notification.provider_response = response
+        notification.locked_until = None
+        notification.update_at = timezone.now()
+
+    def mark_failed(self, notification: Notification, http_status: int | None, response) -> None:
+        """Record a failure; transient ones (no response, 429, 5xx) are retried with backoff.
+
+        A retried notification stays PENDING and its lease is pushed out to the
+        backoff time, so no separate retry queue is needed.
+        """
+        now = timezone.now()
+        notification.http_status = str(http_status or "")
+        notification.provider_response = response
+        notification.update_at = now
+        transient = http_status is None or http_status == 429 or http_status >= 500
+        if transient and notification.retry_count < getattr(settings, "NOTIFICATION_MAX_RETRIES", 5):
+            notification.retry_count += 1
+            backoff = getattr(settings, "NOTIFICATION_RETRY_BACKOFF", 30) * 2 ** (notification.retry_count - 1)
+            notification.locked_until = now + timedelta(seconds=backoff)
+        else:
+            notification.status = Notification.Status.ERROR
+            notification.locked_until = None
+
+    @staticmethod
+    def recipients(notification: Notification) -> list[str]:
+        to = notification.payload_config.get("to") or []
+        return [to] if isinstance(to, str) else list(to)
+
+    @staticmethod
+    def chunks(items: list, size: int):
+        for start in range(0, len(items), max(1, size)):
+            yield items[start : start + size]
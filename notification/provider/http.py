@@ -0,0 +1,134 @@
+"""Minimal stdlib HTTP helpers shared by the provider senders."""
+
+import base64
+import json
+import mmap
+import os
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from typing import Any
+
+DEFAULT_TIMEOUT = 10.0
+
+# File parts of multipart bodies are sent in pieces of this size.
+STREAM_CHUNK_SIZE = 256 * 1024
+
+
+def basic_auth(username: str, password: str) -> str:
+    token = base64.b64encode(f"{username}:{password}".encode()).decode("ascii")
+    return f"Basic {token}"
+
+
+def post_json(url: str, payload: Any, *, headers: dict[str, str] | None = None, timeout: float = DEFAULT_TIMEOUT):
+    """POST ``payload`` as JSON; return ``(status, decoded_body)``."""
+    data = json.dumps(payload).encode()
+    return _send(url, data, {"Content-Type": "application/json", **(headers or {})}, timeout)
+
+
+def post_form(
+    url: str, fields: list[tuple[str, str]], *, headers: dict[str, str] | None = None, timeout: float = DEFAULT_TIMEOUT
+):
+    """POST repeated form ``fields`` (url-encoded); return ``(status, decoded_body)``."""
+    data = urllib.parse.urlencode(fields).encode()
+    return _send(url, data, {"Content-Type": "application/x-www-form-urlencoded", **(headers or {})}, timeout)
+
+
+def post_multipart(
+    url: str,
+    fields: list[tuple[str, str]],
+    files: list[tuple[str, str, str, str | os.PathLike]],
+    *,
+    headers: dict[str, str] | None = None,
+    timeout: float = DEFAULT_TIMEOUT,
+):
+    """POST form ``fields`` plus ``files`` as multipart/form-data; return ``(status, decoded_body)``.
+
+    ``files`` are ``(field, filename, content_type, path)`` tuples; their content
+    is streamed from disk, never read into memory whole.
+    """
+    body = MultipartBody(fields, files)
+    headers = {"Content-Type": body.content_type, "Content-Length": str(len(body)), **(headers or {})}
+    return _send(url, body, headers, timeout)
+
+
+class MultipartBody:
+    """A multipart/form-data body that streams its file parts.
+
+    Iterating yields the encoded form fields and part headers, then each file in
+    ``STREAM_CHUNK_SIZE`` pieces read from a read-only memory map (plain reads for
+    files that cannot be mapped, such as empty ones). The length is known up front
+    from the file sizes, and the body can be iterated again for a retry.
+    """
+
+    def __init__(self, fields: list[tuple[str, str]], files: list[tuple[str, str, str, str | os.PathLike]]):
+        self.boundary = uuid.uuid4().hex
+        self._parts: list[bytes | str | os.PathLike] = []
+        for name, value in fields:
+            self._parts.append(self._header(name) + str(value).encode() + b"\r\n")
+        for name, filename, content_type, path in files:
+            self._parts += [self._header(name, filename, content_type), path, b"\r\n"]
+        self._parts.append(f"--{self.boundary}--\r\n".encode())
+        self._length = sum(len(p) if isinstance(p, bytes) else os.path.getsize(p) for p in self._parts)
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self):
+        for part in self._parts:
+            if isinstance(part, bytes):
+                yield part
+            else:
+                yield from _stream_file(part)
+
+    def _header(self, name: str, filename: str | None = None, content_type: str | None = None) -> bytes:
+        disposition = f'form-data; name="{_quote(name)}"'
+        if filename is not None:
+            disposition += f'; filename="{_quote(filename)}"'
+        lines = [f"--{self.boundary}", f"Content-Disposition: {disposition}"]
+        if content_type:
+            lines.append(f"Content-Type: {content_type}")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+
+def _quote(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\r", " ").replace("\n", " ")
+
+
+def _stream_file(path: str | os.PathLike):
+    with open(path, "rb") as file:
+        try:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # Empty files (and some special files) cannot be mapped.
+            while chunk := file.read(STREAM_CHUNK_SIZE):
+                yield chunk
+            return
+        with mapped:
+            # Slices are copies, so no buffer export outlives the map.
+            for start in range(0, len(mapped), STREAM_CHUNK_SIZE):
+                yield mapped[start : start + STREAM_CHUNK_SIZE]
+
+
+def _send(url: str, data: bytes | MultipartBody, headers: dict[str, str], timeout: float) -> tuple[int | None, Any]:
+    """Return ``(status, body)``; ``status`` is None when no HTTP response was received."""
+    request = urllib.request.Request(url, data=data, headers={"Accept": "application/json", **headers}, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, _decode(response.read())
+    except urllib.error.HTTPError as exc:
+        return exc.code, _decode(exc.read())
+    except (urllib.error.URLError, OSError) as exc:
+        return None, {"error": str(getattr(exc, "reason", exc))}
+
+
+def _decode(body: bytes) -> Any:
+    try:
+        return json.loads(body) if body else {}
+    except ValueError:
+        return {"raw": body.decode(errors="replace")}
@@ -0,0 +1,59 @@
+from urllib.parse import urljoin
+
+from ..models import Notification
+from ..schema.request import InfobipSmsRequest
+from .base import BaseSender
+from .http import post_json
+
+
+class InfobipSmsSender(BaseSender):
+    """Submits SMS in bulk: up to ``batch_size`` messages per Infobip API call.
+
+    Infobip answers with one status entry per destination, in request order, which
+    is how results are mapped back onto notifications. Chunks are submitted
+    concurrently up to the service's adaptive concurrency limit.
+    """
+
+    path = "sms/2/text/advanced"
+
+    def build_request(self, notification: Notification) -> InfobipSmsRequest:
+        return InfobipSmsRequest(
+            sender=notification.payload_config.get("sender") or self.config.sender,
+            to=self.recipients(notification),
+            text=notification.plain_text or notification.content,
+        )
+
+    def send(self, notifications: list[Notification]) -> None:
+        url = urljoin(self.config.base_url, self.path)
+        headers = {"Authorization": f"App {self.config.api_key}"}
+        self.map_limited(
+            lambda chunk: self._send_chunk(url, headers, chunk),
+            list(self.chunks(notifications, self.config.batch_size)),
+        )
+
+    def _send_chunk(self, url: str, headers: dict, chunk: list[Notification]) -> None:
+        requests = [self.build_request(n) for n in chunk]
+        messages = [
+            {
+                "destinations": [{"to": to} for to in r.to],
+                "text": r.text,
+                **({"from": r.sender} if r.sender else {}),
+            }
+            for r in requests
+        ]
+        status, body = self.limited(
+            lambda: post_json(url, {"messages": messages}, headers=headers, timeout=self.timeout)
+        )
+        if status != 200:
+            for notification in chunk:
+                self.mark_failed(notification, status, body)
+            return
+
+        results = iter(body.get("messages", []))
+        for notification, request in zip(chunk, requests, strict=True):
+            entries = [next(results, {}) for _ in request.to]
+            response = {"bulkId": body.get("bulkId"), "messages": entries}
+            if any(e.get("status", {}).get("groupName") not in (None, "REJECTED") for e in entries):
+                self.mark_sent(notification, status, response)
+            else:
+                self.mark_failed(notification, 400, response)
@@ -0,0 +1,121 @@
+import hashlib
+import hmac
+import json
+import time
+from collections.abc import Sequence
+from datetime import UTC, datetime
+from urllib.parse import urljoin
+
+from .. import attachments
+from ..events import DeliveryEvent
+from ..models import Attachment, Notification
+from ..schema.request import MailgunEmailRequest
+from .base import BaseSender, InvalidWebhook
+from .http import basic_auth, post_form, post_multipart
+
+# Mailgun webhook event -> notification status. Temporary failures are retried by
+# Mailgun itself and engagement events do not change delivery status.
+WEBHOOK_STATUSES = {
+    "delivered": Notification.Status.DELIVERED,
+    ("failed", "permanent"): Notification.Status.BOUNCED,
+}
+
+# Reject signatures older than this to limit replay.
+WEBHOOK_MAX_AGE = 15 * 60
+
+
+class MailgunEmailSender(BaseSender):
+    """Sends each notification with one Mailgun messages API call.
+
+    Messages are rendered per recipient before they are enqueued, so there is no
+    shared body to batch; calls run concurrently up to the service's adaptive
+    concurrency limit. Notifications
+    with attachments are posted as multipart/form-data with the files streamed
+    from attachment storage; the attachment rows of the whole group are loaded
+    once.
+    """
+
+    def build_request(self, notification: Notification, files: Sequence[Attachment] = ()) -> MailgunEmailRequest:
+        payload = notification.payload_config
+        return MailgunEmailRequest(
+            sender=payload.get("sender", ""),
+            to=self.recipients(notification),
+            subject=payload.get("subject", ""),
+            cc=payload.get("cc"),
+            bcc=payload.get("bcc"),
+            text=notification.plain_text or notification.content,
+            html=notification.content if notification.plain_text else None,
+            attachments=[a.digest for a in files] or None,
+        )
+
+    def send(self, notifications: list[Notification]) -> None:
+        headers = {"Authorization": basic_auth(self.config.username or "api", self.config.api_key)}
+        files_by_notification = attachments.for_notifications(notifications)
+
+        def send_one(notification: Notification) -> None:
+            files = files_by_notification.get(notification.id, [])
+            request = self.build_request(notification, files)
+            domain = self.config.domain or request.sender.rpartition("@")[2].rstrip(">")
+            url = urljoin(self.config.base_url, f"v3/{domain}/messages")
+            if files:
+                parts = [("attachment", a.filename, a.content_type, a.path) for a in files]
+                status, body = self.limited(
+                    lambda: post_multipart(url, self._fields(request), parts, headers=headers, timeout=self.timeout)
+                )
+            else:
+                status, body = self.limited(
+                    lambda: post_form(url, self._fields(request), headers=headers, timeout=self.timeout)
+                )
+            if status == 200:
+                self.mark_sent(notification, status, body, message_id=str(body.get("id", "")).strip("<>"))
+            else:
+                self.mark_failed(notification, status, body)
+
+        self.map_limited(send_one, notifications)
+
+    @staticmethod
+    def _fields(request: MailgunEmailRequest) -> list[tuple[str, str]]:
+        fields = [("from", request.sender), ("subject", request.subject)]
+        fields += [("to", address) for address in request.to]
+        fields += [("cc", address) for address in request.cc or []]
+        fields += [("bcc", address) for address in request.bcc or []]
+        if request.text:
+            fields.append(("text", request.text))
+        if request.html:
+            fields.append(("html", request.html))
+        return fields
+
+    def parse_webhook(self, body: bytes, headers) -> list[DeliveryEvent]:
+        """Verify a Mailgun webhook (HMAC-SHA256 of timestamp + token) and map its event."""
+        if not self.config.webhook_signing_key:
+            raise InvalidWebhook("No webhook_signing_key configured for this service.")
+        try:
+            data = json.loads(body)
+            signature = data["signature"]
+            event_data = data["event-data"]
+            timestamp = str(signature["timestamp"])
+            digest = hmac.new(
+                self.config.webhook_signing_key.encode(), (timestamp + signature["token"]).encode(), hashlib.sha256
+            ).hexdigest()
+        except (ValueError, KeyError, TypeError) as exc:
+            raise InvalidWebhook("Malformed webhook payload.") from exc
+        if not hmac.compare_digest(digest, str(signature.get("signature", ""))):
+            raise InvalidWebhook("Invalid webhook signature.")
+        if abs(time.time() - float(timestamp)) > WEBHOOK_MAX_AGE:
+            raise InvalidWebhook("Stale webhook timestamp.")
+
+        event = event_data.get("event", "")
+        status = WEBHOOK_STATUSES.get(event) or WEBHOOK_STATUSES.get((event, event_data.get("severity")))
+        message_id = (event_data.get("message", {}).get("headers", {}).get("message-id") or "").strip("<>")
+        if not status or not message_id:
+            return []
+        occurred_at = datetime.fromtimestamp(float(event_data.get("timestamp", timestamp)), tz=UTC)
+        return [
+            DeliveryEvent(
+                message_id=message_id,
+                status=status,
+                event=event,
+                recipient=event_data.get("recipient", ""),
+                occurred_at=occurred_at,
+            )
+        ]
@@ -0,0 +1,82 @@
+import json
+from collections import defaultdict
+from urllib.parse import urljoin
+
+from ..models import Notification
+from ..schema.request import OnesignalPushRequest
+from .base import BaseSender
+from .http import post_json
+
+
+class OnesignalPushSender(BaseSender):
+    """Multicasts push notifications: one OneSignal call per ``batch_size`` devices.
+
+    Notifications with identical title, body and data (e.g. a broadcast alert
+    enqueued once per user) are merged, so a 100k-device broadcast takes
+    ``100k / batch_size`` calls instead of one call per device, made concurrently
+    up to the service's adaptive concurrency limit.
+    """
+
+    path = "notifications"
+
+    def build_request(self, notification: Notification) -> OnesignalPushRequest:
+        payload = notification.payload_config
+        return OnesignalPushRequest(
+            to=self.recipients(notification),
+            title=payload.get("subject"),
+            body=notification.plain_text or notification.content,
+            data=payload.get("data"),
+        )
+
+    def send(self, notifications: list[Notification]) -> None:
+        groups: dict[str, list[tuple[Notification, OnesignalPushRequest]]] = defaultdict(list)
+        for notification in notifications:
+            request = self.build_request(notification)
+            key = json.dumps([request.title, request.body, request.data], sort_keys=True, default=str)
+            groups[key].append((notification, request))
+        for members in groups.values():
+            self._send_group(members)
+
+    def _send_group(self, members: list[tuple[Notification, OnesignalPushRequest]]) -> None:
+        url = urljoin(self.config.base_url, self.path)
+        headers = {"Authorization": f"Key {self.config.api_key}"}
+        template = members[0][1]
+        devices = [(notification, token) for notification, request in members for token in request.to]
+
+        accepted: dict = defaultdict(list)
+        rejected: dict = defaultdict(list)
+        failures: dict = {}
+
+        def call(chunk):
+            payload = {
+                "app_id": self.config.app_id,
+                "include_subscription_ids": [token for _, token in chunk],
+                "contents": {"en": template.body},
+                **({"headings": {"en": template.title}} if template.title else {}),
+                **({"data": template.data} if template.data else {}),
+            }
+            return self.limited(lambda: post_json(url, payload, headers=headers, timeout=self.timeout))
+
+        chunks = list(self.chunks(devices, self.config.batch_size))
+        for chunk, (status, body) in zip(chunks, self.map_limited(call, chunks), strict=True):
+            if status != 200 or not isinstance(body, dict) or not body.get("id"):
+                for notification, _ in chunk:
+                    failures[notification.id] = (status if status != 200 else 400, body)
+                continue
+            errors = body.get("errors")
+            invalid = set(errors.get("invalid_player_ids", [])) if isinstance(errors, dict) else set()
+            for notification, token in chunk:
+                (rejected if token in invalid else accepted)[notification.id].append((token, body["id"]))
+
+        for notification, _ in members:
+            response = {
+                "ids": sorted({call_id for _, call_id in accepted[notification.id]}),
+                "invalid": [token for token, _ in rejected[notification.id]],
+            }
+            if accepted[notification.id]:
+                self.mark_sent(notification, 200, response)
+            elif notification.id in failures:
+                status, body = failures[notification.id]
+                self.mark_failed(notification, status, {**response, "error": body})
+            else:
+                self.mark_failed(notification, 400, response)
@@ -0,0 +1,118 @@
+"""Local stand-in servers that mimic the provider APIs.
+
+Used by the test suite and handy for local development: point a Service's
+``base_url`` at ``StandInServer.base_url`` and every request is recorded and
+answered by a responder function instead of reaching the real provider.
+
+    with StandInServer(infobip_responder) as server:
+        service.config["base_url"] = server.base_url
+        ...
+        assert len(server.requests) == 1
+"""
+
+import email.policy
+import json
+import threading
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs
+
+
+@dataclass(frozen=True)
+class RecordedRequest:
+    path: str
+    headers: dict[str, str]
+    body: bytes
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+    def form(self) -> dict[str, list[str]]:
+        return parse_qs(self.body.decode())
+
+    def parts(self) -> list[tuple[str, str | None, bytes]]:
+        """``(name, filename, content)`` of each part of a multipart/form-data body."""
+        head = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode()
+        message = BytesParser(policy=email.policy.HTTP).parsebytes(head + self.body)
+        return [
+            (part.get_param("name", header="content-disposition"), part.get_filename(), part.get_payload(decode=True))
+            for part in message.iter_parts()
+        ]
+
+
+Responder = Callable[[RecordedRequest], tuple[int, Any]]
+
+
+class StandInServer:
+    """Threaded HTTP server on an ephemeral localhost port; use as a context manager."""
+
+    def __init__(self, responder: Responder):
+        self.responder = responder
+        self.requests: list[RecordedRequest] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def __enter__(self) -> "StandInServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                request = RecordedRequest(self.path, dict(self.headers.items()), body)
+                with server._lock:
+                    server.requests.append(request)
+                status, payload = server.responder(request)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def mailgun_responder(request: RecordedRequest) -> tuple[int, Any]:
+    return 200, {"id": f"<{uuid.uuid4()}@stand-in>", "message": "Queued. Thank you."}
+
+
+def infobip_responder(request: RecordedRequest) -> tuple[int, Any]:
+    """Accept every destination; numbers starting with '000' are rejected."""
+    messages = []
+    for message in request.json()["messages"]:
+        for destination in message["destinations"]:
+            rejected = destination["to"].startswith("000")
+            group = "REJECTED" if rejected else "PENDING"
+            messages.append({"to": destination["to"], "messageId": str(uuid.uuid4()), "status": {"groupName": group}})
+    return 200, {"bulkId": str(uuid.uuid4()), "messages": messages}
+
+
+def onesignal_responder(request: RecordedRequest) -> tuple[int, Any]:
+    """Accept every subscription id; ids starting with 'invalid' are reported as invalid."""
+    ids = request.json()["include_subscription_ids"]
+    invalid = [i for i in ids if i.startswith("invalid")]
+    if len(invalid) == len(ids):
+        return 200, {"id": "", "errors": ["All included players are not subscribed"]}
+    return 200, {"id": str(uuid.uuid4()), **({"errors": {"invalid_player_ids": invalid}} if invalid else {})}
@@ -0,0 +1,224 @@
+"""Queue backends between the enqueue path and sending workers.
+
+The ``notifications`` row stays the source of truth for every message; a queue
+backend only decides which PENDING rows a worker gets next. The enqueue views
+hand freshly inserted notifications to :meth:`QueueBackend.enqueue`, and
+:class:`~notification.dispatch.NotificationWorker` calls :meth:`~QueueBackend.claim`,
+runs the batch, then :meth:`~QueueBackend.settle` it: final outcomes are acked,
+notifications still PENDING (a retry with backoff) are nacked until their
+``locked_until``.
+
+* :class:`DatabaseQueue` (the default) is a transactional outbox: a PENDING row,
+  inserted in the same transaction as everything else about the notification,
+  is the queue entry. Claims lease rows with :class:`~notification.dispatch.FairClaimer`
+  (priority lanes, per-service fairness, shards), and enqueues announce work with
+  ``NOTIFY`` after commit.
+* :class:`MemoryQueue` keeps the ready work in process-local heaps, so a claim is
+  a heap pop plus one primary-key read of the rows, with no lease write. Only a
+  consuming process (one that claims, or was created with ``consumer=True``)
+  pushes its own enqueues onto the heaps; elsewhere, such as in API processes,
+  enqueue just wakes listening workers. Rows written by other processes (the API,
+  the scheduler, a bulk requeue) are relayed from the outbox by a sweep every
+  ``sweep_interval`` seconds (``NOTIFICATION_QUEUE_SWEEP``, default 1;
+  ``math.inf`` turns it off). It has no leases shared between processes, so it is
+  for tests and single-node deployments only.
+
+Choose one with ``NOTIFICATION_QUEUE_BACKEND`` (a dotted path, default
+``"notification.queues.DatabaseQueue"``). ``python manage.py benchmark_queue``
+compares the backends.
+"""
+
+import functools
+import heapq
+import math
+import threading
+import time
+from collections.abc import Iterable, Sequence
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .channel import notify_pending
+from .models import Notification
+from .snapshots import snapshots
+
+DEFAULT_LEASE = timedelta(minutes=5)
+
+# Outbox rows a MemoryQueue sweep relays at most.
+SWEEP_LIMIT = 10000
+
+
+class QueueBackend:
+    """Interface of a queue backend; see the module docstring."""
+
+    def enqueue(self, notifications: Sequence[Notification]) -> None:
+        """Make the PENDING ones of ``notifications`` (already inserted) available to workers."""
+        raise NotImplementedError
+
+    def claim(self, batch_size: int = 100, *, lease: timedelta = DEFAULT_LEASE) -> list[Notification]:
+        """Take up to ``batch_size`` notifications for ``lease``; most urgent first, with snapshots attached."""
+        raise NotImplementedError
+
+    def ack(self, notifications: Sequence[Notification]) -> None:
+        """Drop claimed notifications that reached a final status."""
+        raise NotImplementedError
+
+    def nack(self, notifications: Sequence[Notification], *, delay: timedelta | None = None) -> None:
+        """Hand claimed notifications back, claimable after ``delay`` or, by default, at their ``locked_until``."""
+        raise NotImplementedError
+
+    def settle(self, batch: Sequence[Notification]) -> None:
+        """Ack or nack a handled batch by the status each notification was left in."""
+        self.ack([n for n in batch if n.status != Notification.Status.PENDING])
+        self.nack([n for n in batch if n.status == Notification.Status.PENDING])
+
+
+class DatabaseQueue(QueueBackend):
+    """The ``notifications`` table as a transactional outbox, claimed with leases."""
+
+    def __init__(self, *, using: str = DEFAULT_DB_ALIAS, claimer=None):
+        from .dispatch import FairClaimer
+
+        self.using = using
+        self.claimer = claimer or FairClaimer(using=using)
+
+    def enqueue(self, notifications: Sequence[Notification]) -> None:
+        if any(n.status == Notification.Status.PENDING for n in notifications):
+            notify_pending(self.using)
+
+    def claim(self, batch_size: int = 100, *, lease: timedelta = DEFAULT_LEASE) -> list[Notification]:
+        return self.claimer.claim(batch_size, lease=lease)
+
+    def ack(self, notifications: Sequence[Notification]) -> None:
+        # The handler has already written the outcome, which takes the row out of the PENDING outbox.
+        pass
+
+    def nack(self, notifications: Sequence[Notification], *, delay: timedelta | None = None) -> None:
+        # Without a delay the row's own locked_until (the lease or the retry backoff) already applies.
+        if delay is not None and notifications:
+            Notification.objects.using(self.using).filter(id__in=[n.id for n in notifications]).update(
+                locked_until=timezone.now() + delay
+            )
+
+
+class MemoryQueue(QueueBackend):
+    """Process-local priority queue fed by enqueues and by sweeps of the outbox; thread-safe."""
+
+    def __init__(self, *, using: str = DEFAULT_DB_ALIAS, sweep_interval: float | None = None, consumer: bool = False):
+        self.using = using
+        # Set by the first claim: a process that never claims would only grow its heaps.
+        self.consumer = consumer
+        self.sweep_interval = (
+            sweep_interval if sweep_interval is not None else getattr(settings, "NOTIFICATION_QUEUE_SWEEP", 1.0)
+        )
+        self._ready: list = []  # (priority, created_at, id)
+        self._delayed: list = []  # (available_at, priority, created_at, id)
+        self._queued: set = set()
+        self._in_flight: dict = {}  # id -> (lease deadline, priority, created_at)
+        self._swept_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._queued)
+
+    def enqueue(self, notifications: Sequence[Notification]) -> None:
+        entries = [
+            (n.locked_until.timestamp() if n.locked_until else 0.0, n.priority, n.created_at.timestamp(), n.id)
+            for n in notifications
+            if n.status == Notification.Status.PENDING
+        ]
+        if not entries:
+            return
+        if self.consumer:
+            transaction.on_commit(lambda: self._push(entries), using=self.using)
+        else:
+            # The consuming process picks the rows up with its next sweep.
+            notify_pending(self.using)
+
+    def _push(self, entries: Iterable[tuple]) -> None:
+        with self._lock:
+            for available_at, priority, created_at, pk in entries:
+                if pk in self._queued or pk in self._in_flight:
+                    continue
+                self._queued.add(pk)
+                heapq.heappush(self._delayed, (available_at, priority, created_at, pk))
+
+    def claim(self, batch_size: int = 100, *, lease: timedelta = DEFAULT_LEASE) -> list[Notification]:
+        self.consumer = True
+        self._sweep()
+        now = time.time()
+        deadline = now + lease.total_seconds()
+        with self._lock:
+            # Expired claims (a handler that crashed without settling) come back first.
+            for pk, (until, priority, created_at) in list(self._in_flight.items()):
+                if until <= now:
+                    del self._in_flight[pk]
+                    self._queued.add(pk)
+                    heapq.heappush(self._ready, (priority, created_at, pk))
+            while self._delayed and self._delayed[0][0] <= now:
+                _, priority, created_at, pk = heapq.heappop(self._delayed)
+                heapq.heappush(self._ready, (priority, created_at, pk))
+            taken = []
+            while self._ready and len(taken) < batch_size:
+                priority, created_at, pk = heapq.heappop(self._ready)
+                self._queued.discard(pk)
+                self._in_flight[pk] = (deadline, priority, created_at)
+                taken.append(pk)
+        if not taken:
+            return []
+        # Rows cancelled, sent or otherwise moved on since they were queued are dropped here.
+        batch = list(
+            Notification.objects.using(self.using)
+            .filter(id__in=taken, status=Notification.Status.PENDING)
+            .order_by("priority", "created_at")
+        )
+        locked_until = timezone.now() + lease
+        for notification in batch:
+            notification.locked_until = locked_until
+        if len(batch) < len(taken):
+            self.ack([Notification(id=pk) for pk in set(taken) - {n.id for n in batch}])
+        snapshots.attach(batch)
+        return batch
+
+    def ack(self, notifications: Sequence[Notification]) -> None:
+        with self._lock:
+            for notification in notifications:
+                self._in_flight.pop(notification.id, None)
+
+    def nack(self, notifications: Sequence[Notification], *, delay: timedelta | None = None) -> None:
+        now = timezone.now()
+        with self._lock:
+            for notification in notifications:
+                entry = self._in_flight.pop(notification.id, None)
+                if entry is None or notification.id in self._queued:
+                    continue
+                available = now + delay if delay is not None else notification.locked_until or now
+                self._queued.add(notification.id)
+                heapq.heappush(self._delayed, (available.timestamp(), entry[1], entry[2], notification.id))
+
+    def _sweep(self) -> None:
+        """Relay PENDING rows this process has not seen from the outbox."""
+        from .dispatch import claimable
+
+        now = time.monotonic()
+        with self._lock:
+            if self.sweep_interval == math.inf or now - self._swept_at < self.sweep_interval:
+                return
+            self._swept_at = now
+            known = self._queued | self._in_flight.keys()
+        rows = (
+            claimable(self.using)
+            .order_by("priority", "created_at")
+            .values_list("id", "priority", "created_at")[:SWEEP_LIMIT]
+        )
+        self._push((0.0, priority, created_at.timestamp(), pk) for pk, priority, created_at in rows if pk not in known)
+
+
+@functools.cache
+def get_queue() -> QueueBackend:
+    """The process-wide queue backend named by ``NOTIFICATION_QUEUE_BACKEND``."""
+    return import_string(getattr(settings, "NOTIFICATION_QUEUE_BACKEND", "notification.queues.DatabaseQueue"))()
@@ -0,0 +1,64 @@
+"""Database routing between the primary and an optional read replica.
+
+Writes always go to the primary. Reads only go to the replica (the alias named
+by ``settings.NOTIFICATION_READ_REPLICA``) inside an explicit ``read_from_replica()``
+block, so ordinary request/response cycles keep read-your-writes consistency and
+only traffic known to be read-only (admin changelists, status lookups, exports)
+is offloaded.
+"""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_replica_reads: ContextVar[bool] = ContextVar("notification_replica_reads", default=False)
+
+
+def replica_alias() -> str | None:
+    """Return the configured replica alias, or None when no replica is configured."""
+    return getattr(settings, "NOTIFICATION_READ_REPLICA", None)
+
+
+@contextmanager
+def read_from_replica() -> Iterator[None]:
+    """Route ORM reads made inside this block to the replica, if one is configured.
+
+    The flag lives in a ContextVar so it follows async views into the threads used
+    by the async ORM and does not leak between concurrent requests.
+    """
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """Send opted-in reads to the replica and everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if not alias or not _replica_reads.get():
+            return None
+        # Inside a transaction on the primary the replica may not see our own writes yet.
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is populated by replication, never by migrations.
+        if db == replica_alias():
+            return False
+        return None
@@ -0,0 +1,78 @@
+"""Releasing scheduled notifications once they are due, and cancelling them.
+
+Scheduled rows sit in the SCHEDULED status until ``send_at`` passes. Every scan
+walks ``notif_status_send_at_idx`` from the earliest ``send_at`` and stops at the
+first row still in the future, so millions of far-future notifications cost
+nothing until they come due. Released rows become PENDING and flow through the
+normal claim path; due digest windows are merged first (see ``notification.digest``).
+"""
+
+from datetime import datetime
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from . import bulk, stats
+from .channel import notify_pending
+from .digest import coalesce
+from .models import Notification, Service
+
+
+def scheduled(using: str = DEFAULT_DB_ALIAS):
+    return Notification.objects.using(using).filter(status=Notification.Status.SCHEDULED)
+
+
+def release_due(batch_size: int = 1000, *, now: datetime | None = None, using: str = DEFAULT_DB_ALIAS) -> int:
+    """Move up to ``batch_size`` due SCHEDULED notifications to PENDING.
+
+    Returns the number released; callers loop while it equals ``batch_size``.
+    """
+    now = now or timezone.now()
+    with transaction.atomic(using=using):
+        qs = scheduled(using).filter(send_at__lte=now).order_by("send_at")
+        if connections[using].features.has_select_for_update_skip_locked:
+            qs = qs.select_for_update(skip_locked=True)
+        rows = list(qs.values_list("id", "digest_key")[:batch_size])
+        if not rows:
+            return 0
+        ids = {pk for pk, _ in rows}
+        keys = {key for _, key in rows if key}
+        if keys:
+            # Pull in every due row of these windows so a batch boundary never splits a digest.
+            group = list(
+                qs.filter(digest_key__in=keys)
+                .order_by()
+                .only("id", "digest_key", "content", "plain_text", "payload_config", "attachments", "created_at")
+            )
+            ids |= {n.id for n in group}
+            ids -= set(coalesce(group, using))
+        released = stats.record_update(
+            Notification.objects.using(using).filter(id__in=ids, status=Notification.Status.SCHEDULED),
+            status=Notification.Status.PENDING,
+        )
+        notify_pending(using)
+    return released
+
+
+def seconds_until_next_due(*, now: datetime | None = None, using: str = DEFAULT_DB_ALIAS) -> float | None:
+    """Seconds until the earliest SCHEDULED notification is due, or None if there is none.
+
+    A single index probe; workers use it to shorten their idle wait.
+    """
+    send_at = scheduled(using).order_by("send_at").values_list("send_at", flat=True).first()
+    if send_at is None:
+        return None
+    return max(0.0, (send_at - (now or timezone.now())).total_seconds())
+
+
+def cancel(
+    service: Service, request_id: str, *, chunk_size: int = bulk.DEFAULT_CHUNK_SIZE, using: str = DEFAULT_DB_ALIAS
+) -> int:
+    """Cancel not-yet-sent notifications by ``request_id``; returns the number cancelled.
+
+    Walks ``notif_service_request_idx`` one chunk of ids at a time (``bulk.cancel``),
+    so a request with millions of scheduled rows never builds one huge statement.
+    """
+    return bulk.cancel(
+        Notification.objects.using(using).filter(service=service, request_id=request_id), chunk_size=chunk_size
+    )
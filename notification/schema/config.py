@@ -11,9 +11,52 @@ class MailgunEmail:
         - base_url: str  - The base url. For accounts in the US, the value is 'https://api.mailgun.net/' and
         for EU 'https://api.eu.mailgun.net/'
         - username: str  - The username for the given account. Typically api or your choosen username.
+        - domain: str | None - The sending domain. Defaults to the domain of each message's sender address.
+        - webhook_signing_key: str | None - The HTTP webhook signing key used to verify delivery events
+        posted to /api/webhooks/<service id>/.
 
     """
 
     api_key: str
     base_url: str | None = "https://api.mailgun.net/"
     username: str | None = "api"
+    domain: str | None = None
+    webhook_signing_key: str | None = None
+
+
+@dataclass(frozen=True)
+class InfobipSms:
+    """
+    # Infobip SMS configuration
+    ### Attributes:
+
+        - api_key: str   - The API key used in the 'Authorization: App <api_key>' header.
+        - base_url: str  - Your account's personal base url, e.g. 'https://xxxxx.api.infobip.com/'.
+        - sender: str | None - Default sender id or number when a notification does not set one.
+        - batch_size: int - Maximum number of messages submitted per bulk request (default 1000).
+
+    """
+
+    api_key: str
+    base_url: str
+    sender: str | None = None
+    batch_size: int = 1000
+
+
+@dataclass(frozen=True)
+class OnesignalPush:
+    """
+    # OneSignal push configuration
+    ### Attributes:
+
+        - app_id: str    - The OneSignal app id the devices are subscribed to.
+        - api_key: str   - The app's REST API key.
+        - base_url: str  - The API base url, 'https://api.onesignal.com/' by default.
+        - batch_size: int - Maximum number of device subscription ids per multicast call (default 500).
+
+    """
+
+    app_id: str
+    api_key: str
+    base_url: str | None = "https://api.onesignal.com/"
+    batch_size: int = 500
@@ -19,6 +19,7 @@ class MailgunEmailRequest:
         - html: Optional[str] - The html of the email
         - bcc: Optional[str] - The bcc of the email
         - cc: Optional[str] - The cc of the email
+        - attachments: Optional[List[str]] - SHA-256 digests of stored attachments, sent as 'attachment' parts
 
     """
 
@@ -29,3 +30,51 @@ class MailgunEmailRequest:
     bcc: list[str] | None
     text: str | None
     html: str | None
+    attachments: list[str] | None = None
+
+
+@dataclass(frozen=True)
+class InfobipSmsRequest:
+    """
+    # InfobipSmsRequest
+
+    One message of an Infobip bulk SMS submission; many of these are sent per API call.
+
+    See https://www.infobip.com/docs/api/channels/sms/sms-messaging/outbound-sms/send-sms-message
+
+    ###  Attributes:
+
+        - sender: Optional[str] - The sender id or number. Falls back to the service configuration.
+        - to: List[str] - The recipients' phone numbers in international format
+        - text: str - The message text
+
+    """
+
+    sender: str | None
+    to: list[str]
+    text: str
+
+
+@dataclass(frozen=True)
+class OnesignalPushRequest:
+    """
+    # OnesignalPushRequest
+
+    A push message for one or more devices. Messages with identical content are merged
+    into multicast calls of up to `batch_size` devices.
+
+    See https://documentation.onesignal.com/reference/push-notification
+
+    ###  Attributes:
+
+        - to: List[str] - The device subscription ids
+        - title: Optional[str] - The notification heading
+        - body: str - The notification text
+        - data: Optional[dict] - Custom key-value data delivered to the app
+
+    """
+
+    to: list[str]
+    title: str | None
+    body: str
+    data: dict | None
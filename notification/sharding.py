@@ -0,0 +1,136 @@
+"""Sharding sending work across worker nodes.
+
+Services are split into ``NOTIFICATION_SHARDS`` shards (default 64) by a stable
+hash of ``service_id``. A worker started with ``send_notifications --sharded``
+registers a :class:`~notification.models.WorkerNode` row and, every
+``heartbeat_interval`` seconds, runs :meth:`ShardMembership.heartbeat`:
+
+1. It refreshes its own ``heartbeat_at``. Workers whose heartbeat is older than
+   ``timeout`` are considered dead.
+2. It places the live workers on a consistent-hash ring (:class:`HashRing`) to
+   decide which shards it should own. Every worker computes the same answer, and
+   a node joining or leaving only moves the shards next to it on the ring.
+3. It gives up shards that now belong to someone else, and leases the shards it
+   should own for ``timeout`` seconds. A shard is taken over only once it is
+   free or its lease has run out, so a dead worker's shards move after one
+   ``timeout``, and a handover never has two owners.
+
+:class:`~notification.dispatch.FairClaimer` then only claims the services in
+shards the worker holds an unexpired lease on. Workers no longer compete for the
+same rows and index pages. Each service is sent by one worker at a time, so its
+notifications leave in ``created_at`` order without cross-node coordination.
+The per-row claim lease still guards the moment of a handover.
+"""
+
+import bisect
+import hashlib
+import os
+import socket
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Shard, WorkerNode
+
+# Points per worker on the ring; more points even out the shard counts.
+VIRTUAL_NODES = 64
+
+# Dead workers' rows are deleted once their heartbeat is this many timeouts old.
+FORGET_AFTER_TIMEOUTS = 10
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+def shard_count() -> int:
+    return getattr(settings, "NOTIFICATION_SHARDS", 64)
+
+
+def shard_of(service_id, shards: int | None = None) -> int:
+    """The shard of ``service_id``: the same on every node and across restarts."""
+    return _hash(str(service_id)) % (shards or shard_count())
+
+
+class HashRing:
+    """Consistent-hash ring of ``members`` with ``vnodes`` points each."""
+
+    def __init__(self, members, vnodes: int = VIRTUAL_NODES):
+        points = sorted((_hash(f"{member}#{i}"), str(member)) for member in members for i in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._members = [m for _, m in points]
+
+    def owner(self, key) -> str | None:
+        """The member owning ``key``: the first point clockwise from its hash."""
+        if not self._members:
+            return None
+        index = bisect.bisect(self._hashes, _hash(f"shard:{key}")) % len(self._hashes)
+        return self._members[index]
+
+
+class ShardMembership:
+    """One worker's membership and shard leases; call :meth:`heartbeat` regularly."""
+
+    def __init__(
+        self,
+        name: str | None = None,
+        *,
+        shards: int | None = None,
+        heartbeat_interval: float | None = None,
+        timeout: float | None = None,
+        using: str = DEFAULT_DB_ALIAS,
+    ):
+        self.id = uuid.uuid4()
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.shards = shards or shard_count()
+        self.heartbeat_interval = heartbeat_interval or getattr(settings, "NOTIFICATION_WORKER_HEARTBEAT", 5.0)
+        self.timeout = timeout or getattr(settings, "NOTIFICATION_WORKER_TIMEOUT", 30.0)
+        self.using = using
+        self._owned: dict[int, object] = {}
+        self._last_heartbeat = None
+
+    def heartbeat(self, *, force: bool = False) -> set[int]:
+        """Renew membership and rebalance leases if ``heartbeat_interval`` has passed; return owned shards."""
+        now = timezone.now()
+        if (
+            not force
+            and self._last_heartbeat
+            and (now - self._last_heartbeat).total_seconds() < self.heartbeat_interval
+        ):
+            return self.owned()
+        lease_until = now + timedelta(seconds=self.timeout)
+        workers = WorkerNode.objects.using(self.using)
+        shards = Shard.objects.using(self.using)
+        with transaction.atomic(using=self.using):
+            workers.update_or_create(id=self.id, defaults={"name": self.name, "heartbeat_at": now})
+            if shards.count() != self.shards:
+                shards.bulk_create([Shard(number=n) for n in range(self.shards)], ignore_conflicts=True)
+            live = workers.filter(heartbeat_at__gte=now - timedelta(seconds=self.timeout)).values_list("id", flat=True)
+            ring = HashRing(live)
+            wanted = [n for n in range(self.shards) if ring.owner(n) == str(self.id)]
+            shards.filter(owner_id=self.id).exclude(number__in=wanted).update(owner=None, lease_until=None)
+            shards.filter(
+                Q(owner__isnull=True) | Q(owner_id=self.id) | Q(lease_until__lt=now), number__in=wanted
+            ).update(owner_id=self.id, lease_until=lease_until)
+            self._owned = dict(shards.filter(owner_id=self.id).values_list("number", "lease_until"))
+            workers.filter(heartbeat_at__lt=now - timedelta(seconds=self.timeout * FORGET_AFTER_TIMEOUTS)).delete()
+        self._last_heartbeat = now
+        return self.owned()
+
+    def owned(self) -> set[int]:
+        """Shards whose lease this worker holds and that have not expired."""
+        now = timezone.now()
+        return {number for number, until in self._owned.items() if until and until > now}
+
+    def owns(self, service_id) -> bool:
+        return shard_of(service_id, self.shards) in self.owned()
+
+    def leave(self) -> None:
+        """Release every shard and deregister, so others take over at their next heartbeat."""
+        Shard.objects.using(self.using).filter(owner_id=self.id).update(owner=None, lease_until=None)
+        WorkerNode.objects.using(self.using).filter(id=self.id).delete()
+        self._owned = {}
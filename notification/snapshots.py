@@ -0,0 +1,258 @@
+"""Versioned snapshots of the near-static rows every send reads.
+
+Sending a notification needs its ``Service`` (with the ``Provider``) and its
+``Template``. Those rows change rarely, so instead of joining them onto every
+claimed batch, :data:`snapshots` serves them from two cache levels:
+
+* L1, a dict in each process, trusted for ``NOTIFICATION_SNAPSHOT_LOCAL_TTL``
+  seconds (default 1) before it is revalidated.
+* L2, the Django cache named by ``NOTIFICATION_SNAPSHOT_CACHE`` (default
+  ``"default"``), shared by every process pointed at the same backend: Redis or
+  Memcached across nodes, the local-memory or file backend on a single host.
+
+Every row has a version counter in L2 and snapshots are stored under
+``(model, id, version)`` for ``NOTIFICATION_SNAPSHOT_TTL`` seconds (default 300).
+``post_save``/``post_delete`` bump the counter, right away and again once the
+transaction commits, so the next read on any node misses and reloads; the old
+entry simply expires. Revalidating an L1 entry is a single ``get_many`` of
+version counters for the whole batch. Saving a provider bumps its services,
+whose snapshots embed it.
+
+Misses are loaded in one query per model. To avoid a stampede when a popular row
+changes, one thread per process and one process per key (an ``add`` lock in L2)
+goes to the database; the others wait up to ``NOTIFICATION_SNAPSHOT_LOCK_TIMEOUT``
+seconds (default 2) for its result.
+"""
+
+import copy
+import threading
+import time
+from collections.abc import Iterable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from . import metrics
+from .models import Provider, Service, Template
+
+KEY_PREFIX = "notification:snapshot"
+
+# Seconds between polls of L2 while another process loads a row.
+LOCK_POLL_INTERVAL = 0.05
+
+# L1 entries kept per model before the oldest half is dropped.
+MAX_LOCAL_ENTRIES = 10000
+
+QUERYSETS = {
+    Service: lambda: Service.objects.select_related("provider"),
+    Template: lambda: Template.objects.all(),
+}
+
+
+class SnapshotCache:
+    """Two-level, versioned cache of ``Service`` and ``Template`` rows; thread-safe."""
+
+    def __init__(
+        self,
+        *,
+        alias: str = "default",
+        ttl: float = 300.0,
+        local_ttl: float = 1.0,
+        lock_timeout: float = 2.0,
+    ):
+        self.alias = alias
+        self.ttl, self.local_ttl, self.lock_timeout = ttl, local_ttl, lock_timeout
+        # model -> {pk: (version, instance, validated_at)}
+        self._local: dict = {model: {} for model in QUERYSETS}
+        self._lock = threading.Lock()
+        self._fill_lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _key(self, model, pk, suffix) -> str:
+        return f"{KEY_PREFIX}:{model._meta.model_name}:{pk}:{suffix}"
+
+    def get(self, model, pk):
+        """The snapshot of one row, or None if it does not exist."""
+        return self.get_many(model, [pk]).get(model._meta.pk.to_python(pk))
+
+    def get_many(self, model, pks: Iterable) -> dict:
+        """Map primary keys to copies of their snapshots; missing rows are left out."""
+        wanted = {model._meta.pk.to_python(pk) for pk in pks}
+        found, stale = {}, []
+        now = time.monotonic()
+        with self._lock:
+            local = self._local[model]
+            for pk in wanted:
+                entry = local.get(pk)
+                if entry and now - entry[2] < self.local_ttl:
+                    found[pk] = entry[1]
+                else:
+                    stale.append(pk)
+            self.hits += len(found)
+        if stale:
+            versions = self._versions(model, stale)
+            found.update(self._revalidate(model, versions, now))
+            missing = {pk: v for pk, v in versions.items() if pk not in found}
+            if missing:
+                found.update(self._fetch(model, missing))
+        return {pk: copy.copy(instance) for pk, instance in found.items()}
+
+    def _versions(self, model, pks: list) -> dict:
+        keys = {self._key(model, pk, "version"): pk for pk in pks}
+        versions = self.shared.get_many(keys)
+        unknown = [key for key in keys if key not in versions]
+        if unknown:
+            # A fresh counter starts from the clock, so it never matches an entry
+            # stored under a counter that was evicted.
+            start = time.time_ns()
+            for key in unknown:
+                self.shared.add(key, start, timeout=None)
+            versions.update(self.shared.get_many(unknown))
+        return {keys[key]: version for key, version in versions.items()}
+
+    def _revalidate(self, model, versions: dict, now: float) -> dict:
+        found = {}
+        with self._lock:
+            local = self._local[model]
+            for pk, version in versions.items():
+                entry = local.get(pk)
+                if entry and entry[0] == version:
+                    local[pk] = (version, entry[1], now)
+                    found[pk] = entry[1]
+            self.hits += len(found)
+        return found
+
+    def _fetch(self, model, versions: dict) -> dict:
+        found = self._from_shared(model, versions)
+        missing = {pk: v for pk, v in versions.items() if pk not in found}
+        if missing:
+            with self._fill_lock:
+                # Another thread may have loaded them while we waited.
+                found.update(self._from_shared(model, missing))
+                missing = {pk: v for pk, v in missing.items() if pk not in found}
+                if missing:
+                    found.update(self._load(model, missing))
+        return found
+
+    def _from_shared(self, model, versions: dict) -> dict:
+        keys = {self._key(model, pk, version): pk for pk, version in versions.items()}
+        found = {keys[key]: instance for key, instance in self.shared.get_many(keys).items()}
+        self._remember(model, versions, found, hit=True)
+        return found
+
+    def _load(self, model, versions: dict) -> dict:
+        shared = self.shared
+        locks = {pk: self._key(model, pk, "lock") for pk in versions}
+        mine = {pk for pk, key in locks.items() if shared.add(key, 1, timeout=self.lock_timeout)}
+        found = {}
+        try:
+            if mine:
+                found = self._query(model, {pk: versions[pk] for pk in mine})
+        finally:
+            shared.delete_many([locks[pk] for pk in mine])
+        others = {pk: v for pk, v in versions.items() if pk not in mine}
+        deadline = time.monotonic() + self.lock_timeout
+        while others and time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            ready = self._from_shared(model, others)
+            found.update(ready)
+            others = {pk: v for pk, v in others.items() if pk not in ready}
+        if others:
+            # The other loader is slow or gone: read the rows ourselves.
+            found.update(self._query(model, others))
+        return found
+
+    def _query(self, model, versions: dict) -> dict:
+        rows = QUERYSETS[model]().in_bulk(list(versions))
+        self.shared.set_many({self._key(model, pk, versions[pk]): row for pk, row in rows.items()}, timeout=self.ttl)
+        self._remember(model, versions, rows, hit=False)
+        return rows
+
+    def _remember(self, model, versions: dict, instances: dict, *, hit: bool) -> None:
+        now = time.monotonic()
+        with self._lock:
+            local = self._local[model]
+            if len(local) + len(instances) > MAX_LOCAL_ENTRIES:
+                for pk in list(local)[: len(local) // 2]:
+                    del local[pk]
+            for pk, instance in instances.items():
+                local[pk] = (versions[pk], instance, now)
+            if hit:
+                self.hits += len(instances)
+            else:
+                self.misses += len(versions)
+
+    def invalidate(self, model, pks: Iterable) -> None:
+        """Move the rows to a new version everywhere and drop them from this process."""
+        pks = list(pks)
+        shared = self.shared
+        for pk in pks:
+            try:
+                shared.incr(self._key(model, pk, "version"))
+            except ValueError:
+                shared.set(self._key(model, pk, "version"), time.time_ns(), timeout=None)
+        with self._lock:
+            for pk in pks:
+                self._local[model].pop(pk, None)
+
+    def clear_local(self) -> None:
+        with self._lock:
+            for local in self._local.values():
+                local.clear()
+
+    def collect(self) -> list:
+        return [
+            ("notification_snapshot_hits_total", "counter", "Snapshot reads served from L1 or L2.", [({}, self.hits)]),
+            (
+                "notification_snapshot_misses_total",
+                "counter",
+                "Snapshot reads loaded from the database.",
+                [({}, self.misses)],
+            ),
+        ]
+
+    def attach(self, notifications: list) -> None:
+        """Set ``service`` (with its provider) and ``template_ref`` on ``notifications`` from snapshots."""
+        services = self.get_many(Service, {n.service_id for n in notifications})
+        templates = self.get_many(Template, {n.template_ref_id for n in notifications})
+        for notification in notifications:
+            if notification.service_id in services:
+                notification.service = services[notification.service_id]
+            if notification.template_ref_id in templates:
+                notification.template_ref = templates[notification.template_ref_id]
+
+
+snapshots = SnapshotCache(
+    alias=getattr(settings, "NOTIFICATION_SNAPSHOT_CACHE", "default"),
+    ttl=getattr(settings, "NOTIFICATION_SNAPSHOT_TTL", 300.0),
+    local_ttl=getattr(settings, "NOTIFICATION_SNAPSHOT_LOCAL_TTL", 1.0),
+    lock_timeout=getattr(settings, "NOTIFICATION_SNAPSHOT_LOCK_TIMEOUT", 2.0),
+)
+metrics.register(snapshots.collect)
+
+
+def _invalidate(model, pks: list) -> None:
+    snapshots.invalidate(model, pks)
+    # Again after commit: a reader may have cached the old row between the signal and the commit.
+    transaction.on_commit(lambda: snapshots.invalidate(model, pks))
+
+
+def _on_change(sender, instance, **kwargs):
+    _invalidate(sender, [instance.pk])
+
+
+def _on_provider_change(sender, instance: Provider, **kwargs):
+    _invalidate(Service, list(Service.objects.filter(provider_id=instance.pk).values_list("id", flat=True)))
+
+
+for _model in QUERYSETS:
+    post_save.connect(_on_change, sender=_model, dispatch_uid=f"snapshot_save_{_model._meta.model_name}")
+    post_delete.connect(_on_change, sender=_model, dispatch_uid=f"snapshot_delete_{_model._meta.model_name}")
+post_save.connect(_on_provider_change, sender=Provider, dispatch_uid="snapshot_save_provider")
+post_delete.connect(_on_provider_change, sender=Provider, dispatch_uid="snapshot_delete_provider")
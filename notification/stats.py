@@ -0,0 +1,130 @@
+"""Incrementally maintained delivery statistics.
+
+Every place that moves notifications into a new status hands the rows to
+:func:`record`, or makes the move with :func:`record_update`, which counts the
+rows a queryset ``update()`` changes. :func:`record` folds them into ``(service, type, status, hour)`` buckets in
+memory and applies them with a single multi-row ``INSERT ... ON CONFLICT DO
+UPDATE`` that adds to the existing counters. Rows are sorted by bucket before the
+upsert so concurrent workers always lock buckets in the same order.
+
+:func:`summary` reads the rollup back; its cost depends on the number of buckets
+in the range, not on the number of notifications.
+"""
+
+import uuid
+from collections import Counter
+from collections.abc import Iterable
+from datetime import UTC, datetime
+
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models import F, QuerySet, Sum
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+from .models import DeliveryStat, Notification
+
+# Multi-row upserts are split into statements of this many buckets.
+UPSERT_CHUNK = 500
+
+Bucket = tuple  # (service_id, type, status, hour)
+
+
+def bucket_hour(moment: datetime) -> datetime:
+    return moment.astimezone(UTC).replace(minute=0, second=0, microsecond=0)
+
+
+def record(notifications: Iterable[Notification], *, using: str = DEFAULT_DB_ALIAS) -> int:
+    """Count ``notifications`` as having entered their current status at ``update_at``.
+
+    Latency is measured from each notification's ``created_at``. Returns the
+    number of buckets touched.
+    """
+    now = timezone.now()
+    counts: Counter[Bucket] = Counter()
+    latency: Counter[Bucket] = Counter()
+    for notification in notifications:
+        moment = notification.update_at or now
+        key = (notification.service_id, notification.type, notification.status, bucket_hour(moment))
+        counts[key] += 1
+        if notification.created_at:
+            latency[key] += max(0.0, (moment - notification.created_at).total_seconds())
+    if counts:
+        _upsert(sorted(counts.items()), latency, using)
+    return len(counts)
+
+
+def record_update(queryset: QuerySet, **values) -> int:
+    """``queryset.update(**values)`` that also records the rows moved into ``values["status"]``.
+
+    The matching rows are locked and read (service, type and ``created_at`` only)
+    in the same transaction as the update. Returns the number of rows updated.
+    """
+    using = queryset._db or router.db_for_write(queryset.model)
+    moment = values.get("update_at") or timezone.now()
+    with transaction.atomic(using=using):
+        rows = list(
+            queryset.using(using).select_for_update().order_by().values_list("id", "service_id", "type", "created_at")
+        )
+        if not rows:
+            return 0
+        updated = Notification.objects.using(using).filter(id__in=[row[0] for row in rows]).update(**values)
+        record(
+            (
+                Notification(
+                    service_id=service_id, type=type_, status=values["status"], created_at=created_at, update_at=moment
+                )
+                for _, service_id, type_, created_at in rows
+            ),
+            using=using,
+        )
+    return updated
+
+
+def _upsert(buckets: list[tuple[Bucket, int]], latency: Counter, using: str) -> None:
+    connection = connections[using]
+    fields = {f.attname: f for f in DeliveryStat._meta.concrete_fields}
+    columns = ("id", "service_id", "type", "status", "hour", "count", "latency_seconds")
+    table, quote = DeliveryStat._meta.db_table, connection.ops.quote_name
+    row_sql = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    conflict = ", ".join(quote(c) for c in ("service_id", "hour", "type", "status"))
+    updates = ", ".join(f"{quote(c)} = {quote(table)}.{quote(c)} + EXCLUDED.{quote(c)}" for c in columns[-2:])
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(buckets), UPSERT_CHUNK):
+            chunk = buckets[start : start + UPSERT_CHUNK]
+            params = []
+            for (service_id, type_, status, hour), count in chunk:
+                values = (
+                    uuid.uuid4(),
+                    service_id,
+                    type_,
+                    status,
+                    hour,
+                    count,
+                    latency[(service_id, type_, status, hour)],
+                )
+                params += [fields[c].get_db_prep_value(v, connection) for c, v in zip(columns, values, strict=True)]
+            cursor.execute(
+                f"INSERT INTO {quote(table)} ({', '.join(quote(c) for c in columns)}) "
+                f"VALUES {', '.join([row_sql] * len(chunk))} "
+                f"ON CONFLICT ({conflict}) DO UPDATE SET {updates}",
+                params,
+            )
+
+
+def summary(service_ids, since: datetime, until: datetime | None = None, *, by_day: bool = False):
+    """Counts and summed latency per bucket for ``service_ids`` in ``[since, until)``.
+
+    Returns a queryset of dicts with ``service``, ``type``, ``status``, ``period``,
+    ``notifications`` and ``latency`` (seconds), hourly or (with ``by_day``) daily.
+    """
+    rows = DeliveryStat.objects.filter(service_id__in=service_ids, hour__gte=bucket_hour(since))
+    if until is not None:
+        rows = rows.filter(hour__lt=until)
+    period = TruncDay("hour") if by_day else F("hour")
+    return (
+        rows.annotate(period=period)
+        .values("service", "type", "status", "period")
+        .annotate(notifications=Sum("count"), latency=Sum("latency_seconds"))
+        .order_by("period", "service", "type", "status")
+    )
@@ -0,0 +1,204 @@
+"""In-memory index of suppressed recipients checked on the enqueue path.
+
+Every process keeps one :class:`SuppressionIndex` holding a 64-bit hash of each
+``(service, recipient)`` pair, so a membership check is a binary search with no
+database round trip. The hashes live in a sorted ``array('Q')`` of 8 bytes per
+entry, plus small sets of additions and removals since it was built, so a few
+million suppressed addresses take tens of megabytes rather than hundreds. A
+64-bit hash collision (wrongly suppressing an address) is practically
+impossible at that size.
+
+The index is refreshed incrementally: every ``refresh_interval`` seconds it
+reads only the suppressions created since the last refresh (via the
+``created_at`` index). Removed suppressions are dropped locally through the
+``post_delete`` signal and everywhere else by a full reload every
+``reload_interval`` seconds, which builds a new array and swaps it in. Both run
+on a background thread (:meth:`SuppressionIndex.start`, run on ASGI lifespan
+startup), so no request waits for them; without the thread,
+:meth:`~SuppressionIndex.refresh` is called inline when stale.
+"""
+
+import bisect
+import hashlib
+import heapq
+import threading
+import time
+from array import array
+from typing import Any
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+
+from .background import PeriodicRefresh
+from .models import Suppression
+
+# Payload keys holding recipients; a notification is suppressed once "to" is empty.
+RECIPIENT_KEYS = ("to", "cc", "bcc")
+
+# Additions kept in a set before an incremental refresh merges them into the sorted array.
+MERGE_THRESHOLD = 10000
+
+
+def _key(service_id, recipient: str) -> int:
+    digest = hashlib.blake2b(f"{service_id}:{Suppression.normalize(recipient)}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def _contains(keys: array, key: int) -> bool:
+    index = bisect.bisect_left(keys, key)
+    return index < len(keys) and keys[index] == key
+
+
+class SuppressionIndex:
+    """Process-wide index of suppressed recipients, refreshed incrementally from the database."""
+
+    def __init__(self, *, refresh_interval: float = 30.0, reload_interval: float = 600.0, chunk_size: int = 10000):
+        self.refresh_interval = refresh_interval
+        self.reload_interval = reload_interval
+        self.chunk_size = chunk_size
+        self._keys = array("Q")  # sorted
+        self._added: set[int] = set()
+        self._removed: set[int] = set()
+        # Additions seen while a full reload is reading the table, kept across the swap.
+        self._added_during_reload: set[int] | None = None
+        self._watermark = None
+        self._refreshed_at = float("-inf")
+        self._reloaded_at = float("-inf")
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._background = PeriodicRefresh(
+            lambda: self.refresh(force=True), refresh_interval, name="notification-suppression-index"
+        )
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._added) - len(self._removed)
+
+    @property
+    def running(self) -> bool:
+        """Whether the background thread keeps the index fresh."""
+        return self._background.running
+
+    def start(self) -> None:
+        """Refresh and reload from a background thread from now on."""
+        self._background.start()
+
+    def stop(self) -> None:
+        self._background.stop()
+
+    def refresh(self, *, force: bool = False) -> None:
+        """Pull new suppressions if the index is stale; rebuild it if a full reload is due.
+
+        Rows are read without blocking lookups; only the swap takes the lock.
+        """
+        now = time.monotonic()
+        if not force and now - self._refreshed_at < self.refresh_interval:
+            return
+        with self._refresh_lock:
+            if now - self._reloaded_at >= self.reload_interval:
+                self._reload()
+                self._reloaded_at = now
+            else:
+                added, self._watermark = self._read(self._watermark)
+                with self._lock:
+                    for key in added:
+                        self._add(key)
+                    if len(self._added) > MERGE_THRESHOLD:
+                        kept = (key for key in self._keys if key not in self._removed)
+                        self._keys = array("Q", heapq.merge(kept, sorted(self._added)))
+                        self._added, self._removed = set(), set()
+            self._refreshed_at = now
+
+    def _reload(self) -> None:
+        with self._lock:
+            self._added_during_reload = set()
+        try:
+            keys, watermark = self._read(None)
+            # (service, recipient) is unique, so the hashes are too.
+            rebuilt = array("Q", sorted(keys))
+        except BaseException:
+            with self._lock:
+                self._added_during_reload = None
+            raise
+        with self._lock:
+            added, self._added_during_reload = self._added_during_reload, None
+            self._keys, self._added, self._removed = rebuilt, set(), set()
+            for key in added:
+                self._add(key)
+            self._watermark = watermark
+
+    def _read(self, since) -> tuple[array, Any]:
+        rows = Suppression.objects.order_by()
+        if since is not None:
+            # >= rather than >: rows committed with the same timestamp are re-read, not missed.
+            rows = rows.filter(created_at__gte=since)
+        keys, watermark = array("Q"), since
+        for service_id, recipient, created_at in rows.values_list("service_id", "recipient", "created_at").iterator(
+            chunk_size=self.chunk_size
+        ):
+            keys.append(_key(service_id, recipient))
+            if watermark is None or created_at > watermark:
+                watermark = created_at
+        return keys, watermark
+
+    def _add(self, key: int) -> None:
+        # Callers hold _lock.
+        self._removed.discard(key)
+        if not _contains(self._keys, key):
+            self._added.add(key)
+
+    def add(self, service_id, recipient: str) -> None:
+        key = _key(service_id, recipient)
+        with self._lock:
+            self._add(key)
+            if self._added_during_reload is not None:
+                self._added_during_reload.add(key)
+
+    def discard(self, service_id, recipient: str) -> None:
+        key = _key(service_id, recipient)
+        with self._lock:
+            self._added.discard(key)
+            if self._added_during_reload is not None:
+                self._added_during_reload.discard(key)
+            if _contains(self._keys, key):
+                self._removed.add(key)
+
+    def contains(self, service_id, recipient: str) -> bool:
+        key = _key(service_id, recipient)
+        if key in self._added:
+            return True
+        return key not in self._removed and _contains(self._keys, key)
+
+    def filter_payload(self, service_id, payload_config: dict[str, Any]) -> tuple[dict[str, Any], list[str]]:
+        """Return ``payload_config`` without suppressed recipients, and the recipients removed."""
+        if not len(self):
+            return payload_config, []
+        filtered, removed = dict(payload_config), []
+        for key in RECIPIENT_KEYS:
+            value = payload_config.get(key)
+            if not value:
+                continue
+            recipients = [value] if isinstance(value, str) else list(value)
+            kept = []
+            for recipient in recipients:
+                (removed if self.contains(service_id, recipient) else kept).append(recipient)
+            if len(kept) != len(recipients):
+                filtered[key] = kept
+        return filtered, removed
+
+
+suppression_index = SuppressionIndex(
+    refresh_interval=getattr(settings, "NOTIFICATION_SUPPRESSION_REFRESH_INTERVAL", 30.0),
+    reload_interval=getattr(settings, "NOTIFICATION_SUPPRESSION_RELOAD_INTERVAL", 600.0),
+)
+
+
+def _on_save(sender, instance: Suppression, **kwargs):
+    suppression_index.add(instance.service_id, instance.recipient)
+
+
+def _on_delete(sender, instance: Suppression, **kwargs):
+    suppression_index.discard(instance.service_id, instance.recipient)
+
+
+post_save.connect(_on_save, sender=Suppression, dispatch_uid="suppression_index_add")
+post_delete.connect(_on_delete, sender=Suppression, dispatch_uid="suppression_index_discard")
@@ -1,7 +1,66 @@
+import hashlib
+import hmac
+import io
+import json
+import math
+import tempfile
+import threading
+import time
+import uuid
+from datetime import UTC, timedelta
+from unittest import mock
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.contrib.admin import AdminSite
 from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
-from .models import Provider, Service, Template
+from . import attachments, bulk, failover, metrics, snapshots, stats
+from .admin import NotificationAdmin, ServiceAdmin
+from .admission import BacklogMonitor
+from .background import PeriodicRefresh
+from .channel import PendingListener, notify_pending
+from .concurrency import AdaptiveLimiter, account_limiter_for, limiter_for, limits_for
+from .dispatch import (
+    FairClaimer,
+    NotificationWorker,
+    claim_batch,
+    deliver_group,
+    lane_quotas,
+    send_concurrently,
+)
+from .enqueue import parse_enqueue_body
+from .events import DeliveryEventBuffer
+from .models import (
+    Attachment,
+    DeliveryStat,
+    Notification,
+    Priority,
+    Provider,
+    Service,
+    ServiceFallback,
+    Shard,
+    Suppression,
+    Template,
+    WorkerNode,
+    normalize_recipient,
+)
+from .provider.onesignal import OnesignalPushSender
+from .provider.standin import StandInServer, infobip_responder, mailgun_responder, onesignal_responder
+from .queues import DatabaseQueue, MemoryQueue
+from .routers import PrimaryReplicaRouter, read_from_replica
+from .scheduler import cancel, release_due, seconds_until_next_due
+from .schema.request import MailgunEmailRequest
+from .schema.validation import validator_for
+from .sharding import HashRing, ShardMembership, shard_of
+from .snapshots import QUERYSETS, SnapshotCache
+from .suppression import SuppressionIndex
+from .warmup import warm_up
 
 
 class TemplateModelTests(TestCase):
@@ -16,6 +75,29 @@ class TemplateModelTests(TestCase):
         # Ensure variables are unique and in first-seen order
         self.assertEqual(t.variables, ["user.name", "otp", "expires_at"])
 
+    def test_renditions_are_cached_with_placeholders_and_filled_per_recipient(self):
+        t = Template.objects.create(title="Welcome", subject="Hi", template="Hi **{{ name }}**, see [docs]({{ url }}).")
+        self.assertEqual(
+            t.html_rendition, '<p>Hi <strong>{{ name }}</strong>, see <a href="{{ url }}" rel="nofollow">docs</a>.</p>'
+        )
+        self.assertEqual(t.text_rendition, "Hi {{ name }}, see docs ({{ url }}).")
+
+        html, text = t.render_renditions({"name": "<Ann>", "url": "https://example.com/a?b=1&c=2"})
+        self.assertIn("<strong>&lt;Ann&gt;</strong>", html)
+        self.assertIn('href="https://example.com/a?b=1&amp;c=2"', html)
+        self.assertEqual(text, "Hi <Ann>, see docs (https://example.com/a?b=1&c=2).")
+
+    def test_rendition_drops_links_to_unsafe_schemes_from_values(self):
+        t = Template.objects.create(title="Link", subject="Hi", template="[here]({{ url }}) or [there](java{{ rest }})")
+        for url in ("javascript:alert(document.cookie)", " JavaScript:alert(1)", "data:text/html,x"):
+            html, _ = t.render_renditions({"url": url, "rest": "script:alert(1)"})
+            self.assertNotIn("href", html)
+            self.assertIn(">here</a>", html)
+
+        html, _ = t.render_renditions({"url": "/account", "rest": "script"})
+        self.assertIn('href="/account"', html)
+        self.assertIn('href="javascript"', html)
+
 
 class ServiceModelTests(TestCase):
     def setUp(self):
@@ -71,3 +153,1276 @@ class ServiceConfigValidationTests(TestCase):
                 provider=self.provider,
                 config={"region": "us"},
             )
+
+    def test_config_errors_name_each_field(self):
+        service = Service(name="Bad", provider=self.provider, config={"api_key": 1, "region": "us"})
+        with self.assertRaises(ValidationError) as ctx:
+            service.clean()
+        messages = ctx.exception.message_dict["config"]
+        self.assertIn("Invalid configuration for provider 'mailgun': api_key: Expected a string.", messages)
+        self.assertIn("Invalid configuration for provider 'mailgun': region: Unknown field.", messages)
+
+    def test_compiled_validator_decodes_json_into_request_dataclass(self):
+        validator = validator_for(MailgunEmailRequest)
+        self.assertIs(validator, validator_for(MailgunEmailRequest))
+        request = validator.decode_json(b'{"sender": "a@example.com", "to": "b@example.com", "subject": "Hi"}')
+        self.assertEqual(request, MailgunEmailRequest("a@example.com", ["b@example.com"], "Hi", None, None, None, None))
+        with self.assertRaises(ValidationError) as ctx:
+            validator.decode_json(b'{"to": ["b@example.com", 7], "cc": {}}')
+        self.assertEqual(
+            ctx.exception.message_dict,
+            {
+                "sender": ["This field is required."],
+                "to": ["Item 1: expected a string."],
+                "subject": ["This field is required."],
+                "cc": ["Expected a list of strings."],
+            },
+        )
+
+
+class EnqueueApiTests(TestCase):
+    def setUp(self):
+        self.provider, _ = Provider.objects.get_or_create(code="mailgun", defaults={"name": "Mailgun", "type": "email"})
+        self.service = Service.objects.create(name="MyApp", provider=self.provider, config={"api_key": "mg"})
+        self.template = Template.objects.create(
+            title="OTP", subject="Code for {{ user.name }}", template="Your OTP is {{ otp }}", service=self.service
+        )
+        self.headers = {"X-Api-Key": self.service.api_key}
+
+    async def test_enqueue_bulk_creates_pending_notifications(self):
+        body = {
+            "notifications": [
+                {
+                    "template_id": str(self.template.id),
+                    "request_id": f"req-{i}",
+                    "payload_config": {"to": [f"user{i}@example.com"]},
+                    "context": {"otp": i, "user": {"name": "Alice"}},
+                }
+                for i in range(3)
+            ]
+        }
+        response = await self.async_client.post(
+            "/api/notifications/", body, content_type="application/json", headers=self.headers
+        )
+        self.assertEqual(response.status_code, 202)
+        ids = [n["id"] for n in response.json()["notifications"]]
+        self.assertEqual(len(ids), 3)
+
+        notification = await Notification.objects.aget(request_id="req-2")
+        self.assertEqual(notification.status, Notification.Status.PENDING)
+        self.assertEqual(notification.type, "email")
+        self.assertEqual(notification.plain_text, "Your OTP is 2")
+        self.assertEqual(notification.payload_config["subject"], "Code for Alice")
+
+        status = await self.async_client.get(f"/api/notifications/{notification.id}/", headers=self.headers)
+        self.assertEqual(status.status_code, 200)
+        self.assertEqual(status.json()["status"], "pending")
+
+    async def test_enqueue_rejects_missing_api_key_and_unknown_template(self):
+        body = {"template_id": "00000000-0000-0000-0000-000000000000"}
+        response = await self.async_client.post("/api/notifications/", body, content_type="application/json")
+        self.assertEqual(response.status_code, 401)
+
+        response = await self.async_client.post(
+            "/api/notifications/", body, content_type="application/json", headers=self.headers
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(await Notification.objects.aexists())
+
+    async def test_enqueue_validates_payload_config_against_request_schema(self):
+        body = {
+            "notifications": [
+                {"template_id": str(self.template.id), "payload_config": {"to": "ok@example.com"}},
+                {"template_id": str(self.template.id), "payload_config": {"to": ["a@example.com", None], "cc": 5}},
+            ]
+        }
+        response = await self.async_client.post(
+            "/api/notifications/", body, content_type="application/json", headers=self.headers
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()["errors"],
+            [
+                "notifications[1].payload_config.to: Item 1: expected a string.",
+                "notifications[1].payload_config.cc: Expected a list of strings.",
+            ],
+        )
+        self.assertFalse(await Notification.objects.aexists())
+
+
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    @override_settings(NOTIFICATION_READ_REPLICA="replica")
+    def test_only_opted_in_reads_go_to_replica(self):
+        self.assertIsNone(self.router.db_for_read(Notification))
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_read(Notification), "replica")
+            self.assertEqual(self.router.db_for_write(Notification), "default")
+        self.assertIsNone(self.router.db_for_read(Notification))
+        self.assertFalse(self.router.allow_migrate("replica", "notification"))
+
+    @override_settings(NOTIFICATION_READ_REPLICA=None)
+    def test_reads_stay_on_primary_without_replica(self):
+        with read_from_replica():
+            self.assertIsNone(self.router.db_for_read(Notification))
+
+
+class NotificationWorkerTests(TestCase):
+    def setUp(self):
+        provider, _ = Provider.objects.get_or_create(code="mailgun", defaults={"name": "Mailgun", "type": "email"})
+        self.service = Service.objects.create(name="MyApp", provider=provider, config={"api_key": "mg"})
+        self.template = Template.objects.create(title="OTP", subject="OTP", template="{{ otp }}", service=self.service)
+
+    def _enqueue(self, count):
+        Notification.objects.bulk_create(
+            Notification(service=self.service, template_ref=self.template, type="email", content=str(i))
+            for i in range(count)
+        )
+        notify_pending()
+
+    def test_claimed_rows_are_leased_until_released(self):
+        self._enqueue(3)
+        handled = []
+        worker = NotificationWorker(handled.extend, batch_size=2)
+
+        self.assertEqual(worker.run_once(), 2)
+        self.assertEqual(worker.run_once(), 1)
+        self.assertEqual(worker.run_once(), 0)
+        self.assertEqual(len({n.id for n in handled}), 3)
+        self.assertTrue(all(n.locked_until for n in handled))
+
+        Notification.objects.update(locked_until=None)
+        self.assertEqual(len(claim_batch(10)), 3)
+
+    def test_default_handler_writes_outcomes_to_the_workers_database(self):
+        self._enqueue(1)
+        with (
+            mock.patch("notification.dispatch.failover.send") as send,
+            mock.patch("notification.dispatch.transaction.atomic", wraps=transaction.atomic) as atomic,
+            mock.patch("notification.dispatch.stats.record") as record,
+        ):
+            self.assertEqual(NotificationWorker(using=DEFAULT_DB_ALIAS).run_once(), 1)
+        self.assertEqual(send.call_args.kwargs, {"using": DEFAULT_DB_ALIAS})
+        self.assertIn(mock.call(using=DEFAULT_DB_ALIAS), atomic.call_args_list)
+        self.assertEqual(record.call_args.kwargs, {"using": DEFAULT_DB_ALIAS})
+
+    def test_listener_degrades_to_polling_without_listen_support(self):
+        listener = PendingListener()
+        self.assertFalse(listener.enabled)
+        self.assertFalse(listener.wait(0))
+
+
+class FairClaimerTests(TestCase):
+    def setUp(self):
+        provider, _ = Provider.objects.get_or_create(code="mailgun", defaults={"name": "Mailgun", "type": "email"})
+        self.noisy = Service.objects.create(name="Campaigns", provider=provider, config={"api_key": "mg"})
+        self.quiet = Service.objects.create(name="Accounts", provider=provider, config={"api_key": "mg"})
+
+    def _enqueue(self, service, priority, count):
+        template = Template.objects.create(title="T", subject="S", template="x", service=service, priority=priority)
+        Notification.objects.bulk_create(
+            Notification(service=service, template_ref=template, type="email", priority=priority, content="x")
+            for _ in range(count)
+        )
+
+    def test_lane_quotas_follow_weights_and_fill_the_batch(self):
+        self.assertEqual(lane_quotas(12, {0: 8, 1: 3, 2: 1}), {0: 8, 1: 3, 2: 1})
+        self.assertEqual(sum(lane_quotas(7, {0: 8, 1: 3, 2: 1}).values()), 7)
+        self.assertEqual(lane_quotas(10, {0: 1, 1: 0}), {0: 10})
+
+    def test_critical_first_and_services_share_a_lane(self):
+        self._enqueue(self.noisy, Priority.BULK, 20)
+        self._enqueue(self.quiet, Priority.BULK, 2)
+        self._enqueue(self.quiet, Priority.CRITICAL, 2)
+
+        batch = FairClaimer().claim(6)
+
+        self.assertEqual(len(batch), 6)
+        self.assertEqual([n.priority for n in batch[:2]], [Priority.CRITICAL] * 2)
+        bulk_services = [n.service_id for n in batch[2:]]
+        self.assertEqual(bulk_services.count(self.quiet.id), 2)
+        self.assertEqual(bulk_services.count(self.noisy.id), 2)
+
+    def test_claim_cost_follows_services_with_work(self):
+        provider = self.noisy.provider
+        Service.objects.bulk_create(Service(name=f"Idle {i}", provider=provider) for i in range(50))
+        claimer = FairClaimer()
+        with CaptureQueriesContext(connection) as idle:
+            self.assertEqual(claimer.claim(100), [])
+        self._enqueue(self.quiet, Priority.BULK, 5)
+        with CaptureQueriesContext(connection) as busy:
+            self.assertEqual(len(claimer.claim(100)), 5)
+
+        # Savepoint, the DISTINCT lookup, release.
+        self.assertEqual(len(idle), 3)
+        # ...plus one candidate query, the lease, the batch and its snapshots; none per idle service.
+        self.assertLessEqual(len(busy), 10)
+
+
+class SchedulerTests(TestCase):
+    def setUp(self):
+        provider, _ = Provider.objects.get_or_create(code="mailgun", defaults={"name": "Mailgun", "type": "email"})
+        self.service = Service.objects.create(name="MyApp", provider=provider, config={"api_key": "mg"})
+        self.template = Template.objects.create(title="Remind", subject="R", template="x", service=self.service)
+
+    def test_parse_send_at_in_local_timezone(self):
+        body = b'{"template_id": "%s", "send_at": "2030-01-02T09:00:00", "timezone": "Europe/Berlin"}'
+        [message] = parse_enqueue_body(body % str(self.template.id).encode())
+        self.assertEqual(message["send_at"].astimezone(UTC).hour, 8)
+
+    def test_only_due_rows_are_released_and_cancel_by_request_id(self):
+        now = timezone.now()
+        messages = [
+            {"request_id": "due", "send_at": now + timedelta(minutes=1)},
+            {"request_id": "later", "send_at": now + timedelta(days=30)},
+            {"request_id": "later", "send_at": now + timedelta(days=31)},
+        ]
+        path = self.enterContext(tempfile.NamedTemporaryFile("w", suffix=".jsonl")).name
+        with open(path, "w") as lines:
+            for message in messages:
+                message.update(template_id=str(self.template.id), send_at=message["send_at"].isoformat())
+                lines.write(json.dumps(message) + "\n")
+        out = io.StringIO()
+        call_command("enqueue_notifications", path, "--service", str(self.service.id), "--batch-size", "2", stdout=out)
+        self.assertIn("Enqueued 3 notification(s).", out.getvalue())
+        self.assertEqual(Notification.objects.filter(status=Notification.Status.SCHEDULED).count(), 3)
+
+        self.assertEqual(release_due(now=now + timedelta(minutes=5)), 1)
+        self.assertEqual(Notification.objects.get(request_id="due").status, Notification.Status.PENDING)
+        self.assertAlmostEqual(seconds_until_next_due(now=now), timedelta(days=30).total_seconds(), delta=1)
+
+        self.assertEqual(cancel(self.service, "later"), 2)
+        self.assertIsNone(seconds_until_next_due())
+        counted = dict(DeliveryStat.objects.values_list("status", "count"))
+        self.assertEqual(counted, {"scheduled": 3, "pending": 1, "cancelled": 2})
+
+    def test_cancel_by_request_id_updates_one_chunk_at_a_time(self):
+        send_at = timezone.now() + timedelta(days=1)
+        Notification.objects.bulk_create(
+            Notification(
+                service=self.service,
+                template_ref=self.template,
+                type="email",
+                status="scheduled",
+                send_at=send_at,
+                request_id="campaign",
+            )
+            for _ in range(5)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(cancel(self.service, "campaign", chunk_size=2), 5)
+        updates = [q["sql"] for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(Notification.objects.filter(status="cancelled").count(), 5)
+        self.assertEqual(DeliveryStat.objects.get(status="cancelled").count, 5)
+
+    def test_enqueue_command_rejects_a_batch_with_unknown_templates(self):
+        path = self.enterContext(tempfile.NamedTemporaryFile("w", suffix=".jsonl")).name
+        with open(path, "w") as lines:
+            lines.write(json.dumps({"template_id": str(self.template.id)}) + "\n")
+            lines.write(json.dumps({"template_id": str(uuid.uuid4())}) + "\n")
+        with self.assertRaisesMessage(CommandError, "Messages 1-2: Unknown or disabled template"):
+            call_command("enqueue_notifications", path, "--service", str(self.service.id), stdout=io.StringIO())
+        self.assertFalse(Notification.objects.exists())
+
+
+class FanoutTests(TestCase):
+    def setUp(self):
+        email, _ = Provider.objects.get_or_create(code="mailgun", defaults={"name": "Mailgun", "type": "email"})
+        sms = Provider.objects.create(code="smsgateway", name="SMS Gateway", type="sms")
+        self.email_service = Service.objects.create(name="Auth email", provider=email, config={"api_key": "mg"})
+        self.sms_service = Service.objects.create(name="Auth SMS", provider=sms)
+        self.email_service.fanout_services.add(self.sms_service)
+        self.email_otp = Template.objects.create(
+            title="OTP", subject="OTP", template="Email {{ otp }}", service=self.email_service
+        )
+        self.sms_otp = Template.objects.create(
+            title="OTP", subject="OTP", template="SMS {{ otp }}", service=self.sms_service
+        )
+
+    async def test_fanout_creates_siblings_with_shared_parent(self):
+        body = {
+            "request_id": "otp-1",
+            "context": {"otp": "1234"},
+            "channels": [
+                {"template_id": str(self.email_otp.id), "payload_config": {"to": ["a@example.com"]}},
+                {"template_id": str(self.sms_otp.id), "payload_config": {"to": ["+15550001"]}},
+            ],
+        }
+        headers = {"X-Api-Key": self.email_service.api_key}
+        response = await self.async_client.post(
+            "/api/notifications/fanout/", body, content_type="application/json", headers=headers
+        )
+        self.assertEqual(response.status_code, 202)
+        parent_id = response.json()["parent_id"]
+
+        siblings = [n async for n in Notification.objects.filter(parent_id=parent_id).order_by("type")]
+        self.assertEqual([(n.type, n.plain_text) for n in siblings], [("email", "Email 1234"), ("sms", "SMS 1234")])
+
+        await Notification.objects.filter(type="sms").aupdate(status=Notification.Status.SENT)
+        status = await self.async_client.get(f"/api/notifications/fanout/{parent_id}/", headers=headers)
+        self.assertEqual(status.json()["status"], Notification.Status.SENT)
+
+    def test_channel_groups_are_sent_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+        passed = []
+
+        def send_group(group):
+            barrier.wait()
+            passed.append(group[0].type)
+
+        batch = [
+            Notification(service=self.email_service, type="email"),
+            Notification(service=self.sms_service, type="sms"),
+        ]
+        send_concurrently(batch, send_group)
+        self.assertEqual(sorted(passed), ["email", "sms"])
+
+
+class ProviderSenderTests(TestCase):
+    def _service(self, code, type_, config):
+        provider, _ = Provider.objects.get_or_create(code=code, defaults={"name": code, "type": type_})
+        service = Service.objects.create(name=code, provider=provider, config=config)
+        template = Template.objects.create(title="T", subject="S", template="x", service=service)
+        return service, template
+
+    def _notifications(self, service, template, recipients):
+        return Notification.objects.bulk_create(
+            Notification(
+                service=service,
+                template_ref=template,
+                type=service.provider.type,
+                content="Storm warning",
+                payload_config={"to": to, "subject": "Alert", "sender": "alerts@example.com"},
+            )
+            for to in recipients
+        )
+
+    def test_sender_class_is_resolved_from_provider_code(self):
+        provider = Provider(code="onesignal", type="push")
+        self.assertIs(provider.get_sender_class(), OnesignalPushSender)
+        self.assertIsNone(Provider(code="unknown", type="sms").get_sender_class())
+
+    def test_warm_up_preloads_sender_modules_and_registry(self):
+        self.assertEqual(set(warm_up()), {"imports"})
+        self.assertEqual(set(warm_up(database=True)), {"imports", "connections", "providers"})
+        with self.assertNumQueries(0):
+            self.assertIs(Provider(code="onesignal", type="push").get_sender_class(), OnesignalPushSender)
+
+    async def test_asgi_app_warms_up_on_lifespan_startup(self):
+        # Importing inside the running event loop, as ASGI servers do, must not touch the database.
+        from dj_notificattion import asgi
+
+        messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+        sent = []
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        with (
+            mock.patch("notification.warmup.warm_up") as warm,
+            mock.patch.object(BacklogMonitor, "start") as start,
+            mock.patch.object(BacklogMonitor, "stop") as stop,
+            mock.patch.object(SuppressionIndex, "start"),
+            mock.patch.object(SuppressionIndex, "stop"),
+        ):
+            await asgi.application({"type": "lifespan"}, receive, send)
+        warm.assert_called_once_with(database=True)
+        start.assert_called_once_with()
+        stop.assert_called_once_with()
+        self.assertEqual(sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+
+    def test_infobip_submits_sms_in_bulk(self):
+        with StandInServer(infobip_responder) as server:
+            service, template = self._service(
+                "infobip", "sms", {"api_key": "k", "base_url": server.base_url, "batch_size": 2}
+            )
+            group = self._notifications(service, template, [["+4411"], ["+4412", "+4413"], ["000"]])
+            deliver_group(group)
+
+        self.assertEqual(len(server.requests), 2)
+        self.assertEqual(server.requests[0].path, "/sms/2/text/advanced")
+        self.assertEqual(server.requests[0].headers["Authorization"], "App k")
+        statuses = list(Notification.objects.values_list("status", flat=True))
+        self.assertEqual(sorted(statuses), ["error", "sent", "sent"])
+
+    def test_onesignal_multicasts_identical_content(self):
+        with StandInServer(onesignal_responder) as server:
+            service, template = self._service(
+                "onesignal", "push", {"app_id": "app", "api_key": "k", "base_url": server.base_url, "batch_size": 4}
+            )
+            group = self._notifications(service, template, [["d1", "d2"], ["d3", "d4"], ["invalid-1", "invalid-2"]])
+            deliver_group(group)
+
+        self.assertEqual(len(server.requests), 2)
+        # Chunks are sent concurrently, so either may arrive first.
+        self.assertEqual(sorted(len(r.json()["include_subscription_ids"]) for r in server.requests), [2, 4])
+        group[2].refresh_from_db()
+        self.assertEqual(group[2].status, Notification.Status.ERROR)
+        self.assertEqual(Notification.objects.filter(status=Notification.Status.SENT).count(), 2)
+
+    def test_mailgun_transient_failure_is_retried_later(self):
+        with StandInServer(lambda request: (503, {"message": "unavailable"})) as server:
+            service, template = self._service("mailgun", "email", {"api_key": "k", "base_url": server.base_url})
+            [notification] = self._notifications(service, template, [["a@example.com"]])
+            deliver_group([notification])
+
+        self.assertEqual(server.requests[0].path, "/v3/example.com/messages")
+        self.assertEqual(server.requests[0].form()["to"], ["a@example.com"])
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, Notification.Status.PENDING)
+        self.assertEqual(notification.retry_count, 1)
+        self.assertGreater(notification.locked_until, timezone.now())
+
+
+class DeliveryWebhookTests(TestCase):
+    def setUp(self):
+        provider, _ = Provider.objects.get_or_create(code="mailgun", defaults={"name": "Mailgun", "type": "email"})
+        self.service = Service.objects.create(
+            name="Mail", provider=provider, config={"api_key": "k", "webhook_signing_key": "signing"}
+        )
+        template = Template.objects.create(title="T", subject="S", template="x", service=self.service)
+        self.notification = Notification.objects.create(
+            service=self.service,
+            template_ref=template,
+            status=Notification.Status.SENT,
+            provider_message_id="abc@example.com",
+        )
+        self.url = f"/api/webhooks/{self.service.pk}/"
+
+    def _payload(self, event, key="signing", **event_data):
+        timestamp, token = str(int(time.time())), "token"
+        signature = hmac.new(key.encode(), (timestamp + token).encode(), hashlib.sha256).hexdigest()
+        return json.dumps(
+            {
+                "signature": {"timestamp": timestamp, "token": token, "signature": signature},
+                "event-data": {
+                    "event": event,
+                    "timestamp": time.time(),
+                    "message": {"headers": {"message-id": "abc@example.com"}},
+                    **event_data,
+                },
+            }
+        )
+
+    def test_signed_events_are_buffered_and_flushed_in_bulk(self):
+        buffer = DeliveryEventBuffer()
+        with mock.patch("notification.views.event_buffer", buffer), mock.patch.object(buffer, "_ensure_thread"):
+            for payload in (
+                self._payload("delivered"),
+                self._payload("failed", severity="permanent", recipient="A@example.com"),
+            ):
+                response = self.client.post(self.url, payload, content_type="application/json")
+                self.assertEqual(response.status_code, 200)
+
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.status, Notification.Status.SENT)
+        self.assertEqual(len(buffer), 2)
+        with self.assertNumQueries(6):  # select, then update + stats + suppressions in one savepoint
+            self.assertEqual(buffer.flush(), 1)
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.status, Notification.Status.BOUNCED)
+        self.assertTrue(Suppression.objects.filter(service=self.service, recipient="a@example.com").exists())
+
+    def test_events_only_touch_the_verifying_services_notifications(self):
+        other = Service.objects.create(
+            name="Other", provider=self.service.provider, config={"api_key": "k2", "webhook_signing_key": "other"}
+        )
+        theirs = Notification.objects.create(
+            service=other,
+            template_ref=Template.objects.create(title="T", subject="S", template="x", service=other),
+            status=Notification.Status.SENT,
+            provider_message_id="abc@example.com",
+        )
+        buffer = DeliveryEventBuffer()
+        with mock.patch("notification.views.event_buffer", buffer), mock.patch.object(buffer, "_ensure_thread"):
+            payload = self._payload("failed", severity="permanent", recipient="b@example.com")
+            self.assertEqual(self.client.post(self.url, payload, content_type="application/json").status_code, 200)
+        self.assertEqual(buffer.flush(), 1)
+
+        self.notification.refresh_from_db()
+        theirs.refresh_from_db()
+        self.assertEqual(self.notification.status, Notification.Status.BOUNCED)
+        self.assertEqual(theirs.status, Notification.Status.SENT)
+        self.assertFalse(Suppression.objects.filter(service=other).exists())
+
+    def test_bad_signature_is_rejected(self):
+        response = self.client.post(self.url, self._payload("delivered", key="wrong"), content_type="application/json")
+        self.assertEqual(response.status_code, 403)
+
+
+class SuppressionTests(TestCase):
+    def setUp(self):
+        provider, _ = Provider.objects.get_or_create(code="mailgun", defaults={"name": "Mailgun", "type": "email"})
+        self.service = Service.objects.create(name="Mail", provider=provider, config={"api_key": "k"})
+        self.template = Template.objects.create(title="T", subject="S", template="Hi {{ name }}", service=self.service)
+        Suppression.objects.create(service=self.service, recipient=" Gone@Example.com", reason="bounce")
+
+    def test_index_refreshes_incrementally_and_is_scoped_per_service(self):
+        index = SuppressionIndex(refresh_interval=0)
+        index.refresh()
+        self.assertTrue(index.contains(self.service.id, "gone@example.com"))
+        other = Service.objects.create(name="Other", provider=self.service.provider, config={"api_key": "k"})
+        self.assertFalse(index.contains(other.id, "gone@example.com"))
+
+        Suppression.objects.create(service=other, recipient="late@example.com")
+        with self.assertNumQueries(1):
+            index.refresh()
+        self.assertTrue(index.contains(other.id, "LATE@example.com"))
+        self.assertEqual(len(index), 2)
+
+        # Past the threshold, additions are merged into the sorted array.
+        Suppression.objects.create(service=other, recipient="later@example.com")
+        with mock.patch("notification.suppression.MERGE_THRESHOLD", 0):
+            index.refresh()
+        self.assertEqual((len(index._keys), len(index._added)), (3, 0))
+        self.assertTrue(index.contains(other.id, "later@example.com"))
+
+    def test_reload_rebuilds_the_sorted_array_and_keeps_local_changes(self):
+        index = SuppressionIndex(refresh_interval=0, reload_interval=0)
+        index.refresh()
+        self.assertEqual(len(index._keys), 1)
+        index.add(self.service.id, "new@example.com")
+        index.discard(self.service.id, "gone@example.com")
+        self.assertTrue(index.contains(self.service.id, "new@example.com"))
+        self.assertFalse(index.contains(self.service.id, "gone@example.com"))
+        self.assertEqual(len(index), 1)
+
+        Suppression.objects.create(service=self.service, recipient="+44 7700 900123")
+        index.refresh()  # a full reload: the database has gone@ and the phone number, not new@
+        self.assertEqual(list(index._keys), sorted(index._keys))
+        self.assertEqual(len(index), 2)
+        self.assertTrue(index.contains(self.service.id, "gone@example.com"))
+        self.assertTrue(index.contains(self.service.id, "+447700900123"))
+
+    async def test_enqueue_skips_suppressed_recipients_before_rendering(self):
+        messages = [
+            {"template_id": str(self.template.id), "payload_config": {"to": ["gone@example.com"]}},
+            {"template_id": str(self.template.id), "payload_config": {"to": ["gone@example.com", "ok@example.com"]}},
+        ]
+        response = await self.async_client.post(
+            "/api/notifications/",
+            json.dumps({"notifications": messages}),
+            content_type="application/json",
+            headers={"X-Api-Key": self.service.api_key},
+        )
+        self.assertEqual(response.status_code, 202)
+        suppressed, sent = [await Notification.objects.aget(pk=n["id"]) for n in response.json()["notifications"]]
+        self.assertEqual(suppressed.status, Notification.Status.SUPPRESSED)
+        self.assertEqual(suppressed.content, "")
+        self.assertEqual(sent.status, Notification.Status.PENDING)
+        self.assertEqual(sent.payload_config["to"], ["ok@example.com"])
+
+
+@override_settings(
+    NOTIFICATION_ADMISSION_LIMITS={
+        Priority.CRITICAL: {"max_pending": 10},
+        Priority.BULK: {"max_pending": 3, "retry_after": 60},
+    }
+)
+class AdmissionTests(TestCase):
+    def setUp(self):
+        provider, _ = Provider.objects.get_or_create(code="mailgun", defaults={"name": "Mailgun", "type": "email"})
+        self.service = Service.objects.create(name="Mail", provider=provider, config={"api_key": "k"})
+        self.otp = Template.objects.create(
+            title="OTP", subject="S", template="{{ otp }}", service=self.service, priority=Priority.CRITICAL
+        )
+        self.campaign = Template.objects.create(
+            title="News", subject="S", template="News", service=self.service, priority=Priority.BULK
+        )
+        self.monitor = BacklogMonitor(refresh_interval=60)
+        self.enterContext(mock.patch("notification.enqueue.backlog_monitor", self.monitor))
+
+    def _enqueue(self, template, count=1):
+        messages = [{"template_id": str(template.id), "payload_config": {"to": ["a@example.com"]}}] * count
+        return self.client.post(
+            "/api/notifications/",
+            json.dumps({"notifications": messages}),
+            content_type="application/json",
+            headers={"X-Api-Key": self.service.api_key},
+        )
+
+    def test_bulk_traffic_is_shed_before_critical(self):
+        self.assertEqual(self._enqueue(self.campaign, 3).status_code, 202)
+        response = self._enqueue(self.campaign)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "60")
+        self.assertEqual(response.json()["retry_after"], 60)
+        # The bulk backlog is not ahead of critical messages, so OTPs still go through.
+        self.assertEqual(self._enqueue(self.otp).status_code, 202)
+        self.assertEqual(Notification.objects.count(), 4)
+        rejected = {name: samples for name, _, _, samples in self.monitor.collect()}[
+            "notification_admission_rejected_total"
+        ]
+        self.assertEqual(rejected, [({"service": str(self.service.id), "priority": "bulk"}, 1)])
+
+    @override_settings(NOTIFICATION_METRICS_TOKEN="scrape")
+    def test_api_process_serves_its_metrics(self):
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 401)
+        response = self.client.get("/api/metrics/", headers={"Authorization": "Bearer scrape"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        body = response.content.decode()
+        self.assertIn("# TYPE notification_admission_rejected_total counter", body)
+        self.assertIn("# TYPE notification_snapshot_hits_total counter", body)
+
+    def test_backlog_is_read_once_per_interval_and_counts_accepted_work(self):
+        for _ in range(3):
+            Notification.objects.create(service=self.service, template_ref=self.campaign, priority=Priority.BULK)
+        self.monitor.refresh()
+        with self.assertNumQueries(0):
+            self.monitor.refresh()
+        self.assertEqual(self.monitor.backlog(self.service.id, Priority.BULK)[0], 3)
+        self.assertEqual(self.monitor.backlog(self.service.id, Priority.CRITICAL)[0], 0)
+        self.assertEqual(self._enqueue(self.campaign).status_code, 429)
+
+        Notification.objects.update(created_at=timezone.now() - timedelta(hours=2))
+        self.monitor.refresh(force=True)
+        self.assertGreater(self.monitor.backlog(self.service.id, Priority.BULK)[1], 3600)
+
+    def test_requests_do_not_read_the_backlog_while_it_is_refreshed_in_background(self):
+        refreshed = threading.Event()
+        self.monitor._background = PeriodicRefresh(refreshed.set, 60, name="test-backlog-monitor")
+        self.monitor.start()
+        self.assertTrue(refreshed.wait(5))
+        with mock.patch.object(self.monitor, "refresh") as refresh:
+            self.assertEqual(self._enqueue(self.campaign).status_code, 202)
+        refresh.assert_not_called()
+        self.monitor.stop()
+        self.assertFalse(self.monitor.running)
+
+    def test_oldest_pending_age_limits_admission(self):
+        old = Notification.objects.create(service=self.service, template_ref=self.otp, priority=Priority.CRITICAL)
+        Notification.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(minutes=10))
+        self.assertEqual(self._enqueue(self.otp).status_code, 429)
+
+
+class SnapshotCacheTests(TestCase):
+    def setUp(self):
+        provider, _ = Provider.objects.get_or_create(code="mailgun", defaults={"name": "Mailgun", "type": "email"})
+        self.service = Service.objects.create(name="Mail", provider=provider, config={"api_key": "k"})
+        self.template = Template.objects.create(title="T", subject="S", template="Hi", service=self.service)
+
+    def test_rows_are_read_once_and_reloaded_after_save_on_every_node(self):
+        node_a, node_b = SnapshotCache(local_ttl=60), SnapshotCache(local_ttl=0)
+        with self.assertNumQueries(1):
+            self.assertEqual(node_a.get(Template, self.template.pk).subject, "S")
+        with self.assertNumQueries(0):
+            self.assertEqual(node_a.get(Template, str(self.template.pk)).subject, "S")
+            self.assertEqual(node_b.get(Template, self.template.pk).subject, "S")  # from L2
+
+        self.template.subject = "New"
+        self.template.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(node_b.get(Template, self.template.pk).subject, "New")
+        # node_a trusts its L1 copy until local_ttl runs out.
+        self.assertEqual(node_a.get(Template, self.template.pk).subject, "S")
+
+        self.service.provider.name = "Mailgun EU"
+        self.service.provider.save()
+        self.assertEqual(node_b.get(Service, self.service.pk).provider.name, "Mailgun EU")
+        self.service.delete()
+        self.assertIsNone(node_b.get(Service, self.service.pk))
+
+    def test_claimed_notifications_carry_snapshots(self):
+        Notification.objects.create(service=self.service, template_ref=self.template, type="email")
+        [claimed] = claim_batch(10)
+        with self.assertNumQueries(0):
+            self.assertEqual((claimed.service.provider.code, claimed.template_ref.subject), ("mailgun", "S"))
+        claimed.template_ref.subject = "changed"
+        self.assertEqual(snapshots.snapshots.get(Template, self.template.pk).subject, "S")
+
+    def test_concurrent_misses_load_a_row_once(self):
+        loads = []
+
+        class Rows:
+            def in_bulk(self, pks):
+                loads.append(pks)
+                time.sleep(0.2)
+                return {pk: Template(id=pk, title="T", subject="Loaded") for pk in pks}
+
+        pk = self.template.pk
+        snapshots.snapshots.invalidate(Template, [pk])
+        nodes = [SnapshotCache(), SnapshotCache()]
+        results = []
+        with mock.patch.dict(QUERYSETS, {Template: Rows}):
+            threads = [threading.Thread(target=lambda n=n: results.append(n.get(Template, pk))) for n in nodes * 4]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(loads), 1)
+        self.assertEqual([t.subject for t in results], ["Loaded"] * 8)
+
+
+class ShardingTests(TestCase):
+    def test_ring_moves_only_the_joining_nodes_share(self):
+        before = HashRing(["a", "b", "c"])
+        after = HashRing(["a", "b", "c", "d"])
+        moved = [n for n in range(1000) if before.owner(n) != after.owner(n)]
+        self.assertTrue(all(after.owner(n) == "d" for n in moved))
+        self.assertLess(len(moved), 400)
+
+    def test_shards_rebalance_when_workers_join_and_die(self):
+        a = ShardMembership("a", shards=8, timeout=30)
+        b = ShardMembership("b", shards=8, timeout=30)
+        # Fixed ids: with random ones, b's share of 8 shards is occasionally empty.
+        a.id, b.id = uuid.UUID(int=1), uuid.UUID(int=2)
+        self.assertEqual(a.heartbeat(), set(range(8)))
+        # b's share is still leased to a until a hands it over at its next heartbeat.
+        self.assertEqual(b.heartbeat(), set())
+        a_shards = a.heartbeat(force=True)
+        b_shards = b.heartbeat(force=True)
+        self.assertEqual(a_shards | b_shards, set(range(8)))
+        self.assertFalse(a_shards & b_shards)
+        self.assertTrue(b_shards)
+
+        # a dies: no heartbeat and its leases run out.
+        past = timezone.now() - timedelta(minutes=1)
+        WorkerNode.objects.filter(id=a.id).update(heartbeat_at=past)
+        Shard.objects.filter(owner_id=a.id).update(lease_until=past)
+        self.assertEqual(b.heartbeat(force=True), set(range(8)))
+
+        b.leave()
+        self.assertFalse(Shard.objects.filter(owner__isnull=False).exists())
+
+    def test_claimer_only_takes_services_in_its_shards(self):
+        provider, _ = Provider.objects.get_or_create(code="mailgun", defaults={"name": "Mailgun", "type": "email"})
+        services = [Service.objects.create(name=f"S{i}", provider=provider, config={"api_key": "k"}) for i in range(6)]
+        for service in services:
+            template = Template.objects.create(title="T", subject="S", template="x", service=service)
+            Notification.objects.create(service=service, template_ref=template, type="email")
+        a, b = ShardMembership("a", shards=4), ShardMembership("b", shards=4)
+        for membership in (a, b, a, b):
+            membership.heartbeat(force=True)
+
+        claimed_by_a = {n.service_id for n in FairClaimer(membership=a).claim(10)}
+        self.assertEqual(claimed_by_a, {s.id for s in services if shard_of(s.id, 4) in a.owned()})
+        claimed_by_b = {n.service_id for n in FairClaimer(membership=b).claim(10)}
+        self.assertEqual(claimed_by_a | claimed_by_b, {s.id for s in services})
+        self.assertFalse(claimed_by_a & claimed_by_b)
+
+
+class QueueBackendTests(TestCase):
+    def setUp(self):
+        provider, _ = Provider.objects.get_or_create(code="mailgun", defaults={"name": "Mailgun", "type": "email"})
+        self.service = Service.objects.create(name="Mail", provider=provider, config={"api_key": "k"})
+        self.template = Template.objects.create(title="T", subject="S", template="x", service=self.service)
+
+    def _notifications(self, *priorities):
+        return Notification.objects.bulk_create(
+            Notification(service=self.service, template_ref=self.template, type="email", priority=priority)
+            for priority in priorities
+        )
+
+    def test_memory_queue_claims_by_priority_and_requeues_retries(self):
+        queue = MemoryQueue(sweep_interval=math.inf, consumer=True)
+        bulk, critical, cancelled = self._notifications(Priority.BULK, Priority.CRITICAL, Priority.NORMAL)
+        with self.captureOnCommitCallbacks(execute=True):
+            queue.enqueue([bulk, critical, cancelled])
+        Notification.objects.filter(pk=cancelled.pk).update(status=Notification.Status.CANCELLED)
+        snapshots.snapshots.attach([bulk])
+
+        with self.assertNumQueries(1):  # the rows by primary key; service and template come from snapshots
+            batch = queue.claim(10)
+        self.assertEqual([n.id for n in batch], [critical.id, bulk.id])
+        self.assertEqual(batch[0].service.provider.code, "mailgun")
+        self.assertEqual(queue.claim(10), [])
+
+        batch[0].status = Notification.Status.SENT
+        batch[1].locked_until = timezone.now() + timedelta(minutes=1)
+        queue.settle(batch)
+        self.assertEqual(len(queue), 1)
+        self.assertEqual(queue.claim(10), [])  # the retry is not due yet
+        queue._delayed[0] = (0.0, *queue._delayed[0][1:])
+        self.assertEqual([n.id for n in queue.claim(10)], [bulk.id])
+
+    def test_memory_queue_only_holds_enqueues_in_a_consuming_process(self):
+        api = MemoryQueue(sweep_interval=math.inf)
+        with self.captureOnCommitCallbacks(execute=True):
+            api.enqueue(self._notifications(Priority.NORMAL))
+        self.assertEqual(len(api), 0)
+
+        api.claim(10)
+        with self.captureOnCommitCallbacks(execute=True):
+            api.enqueue(self._notifications(Priority.NORMAL))
+        self.assertEqual(len(api), 1)
+
+    def test_memory_queue_relays_rows_written_by_other_processes(self):
+        queue = MemoryQueue(sweep_interval=0)
+        [outside] = self._notifications(Priority.NORMAL)
+        [claimed] = queue.claim(10)
+        self.assertEqual(claimed.id, outside.id)
+        self.assertEqual(queue.claim(10), [])  # in flight, not swept again
+
+    def test_worker_drains_either_backend(self):
+        def send(batch):
+            for notification in batch:
+                notification.status = Notification.Status.SENT
+            Notification.objects.bulk_update(batch, ["status"])
+
+        for queue in (DatabaseQueue(), MemoryQueue(sweep_interval=0)):
+            self._notifications(Priority.NORMAL, Priority.BULK, Priority.CRITICAL)
+            worker = NotificationWorker(send, batch_size=2, queue=queue)
+            self.assertEqual([worker.run_once() for _ in range(3)], [2, 1, 0])
+            self.assertFalse(Notification.objects.filter(status=Notification.Status.PENDING).exists())
+
+    def test_benchmark_drains_its_notifications_and_cleans_up(self):
+        out = io.StringIO()
+        # The memory backend queues on commit, which never comes inside a TestCase.
+        call_command("benchmark_queue", "--messages", "30", "--batch-size", "8", "--backend", "database", stdout=out)
+        self.assertEqual([line.split()[0] for line in out.getvalue().splitlines()[1:]], ["database"])
+        self.assertFalse(Notification.objects.exclude(service=self.service).exists())
+
+
+class DigestTests(TestCase):
+    def setUp(self):
+        provider, _ = Provider.objects.get_or_create(code="mailgun", defaults={"name": "Mailgun", "type": "email"})
+        self.service = Service.objects.create(name="Mail", provider=provider, config={"api_key": "k"}, digest_window=60)
+        self.template = Template.objects.create(
+            title="Comment", subject="New comment", template="{{ who }} commented", service=self.service
+        )
+
+    async def _enqueue(self, *messages):
+        response = await self.async_client.post(
+            "/api/notifications/",
+            json.dumps({"notifications": [{"template_id": str(self.template.id), **m} for m in messages]}),
+            content_type="application/json",
+            headers={"X-Api-Key": self.service.api_key},
+        )
+        self.assertEqual(response.status_code, 202)
+
+    async def test_burst_to_one_recipient_is_sent_as_one_digest(self):
+        await self._enqueue(
+            {"payload_config": {"to": "a@example.com"}, "context": {"who": "Ann"}},
+            {"payload_config": {"to": "b@example.com"}, "context": {"who": "Ann"}},
+        )
+        await self._enqueue(
+            {"payload_config": {"to": "A@example.com"}, "context": {"who": "Bob"}},
+            {"payload_config": {"to": "a@example.com"}, "context": {"who": "Cy"}},
+        )
+        rows = [n async for n in Notification.objects.order_by("created_at")]
+        self.assertEqual({n.status for n in rows}, {Notification.Status.SCHEDULED})
+        self.assertEqual(len({n.send_at for n in rows if n.digest_key == rows[0].digest_key}), 1)
+
+        released = await sync_to_async(release_due)(now=timezone.now() + timedelta(minutes=2))
+        self.assertEqual(released, 2)
+        head = await Notification.objects.aget(pk=rows[0].pk)
+        self.assertEqual(head.status, Notification.Status.PENDING)
+        self.assertEqual(head.plain_text, "Ann commented\n\nBob commented\n\nCy commented")
+        self.assertEqual(head.payload_config["digest_count"], 3)
+        self.assertEqual(await Notification.objects.filter(status=Notification.Status.COALESCED).acount(), 2)
+        counted = {row.status: row.count async for row in DeliveryStat.objects.all()}
+        self.assertEqual(counted, {"scheduled": 4, "pending": 2, "coalesced": 2})
+
+
+class DeliveryStatsTests(TestCase):
+    def setUp(self):
+        provider, _ = Provider.objects.get_or_create(code="mailgun", defaults={"name": "Mailgun", "type": "email"})
+        self.service = Service.objects.create(name="Mail", provider=provider, config={"api_key": "k"})
+        self.now = timezone.now()
+
+    def _record(self, *statuses, sent_after=timedelta(seconds=2)):
+        stats.record(
+            Notification(
+                service=self.service,
+                type="email",
+                status=status,
+                created_at=self.now - sent_after,
+                update_at=self.now,
+            )
+            for status in statuses
+        )
+
+    def test_transitions_are_upserted_into_hourly_buckets(self):
+        with self.assertNumQueries(1):
+            self._record("sent", "sent", "error")
+        self._record("sent", sent_after=timedelta(seconds=8))
+
+        sent = DeliveryStat.objects.get(service=self.service, status="sent")
+        self.assertEqual(sent.count, 3)
+        self.assertAlmostEqual(sent.latency_seconds, 12.0)
+        self.assertEqual(sent.hour, stats.bucket_hour(self.now))
+        self.assertEqual(DeliveryStat.objects.count(), 2)
+        model_admin = ServiceAdmin(Service, AdminSite())
+        service = model_admin.get_queryset(RequestFactory().get("/")).get(pk=self.service.pk)
+        self.assertEqual(model_admin.last_24h(service), "3 sent / 1 failed")
+
+    async def test_stats_api_reads_the_rollup(self):
+        await sync_to_async(self._record)("sent", "sent", "error")
+        response = await self.async_client.get("/api/stats/", headers={"X-Api-Key": self.service.api_key})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["totals"], {"error": 1, "sent": 2})
+        self.assertEqual(body["buckets"][-1]["avg_latency_seconds"], 2.0)
+
+
+class RecipientSearchTests(TestCase):
+    def setUp(self):
+        provider, _ = Provider.objects.get_or_create(code="mailgun", defaults={"name": "Mailgun", "type": "email"})
+        self.service = Service.objects.create(name="Mail", provider=provider, config={"api_key": "k"})
+        self.template = Template.objects.create(title="T", subject="S", template="x", service=self.service)
+        self.headers = {"X-Api-Key": self.service.api_key}
+
+    async def test_lookup_by_normalised_recipient_pages_newest_first(self):
+        for to in (" Alice@Example.com", ["alice@example.com", "bob@example.com"], "bob@example.com"):
+            message = {"template_id": str(self.template.id), "payload_config": {"to": to}}
+            await self.async_client.post(
+                "/api/notifications/", json.dumps(message), content_type="application/json", headers=self.headers
+            )
+
+        url = "/api/notifications/search/?recipient=ALICE@example.com&limit=1"
+        first = (await self.async_client.get(url, headers=self.headers)).json()
+        self.assertEqual(len(first["notifications"]), 1)
+        second = (
+            await self.async_client.get(f"{url}&before={quote(first['next_before'])}", headers=self.headers)
+        ).json()
+        self.assertEqual(len(second["notifications"]), 1)
+        self.assertLess(second["notifications"][0]["created_at"], first["notifications"][0]["created_at"])
+        self.assertIsNone(second["next_before"])
+
+    def test_admin_search_uses_the_recipient_column_for_addresses(self):
+        Notification.objects.create(
+            service=self.service, template_ref=self.template, payload_config={"to": "carol@example.com"}
+        )
+        model_admin = NotificationAdmin(Notification, AdminSite())
+        queryset, _ = model_admin.get_search_results(None, Notification.objects.all(), " Carol@example.com ")
+        self.assertEqual(queryset.count(), 1)
+        self.assertIn('"recipient" = ', str(queryset.query).replace("notifications.", ""))
+
+    def test_phone_numbers_match_however_they_are_formatted(self):
+        Notification.objects.create(
+            service=self.service, template_ref=self.template, payload_config={"to": ["+44 7700 900-123"]}
+        )
+        self.assertEqual(Notification.objects.get().recipient, "+447700900123")
+        self.assertEqual(normalize_recipient(" Bob@Example.com "), "bob@example.com")
+        model_admin = NotificationAdmin(Notification, AdminSite())
+        queryset, _ = model_admin.get_search_results(None, Notification.objects.all(), "+44 (7700) 900123")
+        self.assertEqual(queryset.count(), 1)
+
+        # Bare numbers and dates are not taken for phone numbers: the other fields are searched too.
+        for term in ("1234567", "2026-10-19"):
+            queryset, _ = model_admin.get_search_results(None, Notification.objects.all(), term)
+            self.assertIn("request_id", str(queryset.query))
+
+
+class BulkActionTests(TestCase):
+    def setUp(self):
+        provider, _ = Provider.objects.get_or_create(code="mailgun", defaults={"name": "Mailgun", "type": "email"})
+        self.service = Service.objects.create(name="Mail", provider=provider, config={"api_key": "k"})
+        template = Template.objects.create(title="T", subject="S", template="x", service=self.service)
+        Notification.objects.bulk_create(
+            Notification(service=self.service, template_ref=template, type="email", status=status, retry_count=5)
+            for status in ["error"] * 5 + ["sent", "pending"]
+        )
+
+    def test_requeue_updates_in_keyset_chunks(self):
+        chunks = []
+        # An empty page of not-yet-due rows; per chunk: id page, savepoint, locking read,
+        # UPDATE ... WHERE id IN, stats upsert, release; then one empty page.
+        with self.assertNumQueries(1 + 3 * 6 + 1):
+            count = bulk.requeue(Notification.objects.all(), chunk_size=2, progress=chunks.append)
+        self.assertEqual(count, 5)
+        self.assertEqual(chunks, [2, 4, 5])
+        self.assertEqual(Notification.objects.filter(status="pending", retry_count=0).count(), 5)
+        self.assertEqual(DeliveryStat.objects.get(service=self.service, status="pending").count, 5)
+
+    def test_requeued_cancelled_rows_that_are_not_due_are_scheduled_again(self):
+        send_at = timezone.now() + timedelta(days=1)
+        Notification.objects.filter(status="error").update(status="cancelled")
+        campaign = list(Notification.objects.filter(status="cancelled").values_list("pk", flat=True)[:2])
+        Notification.objects.filter(pk__in=campaign).update(send_at=send_at)
+
+        self.assertEqual(bulk.requeue(Notification.objects.all()), 5)
+        self.assertEqual(Notification.objects.filter(status="scheduled", send_at=send_at).count(), 2)
+        self.assertEqual(Notification.objects.filter(status="pending", retry_count=0).count(), 3)
+        self.assertEqual(release_due(now=timezone.now()), 0)
+        self.assertFalse(Notification.objects.filter(pk__in=campaign, status="pending").exists())
+
+    def test_command_cancels_only_unclaimed_rows(self):
+        Notification.objects.filter(status="pending").update(locked_until=timezone.now() + timedelta(minutes=1))
+        Notification.objects.filter(status="error").update(status="scheduled")
+        out = io.StringIO()
+        call_command("bulk_notifications", "cancel", "--service", str(self.service.pk), stdout=out)
+        self.assertIn("Cancelled 5 notification(s).", out.getvalue())
+        self.assertEqual(Notification.objects.filter(status="pending").count(), 1)
+
+
+class AttachmentTests(TestCase):
+    def setUp(self):
+        self.enterContext(
+            override_settings(NOTIFICATION_ATTACHMENT_ROOT=self.enterContext(tempfile.TemporaryDirectory()))
+        )
+        provider, _ = Provider.objects.get_or_create(code="mailgun", defaults={"name": "Mailgun", "type": "email"})
+        self.service = Service.objects.create(name="Mail", provider=provider, config={"api_key": "k"})
+        self.template = Template.objects.create(title="T", subject="S", template="Report", service=self.service)
+        self.headers = {"X-Api-Key": self.service.api_key}
+
+    async def test_upload_stores_identical_content_once(self):
+        content = b"%PDF-1.7 quarterly report" * 1000
+        responses = [
+            await self.async_client.post(
+                "/api/attachments/?filename=report.pdf", content, content_type="application/pdf", headers=self.headers
+            )
+            for _ in range(2)
+        ]
+        self.assertEqual([r.status_code for r in responses], [201, 200])
+        digest = hashlib.sha256(content).hexdigest()
+        self.assertEqual({r.json()["digest"] for r in responses}, {digest})
+        attachment = await Attachment.objects.aget()
+        self.assertEqual(
+            (attachment.filename, attachment.content_type, attachment.size),
+            ("report.pdf", "application/pdf", len(content)),
+        )
+        self.assertEqual(attachment.path.read_bytes(), content)
+        self.assertEqual([p.name for p in attachments.root().rglob("*") if p.is_file()], [digest])
+
+    async def test_enqueue_rejects_unknown_attachment(self):
+        body = {"template_id": str(self.template.id), "attachments": ["0" * 64]}
+        response = await self.async_client.post(
+            "/api/notifications/", body, content_type="application/json", headers=self.headers
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"], [f"Unknown attachment: {'0' * 64}"])
+
+    def test_mailgun_streams_template_and_message_attachments(self):
+        logo, _ = attachments.store(io.BytesIO(b"\x89PNG logo"), "logo.png", "image/png")
+        invoice, _ = attachments.store(io.BytesIO(b"invoice body"), "invoice.txt", "text/plain")
+        self.template.attachments.add(logo)
+        with StandInServer(mailgun_responder) as server:
+            self.service.config["base_url"] = server.base_url
+            self.service.save()
+            notifications = Notification.objects.bulk_create(
+                Notification(
+                    service=self.service,
+                    template_ref=self.template,
+                    type="email",
+                    content="Report",
+                    attachments=own,
+                    payload_config={"to": ["a@example.com"], "subject": "S", "sender": "r@example.com"},
+                )
+                for own in ([invoice.digest, logo.digest], [])
+            )
+            with self.assertNumQueries(2):
+                files = attachments.for_notifications(notifications)
+            self.assertEqual([len(files[n.id]) for n in notifications], [2, 1])
+            deliver_group(notifications)
+
+        # Calls run concurrently, so the requests may arrive in either order.
+        logo_only, with_invoice = sorted(server.requests, key=lambda r: len(r.parts()))
+        self.assertIn(("to", None, b"a@example.com"), with_invoice.parts())
+        self.assertEqual(
+            [p for p in with_invoice.parts() if p[0] == "attachment"],
+            [("attachment", "logo.png", b"\x89PNG logo"), ("attachment", "invoice.txt", b"invoice body")],
+        )
+        self.assertEqual([p[1] for p in logo_only.parts() if p[0] == "attachment"], ["logo.png"])
+        self.assertEqual(Notification.objects.filter(status=Notification.Status.SENT).count(), 2)
+
+
+class FailoverTests(TestCase):
+    def setUp(self):
+        self.provider, _ = Provider.objects.get_or_create(code="infobip", defaults={"name": "Infobip", "type": "sms"})
+
+    def _service(self, name, base_url):
+        return Service.objects.create(
+            name=name, provider=self.provider, config={"api_key": "k", "base_url": base_url, "sender": "Acme"}
+        )
+
+    def _notification(self, service, *, critical=False, request_id=""):
+        template = Template.objects.create(title="OTP", subject="S", template="x", service=service)
+        if critical:
+            Template.objects.filter(pk=template.pk).update(latency_critical=True)
+            template.latency_critical = True
+        return Notification.objects.create(
+            service=service,
+            template_ref=template,
+            request_id=request_id,
+            content="Your code is 1234",
+            payload_config={"to": "+15550001"},
+        )
+
+    def test_failed_sends_move_on_to_the_next_fallback(self):
+        with (
+            StandInServer(lambda request: (500, {"error": "down"})) as down,
+            StandInServer(infobip_responder) as up,
+        ):
+            primary, fallback = self._service("primary", down.base_url), self._service("fallback", up.base_url)
+            ServiceFallback.objects.create(service=primary, fallback=fallback, position=1)
+            notification = self._notification(primary)
+            deliver_group([Notification.objects.select_related("service__provider", "template_ref").get()])
+
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, Notification.Status.SENT)
+        self.assertEqual((len(down.requests), len(up.requests)), (1, 1))
+        self.assertEqual(notification.provider_response["service"], str(fallback.id))
+        self.assertEqual(notification.provider_response["attempts"], [str(primary.id), str(fallback.id)])
+        self.assertFalse(notification.provider_response["hedged"])
+
+    @override_settings(NOTIFICATION_HEDGE_DELAY=0.05)
+    def test_slow_primary_is_hedged_for_latency_critical_templates(self):
+        def slow(request):
+            time.sleep(1)
+            return infobip_responder(request)
+
+        with StandInServer(slow) as slow_server, StandInServer(infobip_responder) as fast_server:
+            primary, fallback = (
+                self._service("primary", slow_server.base_url),
+                self._service("fb", fast_server.base_url),
+            )
+            ServiceFallback.objects.create(service=primary, fallback=fallback)
+            self._notification(primary, critical=True)
+            [notification] = Notification.objects.select_related("service__provider", "template_ref")
+            started = time.monotonic()
+            failover.send([notification])
+            elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, 0.9)
+        self.assertEqual(notification.status, Notification.Status.SENT)
+        self.assertEqual(notification.provider_response["service"], str(fallback.id))
+        self.assertTrue(notification.provider_response["hedged"])
+
+    def test_request_already_sent_is_not_sent_again(self):
+        with StandInServer(infobip_responder) as server:
+            primary, fallback = self._service("primary", server.base_url), self._service("fb", server.base_url)
+            ServiceFallback.objects.create(service=primary, fallback=fallback)
+            first = self._notification(primary, request_id="otp-1")
+            Notification.objects.filter(pk=first.pk).update(status=Notification.Status.SENT)
+            self._notification(primary, request_id="otp-1")
+            [retry] = Notification.objects.select_related("service__provider", "template_ref").filter(
+                status=Notification.Status.PENDING
+            )
+            deliver_group([retry])
+
+        retry.refresh_from_db()
+        self.assertEqual(server.requests, [])
+        self.assertEqual(retry.status, Notification.Status.CANCELLED)
+        self.assertEqual(retry.provider_response, {"duplicate_of": str(first.id)})
+
+    def test_latency_percentile_sets_the_hedge_delay(self):
+        service = self._service("primary", "https://example.com/")
+        self.assertEqual(failover.hedge_delay(service), 1.0)
+        for millis in range(1, 101):
+            failover.latency.observe(service.id, millis / 1000)
+        self.assertAlmostEqual(failover.hedge_delay(service), 0.095)
+
+
+class ConcurrencyLimiterTests(SimpleTestCase):
+    def _calls(self, limiter, latency, count, *, concurrent=None, overloaded=False):
+        for _ in range(count):
+            for _ in range(concurrent or int(limiter.limit)):
+                limiter.acquire()
+            for _ in range(concurrent or int(limiter.limit)):
+                limiter.release(latency, overloaded=overloaded)
+
+    def test_limit_grows_while_latency_stays_flat(self):
+        limiter = AdaptiveLimiter(initial=2, max_limit=10)
+        self._calls(limiter, 0.0, 50)
+        self.assertEqual(int(limiter.limit), 10)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_limit_does_not_grow_when_unused(self):
+        limiter = AdaptiveLimiter(initial=8)
+        self._calls(limiter, 0.0, 50, concurrent=1)
+        self.assertEqual(int(limiter.limit), 8)
+
+    def test_overload_and_latency_growth_cut_the_limit(self):
+        limiter = AdaptiveLimiter(initial=16, min_limit=2, backoff=0.5)
+        limiter.acquire()
+        limiter.release(0.001)  # sets the no-load latency
+        limiter.acquire()
+        limiter.release(1.0)  # far slower: queueing at the provider
+        self.assertEqual(limiter.limit, 8)
+        limiter.acquire()
+        limiter.release(0.0, overloaded=True)
+        self.assertEqual(limiter.limit, 4)
+        self._calls(limiter, 0.0, 5, concurrent=1, overloaded=True)
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.overloads, 6)
+
+    def test_calls_in_flight_during_a_cut_do_not_cut_again(self):
+        limiter = AdaptiveLimiter(initial=8, backoff=0.5)
+        for _ in range(4):
+            limiter.acquire()
+        for _ in range(4):
+            limiter.release(0.5, overloaded=True)  # all started before the first cut
+        self.assertEqual(limiter.limit, 4)
+
+    def test_acquire_waits_for_a_free_slot(self):
+        limiter = AdaptiveLimiter(initial=1)
+        self.assertTrue(limiter.acquire())
+        self.assertFalse(limiter.acquire(timeout=0.01))
+        limiter.release(0.0)
+        self.assertTrue(limiter.acquire(timeout=0.01))
+
+    @override_settings(NOTIFICATION_CONCURRENCY={"mailgun": {"initial": 2}})
+    def test_services_on_one_account_share_its_limit(self):
+        provider, key = Provider(code="mailgun", type="email"), str(uuid.uuid4())
+        first, second = (Service(provider=provider, config={"api_key": key}) for _ in range(2))
+        other = Service(provider=provider, config={"api_key": str(uuid.uuid4())})
+        self.assertIs(account_limiter_for(first), account_limiter_for(second))
+        self.assertIsNot(account_limiter_for(first), account_limiter_for(other))
+
+        with limits_for(first).slot(), limits_for(second).slot():
+            self.assertEqual(limiter_for(first).in_flight, 1)
+            self.assertFalse(account_limiter_for(first).acquire(timeout=0.01))
+            self.assertTrue(account_limiter_for(other).acquire(timeout=0.01))
+        self.assertEqual(account_limiter_for(first).in_flight, 0)
+
+    def test_limiter_is_rebuilt_when_its_config_changes(self):
+        service = Service(provider=Provider(code="mailgun", type="email"), config={"api_key": str(uuid.uuid4())})
+        limiter = limiter_for(service)
+        self.assertIs(limiter_for(service), limiter)
+        with override_settings(NOTIFICATION_CONCURRENCY={str(service.id): {"initial": 7}}):
+            self.assertEqual(limiter_for(service).limit, 7)
+        service.config = {"api_key": str(uuid.uuid4())}
+        self.assertIsNot(limiter_for(service), limiter)
+
+
+class SenderConcurrencyTests(TestCase):
+    @override_settings(NOTIFICATION_CONCURRENCY={"mailgun": {"initial": 3, "max_limit": 5}})
+    def test_mailgun_calls_stay_within_the_limit_and_are_exported(self):
+        lock, active, peak = threading.Lock(), [0], [0]
+
+        def responder(request):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return mailgun_responder(request)
+
+        provider, _ = Provider.objects.get_or_create(code="mailgun", defaults={"name": "Mailgun", "type": "email"})
+        with StandInServer(responder) as server:
+            service = Service.objects.create(
+                name="Limited", provider=provider, config={"api_key": "k", "base_url": server.base_url}
+            )
+            template = Template.objects.create(title="T", subject="S", template="x", service=service)
+            notifications = Notification.objects.bulk_create(
+                Notification(
+                    service=service,
+                    template_ref=template,
+                    type="email",
+                    content="Hi",
+                    payload_config={"to": [f"u{i}@example.com"], "sender": "a@example.com"},
+                )
+                for i in range(12)
+            )
+            deliver_group(notifications)
+
+        self.assertEqual(len(server.requests), 12)
+        self.assertGreater(peak[0], 1)
+        self.assertLessEqual(peak[0], 5)
+        limiter = limiter_for(service)
+        self.assertEqual((limiter.calls, limiter.in_flight), (12, 0))
+        exported = metrics.render()
+        self.assertIn(
+            f'notification_sender_concurrency_limit{{provider="mailgun",service="{service.id}"}} {int(limiter.limit)}',
+            exported,
+        )
+        self.assertIn(f'notification_sender_calls_total{{provider="mailgun",service="{service.id}"}} 12', exported)
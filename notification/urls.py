@@ -0,0 +1,18 @@
+from django.urls import path
+
+from . import views
+
+app_name = "notification"
+
+urlpatterns = [
+    path("notifications/", views.enqueue, name="enqueue"),
+    path("notifications/cancel/", views.cancel, name="cancel"),
+    path("notifications/search/", views.recipient_notifications, name="recipient-search"),
+    path("notifications/fanout/", views.fanout, name="fanout"),
+    path("notifications/fanout/<uuid:parent_id>/", views.fanout_status, name="fanout-status"),
+    path("notifications/<uuid:pk>/", views.notification_status, name="status"),
+    path("attachments/", views.upload_attachment, name="attachments"),
+    path("stats/", views.delivery_stats, name="stats"),
+    path("webhooks/<uuid:service_id>/", views.delivery_webhook, name="delivery-webhook"),
+    path("metrics/", views.prometheus_metrics, name="metrics"),
+]
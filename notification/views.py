@@ -1 +1,374 @@
-# Create your views here.
+"""Async JSON endpoints for enqueueing notifications and checking their status.
+
+All views are native coroutines and only use the async ORM API, so under an ASGI
+server (see dj_notificattion/asgi.py) a single process can keep many client
+connections open while waiting on the database.
+"""
+
+import dataclasses
+import hmac
+import json
+import uuid
+from datetime import UTC, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from . import attachments, metrics, scheduler, stats
+from .enqueue import Overloaded, enqueue_messages, parse_enqueue_body, parse_fanout_body, validate_payload_configs
+from .events import event_buffer
+from .models import Notification, Service, Template, normalize_recipient
+from .provider import InvalidWebhook
+from .routers import read_from_replica
+from .snapshots import snapshots
+
+API_KEY_HEADER = "X-Api-Key"
+
+MAX_SEARCH_LIMIT = 200
+
+STATUS_FIELDS = (
+    "id",
+    "request_id",
+    "type",
+    "status",
+    "http_status",
+    "retry_count",
+    "send_at",
+    "created_at",
+    "update_at",
+)
+
+
+async def _aauthenticate(request: HttpRequest) -> Service | None:
+    """Return the enabled, unexpired Service owning the request's API key."""
+    api_key = request.headers.get(API_KEY_HEADER)
+    if not api_key:
+        return None
+    try:
+        return await (
+            Service.objects.select_related("provider")
+            .filter(Q(api_expires_on__isnull=True) | Q(api_expires_on__gt=timezone.now()))
+            .aget(api_key=api_key, enabled=True)
+        )
+    except Service.DoesNotExist:
+        return None
+
+
+def _unauthorized() -> JsonResponse:
+    return JsonResponse({"detail": "Invalid or missing API key."}, status=401)
+
+
+def _overloaded(retry_after: int) -> JsonResponse:
+    return JsonResponse(
+        {"detail": "Too many notifications are waiting to be sent; retry later.", "retry_after": retry_after},
+        status=429,
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+@csrf_exempt
+@require_POST
+async def enqueue(request: HttpRequest) -> JsonResponse:
+    """Create one or many PENDING notifications with a single bulk insert."""
+    service = await _aauthenticate(request)
+    if service is None:
+        return _unauthorized()
+
+    try:
+        messages = parse_enqueue_body(request.body)
+    except ValidationError as exc:
+        return JsonResponse({"errors": exc.messages}, status=400)
+
+    template_ids = {m["template_id"] for m in messages}
+    templates = {
+        str(pk): t
+        for pk, t in (await sync_to_async(snapshots.get_many)(Template, template_ids)).items()
+        if t.service_id == service.id and t.enabled
+    }
+    missing = sorted(template_ids - templates.keys())
+    if missing:
+        return JsonResponse({"errors": [f"Unknown or disabled template: {tid}" for tid in missing]}, status=400)
+    for template in templates.values():
+        template.service = service
+    try:
+        validate_payload_configs(messages, templates, "notifications")
+    except ValidationError as exc:
+        return JsonResponse({"errors": exc.messages}, status=400)
+    unknown = await attachments.amissing(d for m in messages for d in m.get("attachments", ()))
+    if unknown:
+        return JsonResponse({"errors": [f"Unknown attachment: {digest}" for digest in unknown]}, status=400)
+    try:
+        notifications = await sync_to_async(enqueue_messages)(messages, templates)
+    except Overloaded as exc:
+        return _overloaded(exc.retry_after)
+    return JsonResponse(
+        {"notifications": [{"id": str(n.id), "request_id": n.request_id, "status": n.status} for n in notifications]},
+        status=202,
+    )
+
+
+async def _afanout_service_ids(service: Service) -> set:
+    """Ids of the services the caller may fan out to, including itself."""
+    return {service.id} | {sid async for sid in service.fanout_services.values_list("id", flat=True)}
+
+
+@csrf_exempt
+@require_POST
+async def fanout(request: HttpRequest) -> JsonResponse:
+    """Create sibling notifications for every channel of one logical notification.
+
+    All siblings are written in a single bulk insert and share a ``parent_id``
+    that can be polled for an aggregated status.
+    """
+    service = await _aauthenticate(request)
+    if service is None:
+        return _unauthorized()
+
+    try:
+        messages = parse_fanout_body(request.body)
+    except ValidationError as exc:
+        return JsonResponse({"errors": exc.messages}, status=400)
+
+    template_ids = {m["template_id"] for m in messages}
+    templates = {
+        str(t.id): t
+        async for t in Template.objects.select_related("service__provider").filter(
+            id__in=template_ids,
+            service_id__in=await _afanout_service_ids(service),
+            service__enabled=True,
+            enabled=True,
+        )
+    }
+    missing = sorted(template_ids - templates.keys())
+    if missing:
+        return JsonResponse({"errors": [f"Unknown or disabled template: {tid}" for tid in missing]}, status=400)
+    try:
+        validate_payload_configs(messages, templates, "channels")
+    except ValidationError as exc:
+        return JsonResponse({"errors": exc.messages}, status=400)
+    unknown = await attachments.amissing(d for m in messages for d in m.get("attachments", ()))
+    if unknown:
+        return JsonResponse({"errors": [f"Unknown attachment: {digest}" for digest in unknown]}, status=400)
+    parent_id = uuid.uuid4()
+    try:
+        notifications = await sync_to_async(enqueue_messages)(messages, templates, parent_id=parent_id)
+    except Overloaded as exc:
+        return _overloaded(exc.retry_after)
+    return JsonResponse(
+        {
+            "parent_id": str(parent_id),
+            "notifications": [{"id": str(n.id), "type": n.type, "status": n.status} for n in notifications],
+        },
+        status=202,
+    )
+
+
+@require_GET
+async def fanout_status(request: HttpRequest, parent_id) -> JsonResponse:
+    """Aggregated status of a fan-out plus the status of each channel."""
+    service = await _aauthenticate(request)
+    if service is None:
+        return _unauthorized()
+
+    with read_from_replica():
+        siblings = [
+            row
+            async for row in Notification.objects.filter(
+                parent_id=parent_id, service_id__in=await _afanout_service_ids(service)
+            ).values("id", "type", "status")
+        ]
+    if not siblings:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    return JsonResponse(
+        {
+            "parent_id": str(parent_id),
+            "status": Notification.aggregate_status(row["status"] for row in siblings),
+            "notifications": siblings,
+        },
+        status=200,
+    )
+
+
+@csrf_exempt
+@require_POST
+async def cancel(request: HttpRequest) -> JsonResponse:
+    """Cancel the calling service's not-yet-sent notifications with a given ``request_id``."""
+    service = await _aauthenticate(request)
+    if service is None:
+        return _unauthorized()
+
+    try:
+        request_id = json.loads(request.body or b"{}").get("request_id")
+    except (ValueError, AttributeError):
+        request_id = None
+    if not request_id or not isinstance(request_id, str):
+        return JsonResponse({"errors": ["'request_id' is required."]}, status=400)
+
+    cancelled = await sync_to_async(scheduler.cancel)(service, request_id)
+    return JsonResponse({"request_id": request_id, "cancelled": cancelled}, status=200)
+
+
+@require_GET
+async def notification_status(request: HttpRequest, pk) -> JsonResponse:
+    """Return the delivery status of one of the calling service's notifications."""
+    service = await _aauthenticate(request)
+    if service is None:
+        return _unauthorized()
+
+    try:
+        with read_from_replica():
+            row = await Notification.objects.filter(pk=pk, service=service).values(*STATUS_FIELDS).aget()
+    except Notification.DoesNotExist:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    return JsonResponse(row, status=200)
+
+
+@require_GET
+async def recipient_notifications(request: HttpRequest) -> JsonResponse:
+    """The calling service's notifications to ``?recipient=``, newest first.
+
+    Matches the first ``to`` recipient of each notification, the only one indexed.
+    Served by ``notif_recipient_idx``. Page with ``limit`` (max 200) and ``before``,
+    the ``created_at`` of the last row of the previous page (``next_before``).
+    """
+    service = await _aauthenticate(request)
+    if service is None:
+        return _unauthorized()
+
+    recipient = normalize_recipient(request.GET.get("recipient", ""))
+    if not recipient:
+        return JsonResponse({"errors": ["'recipient' is required."]}, status=400)
+    try:
+        limit = min(max(int(request.GET.get("limit", 50)), 1), MAX_SEARCH_LIMIT)
+        before = _parse_query_datetime(request.GET.get("before"))
+    except ValueError:
+        return JsonResponse({"errors": ["'limit' must be an integer and 'before' an ISO 8601 datetime."]}, status=400)
+
+    rows = Notification.objects.filter(recipient=recipient, service=service).order_by("-created_at")
+    if before is not None:
+        rows = rows.filter(created_at__lt=before)
+    with read_from_replica():
+        notifications = [row async for row in rows.values(*STATUS_FIELDS)[: limit + 1]]
+    # Full precision: the JSON encoder would round the cursor to milliseconds.
+    next_before = notifications[limit - 1]["created_at"].isoformat() if len(notifications) > limit else None
+    return JsonResponse(
+        {"recipient": recipient, "notifications": notifications[:limit], "next_before": next_before}, status=200
+    )
+
+
+@csrf_exempt
+@require_POST
+async def upload_attachment(request: HttpRequest) -> JsonResponse:
+    """Store the raw request body as an attachment and return its digest.
+
+    The file name comes from ``?filename=`` and the type from the Content-Type
+    header. The body is streamed to storage in chunks; uploading content that is
+    already stored returns the existing attachment with status 200 instead of 201.
+    """
+    service = await _aauthenticate(request)
+    if service is None:
+        return _unauthorized()
+    filename = request.GET.get("filename", "")
+    if not filename:
+        return JsonResponse({"errors": ["filename: this query parameter is required."]}, status=400)
+
+    attachment, created = await sync_to_async(attachments.store)(request, filename, request.content_type)
+    return JsonResponse(
+        {
+            "digest": attachment.digest,
+            "filename": attachment.filename,
+            "content_type": attachment.content_type,
+            "size": attachment.size,
+        },
+        status=201 if created else 200,
+    )
+
+
+@csrf_exempt
+@require_POST
+async def delivery_webhook(request: HttpRequest, service_id) -> JsonResponse:
+    """Accept a provider delivery event for a service and buffer it for batched writes.
+
+    The provider's sender verifies the signature with this service's key, and the
+    events are tied to the service so they can only update its notifications.
+    Nothing touches the notifications table in the request path.
+    """
+    try:
+        service = await Service.objects.select_related("provider").aget(pk=service_id)
+    except Service.DoesNotExist:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    sender_cls = service.provider.get_sender_class()
+    if sender_cls is None:
+        return JsonResponse({"detail": "Not found."}, status=404)
+
+    try:
+        events = sender_cls(service).parse_webhook(request.body, request.headers)
+    except NotImplementedError:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    except InvalidWebhook as exc:
+        return JsonResponse({"detail": str(exc)}, status=403)
+    event_buffer.add([dataclasses.replace(event, service_id=service.id) for event in events])
+    return JsonResponse({"accepted": len(events)}, status=200)
+
+
+@require_GET
+async def delivery_stats(request: HttpRequest) -> JsonResponse:
+    """Notification counts and mean latency per hour (or ``?by=day``) from the statistics rollup.
+
+    ``since``/``until`` are ISO 8601 datetimes; the default range is the last 24 hours.
+    """
+    service = await _aauthenticate(request)
+    if service is None:
+        return _unauthorized()
+
+    try:
+        since = _parse_query_datetime(request.GET.get("since")) or timezone.now() - timedelta(hours=24)
+        until = _parse_query_datetime(request.GET.get("until"))
+    except ValueError:
+        return JsonResponse({"errors": ["'since' and 'until' must be ISO 8601 datetimes."]}, status=400)
+
+    with read_from_replica():
+        rows = [
+            {
+                "period": row["period"],
+                "type": row["type"],
+                "status": row["status"],
+                "count": row["notifications"],
+                "avg_latency_seconds": round(row["latency"] / row["notifications"], 3)
+                if row["notifications"]
+                else None,
+            }
+            async for row in stats.summary([service.id], since, until, by_day=request.GET.get("by") == "day")
+        ]
+    totals: dict[str, int] = {}
+    for row in rows:
+        totals[row["status"]] = totals.get(row["status"], 0) + row["count"]
+    return JsonResponse({"since": since, "until": until, "totals": totals, "buckets": rows}, status=200)
+
+
+@require_GET
+async def prometheus_metrics(request: HttpRequest) -> HttpResponse:
+    """This API process's metrics (admission, snapshot cache, ...) in the Prometheus text format.
+
+    With ``NOTIFICATION_METRICS_TOKEN`` set, scrapes must send it as a bearer token.
+    """
+    token = getattr(settings, "NOTIFICATION_METRICS_TOKEN", "")
+    if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return _unauthorized()
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+def _parse_query_datetime(value: str | None):
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed, UTC)
@@ -0,0 +1,70 @@
+"""Warming a process up before it takes traffic.
+
+A freshly started process otherwise pays on its first request or claim for
+importing the provider sender modules, resolving provider schema classes,
+compiling their validators and opening database connections (or filling the connection pool). :func:`warm_up`
+does that work up front and reports how long each step took.
+
+``ConfigurationConfig.ready`` runs the import-only steps (no queries are allowed
+there); ``send_notifications`` and the ASGI entry point additionally warm the
+database and provider registry once the app registry is ready.
+"""
+
+import importlib
+import logging
+import pkgutil
+import time
+
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# Shared helpers in notification.provider that are not provider modules.
+NON_PROVIDER_MODULES = {"base", "http", "standin"}
+
+
+def _import_senders() -> None:
+    from . import provider
+
+    for module in pkgutil.iter_modules(provider.__path__):
+        if module.name not in NON_PROVIDER_MODULES:
+            importlib.import_module(f"{provider.__name__}.{module.name}")
+    importlib.import_module(f"{__package__}.schema.config")
+    importlib.import_module(f"{__package__}.schema.request")
+
+
+def _connect() -> None:
+    for alias in connections:
+        connections[alias].ensure_connection()
+
+
+def _resolve_providers() -> None:
+    from .models import Provider
+    from .schema.validation import validator_for
+
+    for provider in Provider.objects.only("code", "type"):
+        provider.get_sender_class()
+        for schema_cls in (provider.get_schema_class(), provider.get_request_schema_class()):
+            if schema_cls:
+                validator_for(schema_cls)
+
+
+def warm_up(*, database: bool = False) -> dict[str, float]:
+    """Preload sender modules and, with ``database``, connections and the provider registry.
+
+    Returns the seconds spent per step. A database that is not reachable yet is
+    logged and skipped rather than failing startup.
+    """
+    steps = [("imports", _import_senders)]
+    if database:
+        steps += [("connections", _connect), ("providers", _resolve_providers)]
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+        except DatabaseError:
+            logger.warning("Warm-up step %r skipped: database unavailable", name, exc_info=True)
+            break
+        timings[name] = time.perf_counter() - started
+    return timings